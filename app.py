@@ -17,10 +17,11 @@ from datetime import datetime, timedelta
 import pandas as pd
 import requests
 
-from src.agent.config import DEFAULT_DB_PATH, RISK_MONITOR_THRESHOLD, RISK_INTERVENE_THRESHOLD, TOP_K, OPENAI_API_KEY, OPENAI_CHAT_MODEL
+from src.agent.config import ASSESS_BATCH_SIZE, DEFAULT_DB_PATH, RISK_MONITOR_THRESHOLD, RISK_INTERVENE_THRESHOLD, TOP_K, OPENAI_API_KEY, OPENAI_CHAT_MODEL
 from src.agent.decision import decide
 from src.agent.explainability import explain_contributions
 from src.agent.knowledge_base import load_knowledge, retrieve_knowledge
+from src.agent.knowledge_index import knowledge_index
 from src.agent.rag import build_terms, embed_text, retrieve_similar
 from src.agent.reporting import generate_report
 from src.agent.storage import Storage
@@ -66,6 +67,19 @@ def generate_demo_series(entity_id, start_date, periods):
     return series
 
 
+def feature_rows(record, contributions):
+    """把记录中的数值特征整理成 (feature_name, value, contribution) 列表"""
+    rows = []
+    for k, v in record.items():
+        if k in ["entity_id", "timestamp"]:
+            continue
+        try:
+            rows.append((k, float(v), float(contributions.get(k, 0.0))))
+        except Exception:
+            pass
+    return rows
+
+
 def run_demo(args):
     print("正在运行Demo模式...")
     path = args.db
@@ -111,30 +125,29 @@ def run_demo(args):
     assessments_by_entity = {}
     export_data = []  # 用于 CSV 导出
 
-    # 主循环：预测 -> 解释 -> 报告 -> 存储 -> 向量化
+    # 主循环：预测 -> 解释 -> 报告 -> 向量化，最后整批写入存储
+    pending = []
     for record in all_records:
         risk = forecaster.score(record)
         contributions = explain_contributions(record)
         cname = company_map.get(record["entity_id"], {}).get("name", record["entity_id"]) if company_map else record["entity_id"]
         text = generate_report({"entity_id": record["entity_id"], "company_name": cname}, risk, contributions, [], [], [], "")
-        storage_id = storage.save_assessment(record["entity_id"], record["timestamp"], risk, "")
-        storage.save_report(storage_id, text)
-
-        for k, v in record.items():
-            if k in ["entity_id", "timestamp"]:
-                continue
-            c = contributions.get(k, 0.0)
-            try:
-                storage.save_feature(storage_id, k, float(v), float(c))
-            except Exception:
-                pass
-
+        embedding = None
         try:
             terms = build_terms(text)
             vec = embed_text(terms)
-            storage.save_embedding(storage_id, json.dumps(terms), json.dumps(vec))
+            embedding = (terms, vec)
         except Exception:
             pass
+        pending.append({
+            "entity_id": record["entity_id"],
+            "timestamp": record["timestamp"],
+            "risk_score": risk,
+            "decision": "",
+            "report_text": text,
+            "features": feature_rows(record, contributions),
+            "embedding": embedding,
+        })
 
         # 导出行
         row = {
@@ -147,9 +160,19 @@ def run_demo(args):
             row[f"Contribution_{feature}"] = value
         export_data.append(row)
 
-        if record["entity_id"] not in assessments_by_entity:
-            assessments_by_entity[record["entity_id"]] = []
-        assessments_by_entity[record["entity_id"]].append((storage_id, risk))
+    storage_ids = storage.save_assessments_bulk(pending)
+    for rec, storage_id in zip(pending, storage_ids):
+        if rec["entity_id"] not in assessments_by_entity:
+            assessments_by_entity[rec["entity_id"]] = []
+        assessments_by_entity[rec["entity_id"]].append((storage_id, rec["risk_score"]))
+
+    # Neo4j 图关系：所有实体一次批量查询
+    n4_refs = {}
+    try:
+        if n4.available():
+            n4_refs = n4.describe_companies(list(assessments_by_entity), limit=TOP_K)
+    except Exception:
+        n4_refs = {}
 
     # 基于历史+知识库生成最终决策与更新报告
     for entity_id, items in assessments_by_entity.items():
@@ -175,11 +198,7 @@ def run_demo(args):
                 graph_refs.extend(gc.describe_company(entity_id, limit=TOP_K))
             except Exception:
                 pass
-            try:
-                if n4.available():
-                    graph_refs.extend(n4.describe_company(entity_id, limit=TOP_K))
-            except Exception:
-                pass
+            graph_refs.extend(n4_refs.get(entity_id, []))
 
             countermeasures = ""
             if OPENAI_API_KEY:
@@ -365,21 +384,25 @@ def run_assess(args):
     model = RiskForecaster() if not args.model else TrainableForecaster.load(args.model)
     df = pd.read_csv(csv_path)
     export_rows = []
+    pending = []
     for _, row in df.iterrows():
         record = row.to_dict()
         risk = model.score(record)
         contributions = explain_contributions(record)
         report = generate_report(record, risk, contributions, [], [], [], "")
-        sid = storage.save_assessment(record.get("entity_id", ""), record.get("timestamp", ""), risk, "")
-        storage.save_report(sid, report)
-        for k, v in record.items():
-            if k in ["entity_id", "timestamp"]:
-                continue
-            try:
-                storage.save_feature(sid, k, float(v), float(contributions.get(k, 0.0)))
-            except Exception:
-                pass
+        pending.append({
+            "entity_id": record.get("entity_id", ""),
+            "timestamp": record.get("timestamp", ""),
+            "risk_score": risk,
+            "decision": "",
+            "report_text": report,
+            "features": feature_rows(record, contributions),
+        })
         export_rows.append({"EntityID": record.get("entity_id"), "Timestamp": record.get("timestamp"), "RiskScore": risk})
+        if len(pending) >= ASSESS_BATCH_SIZE:
+            storage.save_assessments_bulk(pending)
+            pending = []
+    storage.save_assessments_bulk(pending)
     out = os.path.join(os.getcwd(), "assess_results.csv")
     pd.DataFrame(export_rows).to_csv(out, index=False, encoding="utf-8-sig")
     print(f"评估完成，结果保存到 {out}")
@@ -393,7 +416,13 @@ def run_query(args):
 
     # === 初始化组件 ===
     storage = Storage(args.db)
+    storage.init()
     knowledge = load_knowledge()
+    try:
+        # 预先计算知识条目向量，避免在检索时限内构建
+        knowledge_index(knowledge)
+    except Exception as e:
+        print(f"[警告] 知识索引构建失败：{e}")
     vs = VectorStore()
     try:
         vs.add_knowledge_dirs()
@@ -413,7 +442,7 @@ def run_query(args):
     # === 检索多源信息 ===
     gc = GraphClient("graph_data")
     n4 = Neo4jClient()
-    result = retrieve_all(storage, load_knowledge(), vs, gc, n4, q, top_k=TOP_K)
+    result = retrieve_all(storage, knowledge, vs, gc, n4, q, top_k=TOP_K)
     hits = result.get("hits", [])
     is_valid = result.get("valid", False)
 
@@ -16,11 +16,7 @@ import secrets
 from datetime import datetime, timedelta
 
 from src.agent.config import DEFAULT_DB_PATH, TOP_K
-from src.agent.storage import Storage
-from src.agent.vector_store import VectorStore
-from src.agent.knowledge_base import load_knowledge
-from src.agent.graph_client import GraphClient
-from src.agent.neo4j_client import Neo4jClient
+from src.agent.context import RiskAgentContext
 from src.agent.retriever import retrieve_all
 def llm_chat(messages, temperature=0.2):
     from src.agent.config import OPENAI_API_KEY, OPENAI_CHAT_MODEL, OPENAI_BASE_URL, REQUEST_TIMEOUT, REQUEST_RETRIES
@@ -47,6 +43,20 @@ def llm_chat(messages, temperature=0.2):
 
 app = FastAPI(title="金融AI风险评估系统")
 
+# 共享组件：启动时创建一次，知识库/图谱文件变化时自动重载
+agent_ctx = RiskAgentContext()
+
+
+@app.on_event("startup")
+def _startup():
+    agent_ctx.start()
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    agent_ctx.close()
+
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -191,28 +201,14 @@ async def chat_query(request: ChatRequest, username: str = Depends(verify_token)
     if not query:
         raise HTTPException(status_code=400, detail="查询内容不能为空")
     
-    # 初始化组件
-    db_path = os.environ.get("DB_PATH", DEFAULT_DB_PATH)
-    storage = Storage(db_path)
-    storage.init()
-    
-    # 加载知识库
-    knowledge = load_knowledge()
-    
-    # 初始化向量存储
-    vs = VectorStore()
-    try:
-        vs.add_knowledge_dirs()
-    except Exception as e:
-        print(f"向量存储初始化警告: {e}")
-    
-    # 初始化图数据库客户端
-    gc = GraphClient("graph_data")
-    n4 = Neo4jClient()
+    # 共享组件（文件有变化时先重载）
+    agent_ctx.refresh()
+    storage = agent_ctx.storage()
     
     # 执行多源检索
     try:
-        result = retrieve_all(storage, knowledge, vs, gc, n4, query, top_k=TOP_K)
+        result = retrieve_all(storage, agent_ctx.knowledge, agent_ctx.vector_store, agent_ctx.graph_client,
+                              agent_ctx.neo4j_client, query, top_k=TOP_K, provider=agent_ctx.embedding_provider)
         hits = result.get("hits", [])
         is_valid = result.get("valid", False)
     except Exception as e:
@@ -431,8 +427,8 @@ async def get_config_info(username: str = Depends(verify_token)):
     )
     
     # 检查Neo4j连接
-    n4 = Neo4jClient()
-    neo4j_available = n4.available()
+    n4 = agent_ctx.neo4j_client
+    neo4j_available = n4 is not None and n4.available()
     
     return {
         "success": True,
@@ -499,9 +495,7 @@ async def risk_assess(request: Dict[str, Any], username: str = Depends(verify_to
         )
         
         # 保存到数据库
-        db_path = os.environ.get("DB_PATH", DEFAULT_DB_PATH)
-        storage = Storage(db_path)
-        storage.init()
+        storage = agent_ctx.storage()
         
         timestamp = record.get("timestamp", datetime.now().strftime("%Y-%m-%d"))
         assessment_id = storage.save_assessment(entity_id, timestamp, risk_score, "")
@@ -540,33 +534,10 @@ async def risk_assess(request: Dict[str, Any], username: str = Depends(verify_to
 async def get_risk_history(entity_id: str, username: str = Depends(verify_token)):
     """获取企业的历史风险评估记录"""
     try:
-        db_path = os.environ.get("DB_PATH", DEFAULT_DB_PATH)
-        storage = Storage(db_path)
-        storage.init()
-        
-        # 查询历史记录
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, timestamp, risk_score, decision
-            FROM assessments
-            WHERE entity_id = ?
-            ORDER BY timestamp DESC
-            LIMIT 50
-        """, (entity_id,))
-        
-        records = []
-        for row in cursor.fetchall():
-            records.append({
-                "id": row[0],
-                "timestamp": row[1],
-                "risk_score": row[2],
-                "decision": row[3]
-            })
+        storage = agent_ctx.storage()
         
-        conn.close()
+        # 查询历史记录（命中 assessments(entity_id, timestamp) 索引）
+        records = storage.get_history(entity_id, limit=50)
         
         return {
             "success": True,
@@ -586,7 +557,8 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "active_users": len(set(data["username"] for data in ACTIVE_TOKENS.values()))
+        "active_users": len(set(data["username"] for data in ACTIVE_TOKENS.values())),
+        "embedding_ready": bool(agent_ctx.embedding_provider and agent_ctx.embedding_provider.ready)
     }
 
 
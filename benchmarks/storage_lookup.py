@@ -0,0 +1,92 @@
+"""
+存储查询基准：对比迁移前（无索引）与迁移后（二级索引 + reports 主键）的查询延迟。
+
+用法：
+    python -m benchmarks.storage_lookup --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from src.agent.storage import Storage
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE assessments (id INTEGER PRIMARY KEY AUTOINCREMENT, entity_id TEXT, timestamp TEXT, risk_score REAL, decision TEXT)",
+    "CREATE TABLE reports (assessment_id INTEGER, report_text TEXT)",
+    "CREATE TABLE features (assessment_id INTEGER, feature_name TEXT, value REAL, contribution REAL)",
+    "CREATE TABLE embeddings (assessment_id INTEGER, terms TEXT, vector TEXT)",
+]
+
+
+def build_legacy_db(path, n, n_entities=1000):
+    conn = sqlite3.connect(path)
+    for q in LEGACY_SCHEMA:
+        conn.execute(q)
+    rnd = random.Random(0)
+    chunk = 50000
+    for start in range(1, n + 1, chunk):
+        ids = range(start, min(n, start + chunk - 1) + 1)
+        conn.executemany(
+            "INSERT INTO assessments(id, entity_id, timestamp, risk_score, decision) VALUES(?,?,?,?,?)",
+            ((i, f"E{i % n_entities}", f"2023-{i % 12 + 1:02d}-{i % 28 + 1:02d}", rnd.random(), "") for i in ids)
+        )
+        conn.executemany("INSERT INTO reports(assessment_id, report_text) VALUES(?,?)", ((i, f"report {i}") for i in ids))
+        conn.executemany(
+            "INSERT INTO features(assessment_id, feature_name, value, contribution) VALUES(?,?,?,?)",
+            ((i, name, 1.0, 0.1) for i in ids for name in ("amount", "income"))
+        )
+        conn.executemany("INSERT INTO embeddings(assessment_id, terms, vector) VALUES(?,?,?)", ((i, "{}", "{}") for i in ids))
+    conn.commit()
+    conn.close()
+
+
+def time_lookups(storage, n, repeats, n_entities=1000):
+    rnd = random.Random(1)
+    ids = [rnd.randint(1, n) for _ in range(repeats)]
+    out = {}
+    t = time.perf_counter()
+    for i in ids:
+        storage.get_report(i)
+    out["get_report"] = (time.perf_counter() - t) / repeats
+    t = time.perf_counter()
+    for i in range(0, repeats, 10):
+        storage.get_reports(ids[i:i + 10])
+    out["get_reports(10)"] = (time.perf_counter() - t) / max(1, repeats // 10)
+    t = time.perf_counter()
+    for i in ids:
+        storage.get_history(f"E{i % n_entities}", limit=50)
+    out["history"] = (time.perf_counter() - t) / repeats
+    with storage._conn() as conn:
+        t = time.perf_counter()
+        for i in ids:
+            conn.execute("SELECT feature_name, value FROM features WHERE assessment_id=?", (i,)).fetchall()
+        out["features"] = (time.perf_counter() - t) / repeats
+    return out
+
+
+def main(sizes, repeats):
+    print(f"{'rows':>9} {'query':<16} {'before(ms)':>11} {'after(ms)':>10} {'migrate(s)':>11}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "bench.db")
+            build_legacy_db(path, n)
+            storage = Storage(path)
+            before = time_lookups(storage, n, repeats)
+            t = time.perf_counter()
+            storage.init()
+            migrate_s = time.perf_counter() - t
+            after = time_lookups(storage, n, repeats)
+            storage.close()
+        for k in before:
+            print(f"{n:>9} {k:<16} {before[k] * 1000:>11.3f} {after[k] * 1000:>10.3f} {migrate_s:>11.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+    main(args.sizes, args.repeats)
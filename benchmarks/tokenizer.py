@@ -0,0 +1,108 @@
+"""
+分词基准：旧版 build_terms（空格切分 + 逐字符 isalnum）与新分词器（正则 + 中文二元组 + 缓存）对比。
+
+语料由 generate_report 生成的评估报告组成。检索质量用中文短语查询的精确率衡量：
+查询取自某条知识参考句子的中间片段（不分词），命中的报告应包含该句子。
+
+用法：
+    python -m benchmarks.tokenizer --docs 20000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from src.agent.reporting import generate_report
+from src.agent.sparse_index import SparseIndex
+from src.agent import tokenizer
+from src.agent.tokenizer import term_counts
+
+COMPANIES = ["华夏科技", "东方电气", "长江证券", "北方稀土", "南方航空", "中原银行", "西部矿业", "海天味业"]
+FEATURES = ["amount", "income", "debt_ratio", "overdue_days", "credit_score", "cash_flow", "psi"]
+KNOWLEDGE = [
+    "逾期天数持续上升时应提高风险等级并加强贷后监控",
+    "资产负债率超过警戒线的企业需要关注偿债能力",
+    "现金流为负且收入下滑说明经营风险正在累积",
+    "PSI指标大于0.25表示模型分布发生显著漂移",
+    "关联担保链条过长容易引发系统性违约风险",
+    "信用评分快速下降往往先于实际违约发生",
+]
+MEASURES = ["建议压降授信额度并追加抵押物", "建议加强现金流监测并按月复核", "建议暂停新增业务并开展现场调查"]
+
+
+def legacy_build_terms(text):
+    if not text:
+        return {}
+    words = []
+    for w in text.lower().split():
+        w2 = ''.join([c for c in w if c.isalnum()])
+        if w2:
+            words.append(w2)
+    tf = {}
+    for w in words:
+        tf[w] = tf.get(w, 0) + 1
+    return tf
+
+
+def make_corpus(n, seed=0):
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(n):
+        name = rnd.choice(COMPANIES) + str(i % 500)
+        contributions = {f: rnd.uniform(-1, 1) for f in rnd.sample(FEATURES, 4)}
+        refs = rnd.sample(KNOWLEDGE, 2)
+        docs.append(generate_report({"entity_id": f"E{i}", "company_name": name}, rnd.random(), contributions,
+                                    [], [], refs, [], rnd.choice(MEASURES)))
+    return docs
+
+
+def bench(fn, docs):
+    t0 = time.perf_counter()
+    out = [fn(d) for d in docs]
+    return out, time.perf_counter() - t0
+
+
+def precision(terms, docs, queries, fn, top_k):
+    # fraction of top-k hits that contain the knowledge sentence the query was cut from
+    index = SparseIndex(weighting="bm25")
+    index.add_many(terms)
+    good = total = 0
+    for q, sentence in queries:
+        hits = index.search(fn(q), top_k)
+        good += sum(1 for _, p in hits if sentence in docs[p])
+        total += top_k
+    return good / max(1, total)
+
+
+def main(n_docs, n_queries, top_k):
+    docs = make_corpus(n_docs)
+    rnd = random.Random(1)
+    # query: an unsegmented fragment from the middle of a knowledge sentence
+    queries = []
+    for _ in range(n_queries):
+        s = rnd.choice(KNOWLEDGE)
+        start = rnd.randint(0, len(s) - 8)
+        queries.append((s[start:start + rnd.randint(4, 8)], s))
+
+    legacy, t_legacy = bench(legacy_build_terms, docs)
+    tokenizer._cached_counts.cache_clear()
+    new, t_cold = bench(term_counts, docs)
+    # repeated texts: a cache-sized slice, tokenised once and then served from the LRU
+    warm_docs = docs[:tokenizer._cached_counts.cache_info().maxsize]
+    tokenizer._cached_counts.cache_clear()
+    bench(term_counts, warm_docs)
+    _, t_warm = bench(term_counts, warm_docs)
+    print(f"文档数 {n_docs}")
+    print(f"旧版 build_terms   : {t_legacy * 1000 / n_docs:.4f} ms/篇，平均 {sum(map(len, legacy)) / n_docs:.1f} 个词项")
+    print(f"新分词器（无缓存） : {t_cold * 1000 / n_docs:.4f} ms/篇，平均 {sum(map(len, new)) / n_docs:.1f} 个词项")
+    print(f"新分词器（缓存命中）: {t_warm * 1000 / max(1, len(warm_docs)):.4f} ms/篇")
+    print(f"精确率@{top_k}（中文短语查询）：旧版 {precision(legacy, docs, queries, legacy_build_terms, top_k):.3f}，"
+          f"新分词器 {precision(new, docs, queries, term_counts, top_k):.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=20000, help="生成的报告数")
+    parser.add_argument('--queries', type=int, default=200, help="检索评测的查询数")
+    parser.add_argument('--top-k', type=int, default=10, help="检索评测的k")
+    args = parser.parse_args()
+    main(args.docs, args.queries, args.top_k)
@@ -0,0 +1,324 @@
+import argparse
+import os
+import time
+from itertools import islice, product
+from pathlib import Path
+
+import pandas as pd
+
+"""
+批量导入neo4j：create_nodes.py + create_relationships.py 的高吞吐版本
+
+- 先创建唯一约束/索引，MERGE 走索引而不是全表扫描
+- 清洗后的CSV按 --chunk-rows 分块流式读取，每 --batch-size 行一次 UNWIND $rows ... MERGE 事务
+- 每个文件输出导入行数与 rows/s
+- --dry-run 使用本地替身驱动，只统计语句与行数，不需要neo4j服务
+
+python get_graph_data/neo4j_import/bulk_import.py --batch-size 5000
+python get_graph_data/neo4j_import/bulk_import.py --relations graph_data/relations.csv
+python get_graph_data/neo4j_import/bulk_import.py --dry-run
+"""
+
+CLEAN_PATH = Path(__file__).resolve().parents[1] / "data/cleaned"    # 清洗后数据路径
+
+# Neo4j 5 语法在前，语法错误时使用 4.x 语法
+CONSTRAINTS = [
+    ("CREATE CONSTRAINT company_symbol IF NOT EXISTS FOR (c:Company) REQUIRE c.symbol IS UNIQUE",
+     "CREATE CONSTRAINT company_symbol IF NOT EXISTS ON (c:Company) ASSERT c.symbol IS UNIQUE"),
+    ("CREATE CONSTRAINT market_index_code IF NOT EXISTS FOR (m:MarketIndex) REQUIRE m.code IS UNIQUE",
+     "CREATE CONSTRAINT market_index_code IF NOT EXISTS ON (m:MarketIndex) ASSERT m.code IS UNIQUE"),
+    ("CREATE CONSTRAINT news_title IF NOT EXISTS FOR (n:News) REQUIRE n.title IS UNIQUE",
+     "CREATE CONSTRAINT news_title IF NOT EXISTS ON (n:News) ASSERT n.title IS UNIQUE"),
+    ("CREATE INDEX market_index_name IF NOT EXISTS FOR (m:MarketIndex) ON (m.name)",
+     "CREATE INDEX market_index_name IF NOT EXISTS FOR (m:MarketIndex) ON (m.name)"),
+]
+
+COMPANY_PROPS = ["name", "price", "percent_change", "high", "low", "open", "prev_close",
+                 "volume", "turnover", "market_cap", "pe_ratio", "pb_ratio", "risk_score"]
+
+COMPANY_CYPHER = (
+    "UNWIND $rows AS row MERGE (c:Company {symbol: row.symbol}) SET "
+    + ", ".join(f"c.{p} = row.{p}" for p in COMPANY_PROPS)
+)
+
+NEWS_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (n:News {title: row.title})
+    SET n.sentiment = row.sentiment,
+        n.score = row.score
+"""
+
+# 返回实际建立的关系数：指数节点或公司不存在时不计入
+INDEX_LINK_CYPHER = """
+    MATCH (m:MarketIndex {name: $index})
+    UNWIND $rows AS row
+    MATCH (c:Company {symbol: row.symbol})
+    MERGE (c)-[:LINKED_TO_INDEX {correlation: $correlation}]->(m)
+    RETURN count(*) AS n
+"""
+
+RISK_EVENT_CYPHER = """
+    UNWIND $rows AS row
+    MATCH (c:Company {symbol: row.symbol})
+    MATCH (n:News {title: row.title})
+    MERGE (c)-[:HAS_RISK_EVENT {impact: row.impact}]->(n)
+"""
+
+
+def _is_label(s):
+    return bool(s) and (s[0].isalpha() or s[0] == "_") and all(ch.isalnum() or ch == "_" for ch in s) and s.isascii()
+
+
+class DryRunDriver:
+    """本地替身驱动：记录语句和行数，不连接数据库"""
+
+    def __init__(self):
+        self.statements = {}
+
+    def session(self):
+        return _DrySession(self)
+
+    def close(self):
+        pass
+
+
+class _DrySession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, cypher, **params):
+        return _DryTx(self.driver).run(cypher, **params)
+
+    def execute_write(self, fn, *args, **kwargs):
+        return fn(_DryTx(self.driver), *args, **kwargs)
+
+
+class _DryTx:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, cypher, **params):
+        key = " ".join(cypher.split())[:80]
+        st = self.driver.statements.setdefault(key, {"calls": 0, "rows": 0})
+        st["calls"] += 1
+        self._rows = len(params.get("rows") or [])
+        st["rows"] += self._rows
+        return self
+
+    def single(self):
+        # RETURN count(*) AS n：替身认为每一行都匹配成功
+        return {"n": self._rows}
+
+    def consume(self):
+        return None
+
+
+def _records(df):
+    # NaN -> None，避免把NaN写成节点属性
+    return df.astype(object).where(pd.notna(df), None).to_dict("records")
+
+
+def _write_batches(session, cypher, rows, batch_size, counted=False, **params):
+    """按 batch_size 分批写入；counted=True 时语句以 RETURN count(*) AS n 结尾，返回 n 的合计而不是输入行数"""
+    def work(tx, batch):
+        res = tx.run(cypher, rows=batch, **params)
+        if counted:
+            rec = res.single()
+            return int(rec["n"]) if rec else 0
+        res.consume()
+        return len(batch)
+
+    n = 0
+    for i in range(0, len(rows), batch_size):
+        n += session.execute_write(work, rows[i:i + batch_size])
+    return n
+
+
+def _import_csv(session, path, cypher_for, batch_size, chunk_rows, prepare=None, label="", key=None):
+    """分块读取CSV并按批写入；cypher_for(columns) 返回该文件使用的语句"""
+    if not path.is_file():
+        print(f"跳过 {label}：未找到 {path}")
+        return 0
+    t0 = time.perf_counter()
+    total = 0
+    # 主键列按字符串读取，避免 000001 这类代码被解析成整数
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype={key: str} if key else None):
+        if prepare is not None:
+            chunk = prepare(chunk)
+        total += _write_batches(session, cypher_for(list(chunk.columns)), _records(chunk), batch_size)
+        dt = time.perf_counter() - t0
+        print(f"  {label}: {total} 行, {total / dt if dt else 0:.0f} rows/s")
+    return total
+
+
+def _is_syntax_error(e):
+    # neo4j.exceptions.CypherSyntaxError；按错误码判断，dry-run 时不需要安装驱动
+    return getattr(e, "code", None) == "Neo.ClientError.Statement.SyntaxError" or type(e).__name__ == "CypherSyntaxError"
+
+
+def create_constraints(session, extra_labels=()):
+    print("创建约束与索引...")
+    for new, old in CONSTRAINTS:
+        try:
+            session.run(new).consume()
+        except Exception as e:
+            # 只有 4.x 不认识 5 的语法时才回退；权限、连接等错误直接抛出
+            if not _is_syntax_error(e):
+                raise
+            session.run(old).consume()
+    for lab in extra_labels:
+        session.run(f"CREATE INDEX {lab.lower()}_id IF NOT EXISTS FOR (n:{lab}) ON (n.id)").consume()
+
+
+def _company_prepare(df):
+    for p in COMPANY_PROPS:
+        if p not in df.columns:
+            df[p] = None
+    return df[["symbol"] + COMPANY_PROPS]
+
+
+def _market_cypher(columns):
+    props = [c for c in columns if c != "code"]
+    sets = ", ".join(f"m.`{c}` = row.`{c}`" for c in props)
+    return "UNWIND $rows AS row MERGE (m:MarketIndex {code: row.code})" + (f" SET {sets}" if sets else "")
+
+
+def import_nodes(session, data_dir, batch_size, chunk_rows):
+    counts = {}
+    print("开始导入Company节点...")
+    counts["Company"] = _import_csv(session, data_dir / "company_clean.csv", lambda cols: COMPANY_CYPHER,
+                                    batch_size, chunk_rows, prepare=_company_prepare, label="Company", key="symbol")
+    print("开始导入MarketIndex节点...")
+    counts["MarketIndex"] = _import_csv(session, data_dir / "market_index_clean.csv", _market_cypher,
+                                        batch_size, chunk_rows, label="MarketIndex", key="code")
+    print("开始导入News节点...")
+    counts["News"] = _import_csv(session, data_dir / "news_clean.csv", lambda cols: NEWS_CYPHER, batch_size, chunk_rows,
+                                 prepare=lambda df: df.reindex(columns=["title", "sentiment", "score"]), label="News", key="title")
+    return counts
+
+
+def import_relationships(session, data_dir, batch_size, chunk_rows, index_name, correlation, events_per_sentiment):
+    counts = {}
+    company_csv = data_dir / "company_clean.csv"
+    news_csv = data_dir / "news_clean.csv"
+    if company_csv.is_file():
+        print(f"开始建立 LINKED_TO_INDEX（{index_name}）...")
+        counts["LINKED_TO_INDEX"] = 0
+        read = 0
+        t0 = time.perf_counter()
+        for chunk in pd.read_csv(company_csv, usecols=["symbol"], dtype=str, chunksize=chunk_rows):
+            read += len(chunk)
+            counts["LINKED_TO_INDEX"] += _write_batches(session, INDEX_LINK_CYPHER, _records(chunk), batch_size,
+                                                        counted=True, index=index_name, correlation=correlation)
+            dt = time.perf_counter() - t0
+            print(f"  LINKED_TO_INDEX: {counts['LINKED_TO_INDEX']} 行, {read / dt if dt else 0:.0f} rows/s")
+        if read and not counts["LINKED_TO_INDEX"]:
+            print(f"  警告：未建立任何 LINKED_TO_INDEX 关系，请确认 MarketIndex {{name: {index_name!r}}} 节点已导入")
+    if company_csv.is_file() and news_csv.is_file() and events_per_sentiment > 0:
+        # 与 create_relationships.py 相同：每种情绪取前 N 个 (新闻, 公司) 组合，但按主键匹配而不是笛卡尔积扫描
+        print("开始建立 HAS_RISK_EVENT...")
+        symbols = list(pd.read_csv(company_csv, usecols=["symbol"], dtype=str, nrows=events_per_sentiment)["symbol"])
+        news = pd.read_csv(news_csv, usecols=["title", "sentiment"], dtype=str)
+        rows = []
+        for sentiment in ("negative", "neutral", "positive"):
+            titles = list(news.loc[news["sentiment"] == sentiment, "title"])
+            for title, symbol in islice(product(titles, symbols), events_per_sentiment):
+                rows.append({"symbol": symbol, "title": title, "impact": "high"})
+        t0 = time.perf_counter()
+        counts["HAS_RISK_EVENT"] = _write_batches(session, RISK_EVENT_CYPHER, rows, batch_size)
+        dt = time.perf_counter() - t0
+        print(f"  HAS_RISK_EVENT: {counts['HAS_RISK_EVENT']} 行, {counts['HAS_RISK_EVENT'] / dt if dt else 0:.0f} rows/s")
+    return counts
+
+
+def relation_labels(path, chunk_rows):
+    labels = set()
+    for chunk in pd.read_csv(path, usecols=["src_type", "dst_type"], chunksize=chunk_rows, dtype=str):
+        labels.update(chunk["src_type"].dropna().unique())
+        labels.update(chunk["dst_type"].dropna().unique())
+    return sorted(l for l in labels if _is_label(l))
+
+
+def import_relations_csv(session, path, batch_size, chunk_rows):
+    """graph_data/relations.csv -> (src:Type {id})-[:REL {type}]->(dst:Type {id})，与 Neo4jClient.upsert_relations 一致"""
+    t0 = time.perf_counter()
+    total = skipped = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str):
+        chunk = chunk.dropna(subset=["src_type", "src_id", "rel", "dst_type", "dst_id"])
+        for (st, dt_), group in chunk.groupby(["src_type", "dst_type"], sort=False):
+            if not (_is_label(st) and _is_label(dt_)):
+                skipped += len(group)
+                continue
+            cypher = (
+                "UNWIND $rows AS row "
+                f"MERGE (a:{st} {{id: row.src_id}}) "
+                f"MERGE (b:{dt_} {{id: row.dst_id}}) "
+                "MERGE (a)-[:REL {type: row.rel}]->(b)"
+            )
+            total += _write_batches(session, cypher, group[["src_id", "rel", "dst_id"]].to_dict("records"), batch_size)
+        dt = time.perf_counter() - t0
+        print(f"  relations: {total} 行, {total / dt if dt else 0:.0f} rows/s")
+    if skipped:
+        print(f"  跳过 {skipped} 行（标签不合法）")
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description="批量导入清洗后的CSV到Neo4j")
+    ap.add_argument("--uri", default=os.environ.get("NEO4J_URI", "bolt://localhost:7687"))
+    ap.add_argument("--user", default=os.environ.get("NEO4J_USER", ""))
+    ap.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD", ""))
+    ap.add_argument("--data-dir", default=str(CLEAN_PATH))
+    ap.add_argument("--batch-size", type=int, default=5000, help="每个 UNWIND 事务的行数")
+    ap.add_argument("--chunk-rows", type=int, default=100000, help="每次从CSV读取的行数")
+    ap.add_argument("--skip-nodes", action="store_true")
+    ap.add_argument("--skip-relationships", action="store_true")
+    ap.add_argument("--relations", default=None, help="额外导入 relations.csv（src_type,src_id,rel,dst_type,dst_id）")
+    ap.add_argument("--index-name", default="上证指数")
+    ap.add_argument("--correlation", type=float, default=0.7)
+    ap.add_argument("--events-per-sentiment", type=int, default=10)
+    ap.add_argument("--dry-run", action="store_true", help="使用本地替身驱动，不连接neo4j")
+    args = ap.parse_args()
+
+    if args.dry_run:
+        driver = DryRunDriver()
+    else:
+        from neo4j import GraphDatabase
+        driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+
+    data_dir = Path(args.data_dir)
+    batch_size = max(1, args.batch_size)
+    chunk_rows = max(batch_size, args.chunk_rows)
+    t0 = time.perf_counter()
+    counts = {}
+    try:
+        with driver.session() as session:
+            extra = relation_labels(args.relations, chunk_rows) if args.relations else ()
+            create_constraints(session, extra)
+            if not args.skip_nodes:
+                counts.update(import_nodes(session, data_dir, batch_size, chunk_rows))
+            if not args.skip_relationships:
+                counts.update(import_relationships(session, data_dir, batch_size, chunk_rows,
+                                                   args.index_name, args.correlation, args.events_per_sentiment))
+            if args.relations:
+                print(f"开始导入 {args.relations}...")
+                counts["relations"] = import_relations_csv(session, args.relations, batch_size, chunk_rows)
+    finally:
+        driver.close()
+
+    total = sum(counts.values())
+    dt = time.perf_counter() - t0
+    print(f"导入完成：{counts}，共 {total} 行，用时 {dt:.2f}s，{total / dt if dt else 0:.0f} rows/s")
+    if args.dry_run:
+        for stmt, st in driver.statements.items():
+            print(f"  [dry-run] {st['calls']} 次, {st['rows']} 行: {stmt}")
+
+
+if __name__ == "__main__":
+    main()
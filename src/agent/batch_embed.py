@@ -1,71 +1,143 @@
 import os
-import json
 import argparse
+import hashlib
+import time
 from src.agent.storage import Storage
-from src.agent.rag import EmbeddingProvider, build_terms, embed_text
+from src.agent.rag import EmbeddingProvider, build_terms
 from pathlib import Path
 
 folder = r" "
 
-def read_text_file(path):
-    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-        return f.read()
+CHUNK_CHARS = 2000
+BATCH_SIZE = 64
 
 
-def collect_files(folder):
-    files = []
+def iter_files(folder):
+    # walk in a stable order so checkpoints and ids line up between runs
     for root, dirs, filenames in os.walk(folder):
-        for fn in filenames:
+        dirs.sort()
+        for fn in sorted(filenames):
             if fn.lower().endswith(('.txt', '.md', '.html')):
-                files.append(os.path.join(root, fn))
-    files.sort()
-    return files
+                yield os.path.join(root, fn)
+
 
+def file_hash(path, block=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for b in iter(lambda: f.read(block), b''):
+            h.update(b)
+    return h.hexdigest()
 
-def main(folder, db_path, assessment_id_offset=1000000, provider_name=None):
+
+def iter_chunks(path, chunk_chars=CHUNK_CHARS):
+    # fixed-size text blocks, so a large file is never held in memory at once
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            block = f.read(chunk_chars)
+            if not block:
+                break
+            if block.strip():
+                yield block
+
+
+def iter_pending(folder, done, chunk_chars, stats):
+    """Yield (file_hash, path, chunk) for files not checkpointed yet; chunk None marks the end of a file."""
+    for path in iter_files(folder):
+        try:
+            h = file_hash(path)
+        except Exception as e:
+            print("读取失败，跳过：", path, e)
+            continue
+        if h in done:
+            stats["skipped"] += 1
+            continue
+        done.add(h)
+        for ch in iter_chunks(path, chunk_chars):
+            yield h, path, ch
+        yield h, path, None
+
+
+def embed_chunks(ep, texts):
+    vecs = ep.embed_batch(texts)
+    if not vecs or len(vecs) != len(texts):
+        vecs = [ep.embed_text(t) for t in texts]
+    return vecs
+
+
+def main(folder, db_path, assessment_id_offset=100000000, provider_name=None, batch_size=BATCH_SIZE, chunk_chars=CHUNK_CHARS):
     storage = Storage(db_path)
     storage.init()
     ep = EmbeddingProvider(provider=provider_name)
-
-    files = collect_files(folder)
-    if not files:
+    print("provider =", ep.provider)
+
+    removed = storage.rollback_partial_embeddings(ep.provider, ep.model_name)
+    if removed:
+        print(f"已清理上次中断时写入一半的 {removed} 条embeddings")
+    checkpoints = storage.get_embed_checkpoints(ep.provider, ep.model_name)
+    done = set(checkpoints)
+    last = storage.max_embedding_id()
+    next_id = max(int(assessment_id_offset), (last + 1) if last is not None else 0)
+
+    stats = {"files": 0, "skipped": 0, "chunks": 0}
+    progress = {}   # file_hash -> [path, first_id, chunks written]
+    batch = []      # (file_hash, text)
+    ended = []      # files whose last chunk is in `batch` or already written
+    t0 = time.perf_counter()
+
+    def flush():
+        nonlocal next_id
+        vecs = embed_chunks(ep, [t for _, t in batch]) if batch else []
+        items = []
+        for (h, txt), vec in zip(batch, vecs):
+            p = progress[h]
+            if p[1] is None:
+                p[1] = next_id
+            items.append((next_id, build_terms(txt), vec, ep.model_name, ep.provider))
+            p[2] += 1
+            next_id += 1
+        touched = {h for h, _ in batch} | set(ended)
+        rows = [(h, ep.provider, ep.model_name, progress[h][0], progress[h][1] or 0, progress[h][2], h in ended)
+                for h in touched]
+        # embeddings and their checkpoints commit together
+        with storage.transaction():
+            storage.save_embeddings_batch(items)
+            storage.save_embed_checkpoints(rows)
+        stats["chunks"] += len(items)
+        stats["files"] += len(ended)
+        for h in ended:
+            progress.pop(h, None)
+        batch.clear()
+        ended.clear()
+        rate = stats["chunks"] / max(time.perf_counter() - t0, 1e-9)
+        print(f"已写入 {stats['chunks']} 个分块，完成 {stats['files']} 个文件（{rate:.1f} 块/秒）")
+
+    for h, path, ch in iter_pending(folder, done, chunk_chars, stats):
+        progress.setdefault(h, [path, None, 0])
+        if ch is None:
+            ended.append(h)
+        else:
+            batch.append((h, ch))
+        if len(batch) >= batch_size:
+            flush()
+    if batch or ended:
+        flush()
+
+    if not stats["files"] and not stats["skipped"]:
         print("没有找到可处理的文件：", folder)
         return
-
-    texts = [read_text_file(p) for p in files]
-
-
-    # Batch embedding first
-    print("尝试批量嵌入：provider =", ep.provider)
-    embeddings = ep.embed_batch(texts)
-
-    # Fallback to per-doc embed
-    if embeddings is None:
-        print("批量嵌入失败，切换为逐文档嵌入…")
-        embeddings = []
-        for t in texts:
-            v = ep.embed_text(t)
-            embeddings.append(v)
-
-    # Prepare database items
-    items = []
-    for idx, (path, vec, txt) in enumerate(zip(files, embeddings, texts)):
-        aid = assessment_id_offset + idx
-        terms = build_terms(txt)
-        items.append((aid, json.dumps(terms, ensure_ascii=False), json.dumps(vec, ensure_ascii=False)))
-
-    print(f"正在写入{len(items)}条embeddings到 {db_path} ...")
-    storage.save_embeddings_batch(items)
-
-    print("完成！当前embeddings总数 =", storage.count_embeddings())
+    es = ep.remote_stats()
+    if es:
+        print(f"请求 {es['requests']} 次（重试 {es['retries']}），{es['texts']} 条文本，{es['texts_per_s']} 条/秒")
+    print(f"跳过已嵌入文件 {stats['skipped']} 个；完成！当前embeddings总数 =", storage.count_embeddings())
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--dir', type=str, required=True, help="选择要读取的文本文件目录")
     parser.add_argument('--db', type=str, default='rag_storage.db', help="指定存embeddings的SQLite文件")
-    parser.add_argument('--offset', type=int, default=1e8, help="生成assessment_id偏移，防止冲突")
+    parser.add_argument('--offset', type=int, default=100000000, help="生成assessment_id偏移，防止冲突")
     parser.add_argument('--provider', type=str, default=None, help="指定 embedding 模型来源[openai/baai/local]")
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE, help="每批嵌入并提交的分块数")
+    parser.add_argument('--chunk-chars', type=int, default=CHUNK_CHARS, help="每个分块的字符数")
     args = parser.parse_args()
-    main(args.dir, args.db, args.offset, args.provider)
-
+    main(args.dir, args.db, args.offset, args.provider, args.batch, args.chunk_chars)
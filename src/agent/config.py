@@ -19,3 +19,40 @@ REQUEST_TIMEOUT = int(os.environ.get("REQUEST_TIMEOUT", "20"))
 REQUEST_RETRIES = int(os.environ.get("REQUEST_RETRIES", "2"))
 SILICONFLOW_BASE_URL = os.environ.get("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn")
 SILICONFLOW_API_KEY = os.environ.get("SILICONFLOW_API_KEY", "")
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "30"))
+ASSESS_BATCH_SIZE = int(os.environ.get("ASSESS_BATCH_SIZE", "5000"))
+SPARSE_WEIGHTING = os.environ.get("SPARSE_WEIGHTING", "tf")
+BM25_K1 = float(os.environ.get("BM25_K1", "1.5"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+VECTOR_CACHE_DIR = os.environ.get("VECTOR_CACHE_DIR", os.path.join(".cache", "vector_store"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_MAX_CHARS = int(os.environ.get("EMBED_BATCH_MAX_CHARS", "32000"))
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "auto")
+IVF_NLIST = int(os.environ.get("IVF_NLIST", "256"))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+IVF_MIN_TRAIN = int(os.environ.get("IVF_MIN_TRAIN", "20000"))
+RAG_CONCURRENT = os.environ.get("RAG_CONCURRENT", "1") == "1"
+RAG_WORKERS = int(os.environ.get("RAG_WORKERS", "8"))
+RAG_SOURCE_TIMEOUT = float(os.environ.get("RAG_SOURCE_TIMEOUT", "3"))
+RAG_DEADLINE = float(os.environ.get("RAG_DEADLINE", "5"))
+CONTEXT_RELOAD_INTERVAL = float(os.environ.get("CONTEXT_RELOAD_INTERVAL", "5"))
+DB_ALLOWED_PATHS = [p for p in os.environ.get("DB_ALLOWED_PATHS", "").split(";") if p]
+CONTEXT_MAX_STORAGES = int(os.environ.get("CONTEXT_MAX_STORAGES", "4"))
+EMBED_DEVICE = os.environ.get("EMBED_DEVICE", "") or None
+EMBED_PRELOAD = os.environ.get("EMBED_PRELOAD", "1") == "1"
+EMBED_WARMUP = os.environ.get("EMBED_WARMUP", "1") == "1"
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "")
+OPENAI_EMBED_BASE_URL = os.environ.get("OPENAI_EMBED_BASE_URL", "") or OPENAI_BASE_URL
+OPENAI_EMBED_API_KEY = os.environ.get("OPENAI_EMBED_API_KEY", "") or OPENAI_API_KEY
+EMBED_REMOTE_BATCH = int(os.environ.get("EMBED_REMOTE_BATCH", "64"))
+EMBED_REMOTE_CONCURRENCY = int(os.environ.get("EMBED_REMOTE_CONCURRENCY", "4"))
+EMBED_REMOTE_RETRIES = int(os.environ.get("EMBED_REMOTE_RETRIES", "5"))
+EMBED_QUERY_RETRIES = int(os.environ.get("EMBED_QUERY_RETRIES", "1"))
+KNOWLEDGE_WORKERS = int(os.environ.get("KNOWLEDGE_WORKERS", str(min(8, os.cpu_count() or 1))))
+TOKENIZER_STOPWORDS = os.environ.get("TOKENIZER_STOPWORDS", "")
+TOKENIZER_CACHE_SIZE = int(os.environ.get("TOKENIZER_CACHE_SIZE", "4096"))
+GRAPH_SNAPSHOT = os.environ.get("GRAPH_SNAPSHOT", "1") == "1"
@@ -0,0 +1,163 @@
+"""
+Long-lived components shared by the web servers.
+
+``RiskAgentContext`` is created once at FastAPI startup and keeps warm
+instances of Storage (one per allowed database path, initialised once), the
+loaded knowledge, VectorStore, GraphClient, Neo4jClient and the embedding
+provider.  ``refresh()`` is cheap to call per request: at most every
+CONTEXT_RELOAD_INTERVAL seconds it stats the knowledge dirs and the graph CSV
+and rebuilds what changed on a background thread; the new component replaces
+the old one in a single assignment, so in-flight requests keep using a
+consistent snapshot and never wait for a rebuild.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .config import DEFAULT_DB_PATH, KNOWLEDGE_DIRS, CONTEXT_RELOAD_INTERVAL, EMBED_PRELOAD, DB_ALLOWED_PATHS, \
+    CONTEXT_MAX_STORAGES
+from .storage import Storage
+from .vector_store import VectorStore
+from .knowledge_base import load_knowledge, _list_files, _files_fingerprint
+from .knowledge_index import knowledge_index
+from .graph_client import GraphClient
+from .graph_snapshot import SNAPSHOT_NAME
+from .neo4j_client import Neo4jClient
+from .rag import EmbeddingProvider, preload_model
+
+
+def _graph_sig(graph_dir):
+    sig = []
+    for name in ("relations.csv", SNAPSHOT_NAME):
+        try:
+            st = os.stat(os.path.join(graph_dir, name))
+            sig.append((st.st_mtime_ns, st.st_size))
+        except Exception:
+            sig.append(None)
+    return tuple(sig)
+
+
+class RiskAgentContext:
+    def __init__(self, db_path=None, graph_dir="graph_data", reload_interval=None):
+        self.db_path = db_path or os.environ.get("DB_PATH", DEFAULT_DB_PATH)
+        self.graph_dir = graph_dir
+        self.reload_interval = CONTEXT_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        # database paths callers may open: the configured one plus DB_ALLOWED_PATHS
+        self.allowed_db_paths = {os.path.abspath(p) for p in [self.db_path] + DB_ALLOWED_PATHS}
+        self._storages = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_check = 0.0
+        self._reloading = False
+        self._knowledge_sig = None
+        self._graph_sig = None
+        self.embedding_provider = None
+        self.knowledge = []
+        self.vector_store = None
+        self.graph_client = None
+        self.neo4j_client = None
+
+    def start(self):
+        self.embedding_provider = EmbeddingProvider()
+        if self.embedding_provider.provider == 'baai' and EMBED_PRELOAD:
+            # load (and warm up) the shared model in the background; the first query waits for it
+            preload_model(self.embedding_provider.baai_model_name)
+        self.storage()
+        self.neo4j_client = Neo4jClient()
+        self.refresh(force=True)
+        return self
+
+    def close(self):
+        with self._lock:
+            for s in self._storages.values():
+                s.close()
+            self._storages = OrderedDict()
+            if self.neo4j_client is not None:
+                self.neo4j_client.close()
+                self.neo4j_client = None
+
+    def storage(self, db_path=None):
+        """Storage for ``db_path`` (default DB_PATH); schema init/migration runs once per path.
+
+        Only the configured path and DB_ALLOWED_PATHS are accepted (ValueError
+        otherwise).  At most CONTEXT_MAX_STORAGES are kept open; the least
+        recently used one other than the default is closed first.
+        """
+        db_path = os.path.abspath(db_path or self.db_path)
+        if db_path not in self.allowed_db_paths:
+            raise ValueError(f"数据库路径不在允许列表中: {db_path}")
+        with self._lock:
+            s = self._storages.get(db_path)
+            if s is None:
+                s = Storage(db_path)
+                s.init()
+                self._storages[db_path] = s
+                default = os.path.abspath(self.db_path)
+                for old in [p for p in self._storages if p not in (default, db_path)]:
+                    if len(self._storages) <= max(1, CONTEXT_MAX_STORAGES):
+                        break
+                    self._storages.pop(old).close()
+            self._storages.move_to_end(db_path)
+        return s
+
+    def refresh(self, force=False):
+        """Reload knowledge/vector store and the CSV graph when their files changed.
+
+        ``force`` rebuilds everything in the calling thread (used at startup);
+        otherwise the changed components are rebuilt on a background thread
+        and swapped in when ready, one rebuild at a time.
+        """
+        now = time.monotonic()
+        if not force and (self._reloading or now - self._last_check < self.reload_interval):
+            return
+        with self._lock:
+            if not force and (self._reloading or now - self._last_check < self.reload_interval):
+                return
+            self._last_check = now
+            ksig = _files_fingerprint(_list_files(KNOWLEDGE_DIRS))
+            gsig = _graph_sig(self.graph_dir)
+            knowledge = force or ksig != self._knowledge_sig
+            graph = force or gsig != self._graph_sig
+            if not (knowledge or graph):
+                return
+            self._reloading = True
+        if force:
+            try:
+                self._reload(knowledge, ksig, graph, gsig)
+            finally:
+                self._reloading = False
+        else:
+            threading.Thread(target=self._reload_background, args=(knowledge, ksig, graph, gsig),
+                             name="context-reload", daemon=True).start()
+
+    def _reload(self, knowledge, ksig, graph, gsig):
+        if knowledge:
+            self._reload_knowledge()
+            self._knowledge_sig = ksig
+        if graph:
+            self.graph_client = GraphClient(self.graph_dir)
+            self._graph_sig = gsig
+
+    def _reload_background(self, *changed):
+        try:
+            self._reload(*changed)
+        except Exception as e:
+            # signatures stay stale, so the next refresh() retries
+            print(f"[context] 后台重新加载失败: {e}")
+        finally:
+            self._reloading = False
+
+    def _reload_knowledge(self):
+        knowledge = load_knowledge()
+        try:
+            # build the item vectors here rather than inside the first query's deadline
+            knowledge_index(knowledge, provider=self.embedding_provider)
+        except Exception as e:
+            print(f"知识索引构建警告: {e}")
+        vs = VectorStore(provider=self.embedding_provider)
+        try:
+            vs.add_knowledge_dirs()
+        except Exception as e:
+            print(f"向量存储初始化警告: {e}")
+        self.knowledge = knowledge
+        self.vector_store = vs
@@ -0,0 +1,225 @@
+"""
+Dense vector index helpers (pure NumPy).
+
+``DenseMatrix`` keeps L2-normalised float32 rows in one contiguous, growable
+buffer so that a query is a single matrix-vector product followed by an
+``argpartition`` top-k instead of a per-row Python loop.  ``IVFIndex`` adds a
+k-means coarse quantizer on top for approximate search over large corpora;
+both serve as the VectorStore backend when FAISS is not installed.
+"""
+import threading
+import numpy as np
+
+
+def normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x.reshape(1, -1)
+    n = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / (n + 1e-12)
+
+
+def topk(scores, k):
+    # indices of the k largest scores, best first
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class DenseMatrix:
+    def __init__(self, dim=None, capacity=1024):
+        self.dim = dim
+        self._capacity = max(1, int(capacity))
+        self._data = None
+        self._n = 0
+        self._lock = threading.RLock()
+        if dim is not None:
+            self._data = np.empty((self._capacity, dim), dtype=np.float32)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def matrix(self):
+        # view of the filled rows (normalised)
+        if self._data is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._data[:self._n]
+
+    def _reserve(self, extra):
+        need = self._n + extra
+        if self._data is None:
+            self._capacity = max(self._capacity, need)
+            self._data = np.empty((self._capacity, self.dim), dtype=np.float32)
+            return
+        if need <= self._data.shape[0]:
+            return
+        cap = self._data.shape[0]
+        while cap < need:
+            cap *= 2
+        buf = np.empty((cap, self.dim), dtype=np.float32)
+        buf[:self._n] = self._data[:self._n]
+        self._data = buf
+
+    def add(self, vectors):
+        """Append vectors (one or many rows); returns the first row position."""
+        x = normalize_rows(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(x.shape[1])
+            if x.shape[1] != self.dim:
+                raise ValueError(f"dimension mismatch: {x.shape[1]} != {self.dim}")
+            self._reserve(x.shape[0])
+            start = self._n
+            self._data[start:start + x.shape[0]] = x
+            self._n += x.shape[0]
+            return start
+
+    def scores(self, queries):
+        q = normalize_rows(queries)
+        return q @ self.matrix.T
+
+    def search(self, query, top_k):
+        """Return ``(scores, positions)`` of the best ``top_k`` rows for one query."""
+        if self._n == 0 or self.dim is None or len(query) != self.dim:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        s = self.scores(query)[0]
+        idx = topk(s, top_k)
+        return s[idx], idx
+
+    @classmethod
+    def from_normalized(cls, arr):
+        """Wrap already-normalised rows (e.g. a read-only memmap) without copying.
+
+        The first append copies into a private growable buffer.
+        """
+        m = cls(dim=int(arr.shape[1]))
+        m._data = arr
+        m._n = int(arr.shape[0])
+        return m
+
+
+def _kmeans(x, k, iters, rng):
+    # spherical k-means on normalised rows; returns normalised centroids
+    c = x[rng.choice(x.shape[0], size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ c.T, axis=1)
+        sums = np.zeros_like(c)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty clusters from random points
+            sums[empty] = x[rng.choice(x.shape[0], size=int(empty.sum()), replace=False)]
+        c = normalize_rows(sums)
+    return c
+
+
+class IVFIndex:
+    """Inverted-file index over a DenseMatrix.
+
+    A spherical k-means coarse quantizer splits the rows into ``nlist`` lists;
+    a query scores the centroids, then only the rows of the ``nprobe`` closest
+    lists.  Until ``min_train`` rows exist (or ``train`` is called) searches
+    are exact.
+    """
+
+    def __init__(self, dim=None, nlist=None, nprobe=None, min_train=None, seed=0):
+        from .config import IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN
+        self.matrix = DenseMatrix(dim=dim)
+        self.nlist = nlist or IVF_NLIST
+        self.nprobe = nprobe or IVF_NPROBE
+        self.min_train = IVF_MIN_TRAIN if min_train is None else min_train
+        self.centroids = None
+        self._lists = None
+        self._seed = seed
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def dim(self):
+        return self.matrix.dim
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @classmethod
+    def from_normalized(cls, arr, train=True, **kwargs):
+        ix = cls(dim=int(arr.shape[1]), **kwargs)
+        ix.matrix = DenseMatrix.from_normalized(arr)
+        if train and len(ix.matrix) >= ix.min_train:
+            ix.train()
+        return ix
+
+    def train(self, iters=10, sample=None):
+        with self._lock:
+            x = self.matrix.matrix
+            n = x.shape[0]
+            k = max(1, min(self.nlist, n))
+            rng = np.random.default_rng(self._seed)
+            sample = sample or k * 256
+            xs = x if n <= sample else x[np.sort(rng.choice(n, size=sample, replace=False))]
+            self.centroids = _kmeans(np.asarray(xs, dtype=np.float32), k, iters, rng)
+            self._lists = [np.empty(0, dtype=np.int64) for _ in range(k)]
+            self._assign(0, x)
+
+    def _assign(self, start, x):
+        # append rows [start, start + len(x)) to their nearest list
+        for i in range(0, x.shape[0], 65536):
+            block = np.asarray(x[i:i + 65536], dtype=np.float32)
+            a = np.argmax(block @ self.centroids.T, axis=1)
+            order = np.argsort(a, kind="stable")
+            bounds = np.searchsorted(a[order], np.arange(len(self._lists) + 1))
+            for c in range(len(self._lists)):
+                lo, hi = bounds[c], bounds[c + 1]
+                if hi > lo:
+                    self._lists[c] = np.concatenate([self._lists[c], order[lo:hi] + start + i])
+
+    def add(self, vectors):
+        with self._lock:
+            start = self.matrix.add(vectors)
+            if self.trained:
+                self._assign(start, self.matrix.matrix[start:])
+            elif len(self.matrix) >= self.min_train:
+                self.train()
+            return start
+
+    def search(self, query, top_k):
+        with self._lock:
+            if not self.trained:
+                return self.matrix.search(query, top_k)
+            if len(query) != self.dim:
+                return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+            q = normalize_rows(query)[0]
+            probe = topk(self.centroids @ q, min(self.nprobe, len(self._lists)))
+            cand = np.concatenate([self._lists[c] for c in probe])
+            if cand.size == 0:
+                return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+            s = np.asarray(self.matrix.matrix[cand], dtype=np.float32) @ q
+            idx = topk(s, top_k)
+            return s[idx], cand[idx]
+
+    def state(self):
+        # centroids + list assignment, for persisting next to the vectors
+        if not self.trained:
+            return None
+        assign = np.full(len(self.matrix), -1, dtype=np.int32)
+        for c, rows in enumerate(self._lists):
+            assign[rows] = c
+        return {"centroids": self.centroids, "assign": assign}
+
+    def load_state(self, centroids, assign):
+        with self._lock:
+            self.centroids = np.asarray(centroids, dtype=np.float32)
+            assign = np.asarray(assign)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(self.centroids.shape[0] + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]].astype(np.int64) for c in range(self.centroids.shape[0])]
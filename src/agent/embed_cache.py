@@ -0,0 +1,132 @@
+"""
+Content-addressed cache for dense embeddings.
+
+Keys are a hash of (provider, model, prefix mode, text).  Vectors are kept
+as float32 arrays in a size-bounded in-memory LRU and, when EMBED_CACHE_PATH
+is set, in a SQLite table so they survive restarts.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import EMBED_CACHE_SIZE, EMBED_CACHE_PATH
+
+_SQL_VARIABLE_CHUNK = 900
+
+
+def cache_key(provider, model, prefix_mode, text):
+    h = hashlib.sha1()
+    for part in (provider, model, prefix_mode, text):
+        h.update(str(part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_items=None, path=None):
+        self.max_items = EMBED_CACHE_SIZE if max_items is None else max_items
+        self.path = EMBED_CACHE_PATH if path is None else path
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            try:
+                d = os.path.dirname(self.path)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB)")
+                self._db.commit()
+            except Exception as e:
+                print("[embed_cache] 磁盘缓存不可用", e)
+                self._db = None
+
+    def _remember(self, key, arr):
+        self._mem[key] = arr
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys):
+        """Cached vectors (float32 arrays) in ``keys`` order, None for misses."""
+        out = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for i, k in enumerate(keys):
+                arr = self._mem.get(k)
+                if arr is not None:
+                    self._mem.move_to_end(k)
+                    out[i] = arr
+                else:
+                    missing.setdefault(k, []).append(i)
+            if missing and self._db is not None:
+                ks = list(missing)
+                try:
+                    for start in range(0, len(ks), _SQL_VARIABLE_CHUNK):
+                        part = ks[start:start + _SQL_VARIABLE_CHUNK]
+                        q = "SELECT key, vec FROM embeddings WHERE key IN (%s)" % ",".join("?" * len(part))
+                        for k, blob in self._db.execute(q, part):
+                            arr = np.frombuffer(blob, dtype="<f4")
+                            if self.max_items > 0:
+                                self._remember(k, arr)
+                            for i in missing.pop(k):
+                                out[i] = arr
+                except Exception:
+                    pass
+            n_miss = sum(len(v) for v in missing.values())
+            self.misses += n_miss
+            self.hits += len(keys) - n_miss
+        return out
+
+    def put_many(self, keys, vectors):
+        rows = []
+        with self._lock:
+            for k, v in zip(keys, vectors):
+                if v is None:
+                    continue
+                arr = np.asarray(v, dtype="<f4")
+                if self.max_items > 0:
+                    self._remember(k, arr)
+                rows.append((k, arr.tobytes()))
+            if rows and self._db is not None:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", rows)
+                    self._db.commit()
+                except Exception:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache; None when both tiers are disabled."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    if _cache.max_items <= 0 and _cache._db is None:
+        return None
+    return _cache
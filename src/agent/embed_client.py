@@ -0,0 +1,173 @@
+"""
+Client for OpenAI-compatible ``/v1/embeddings`` endpoints.
+
+One keep-alive ``requests.Session`` per (base url, key, model); large inputs
+are split into EMBED_REMOTE_BATCH-sized requests, at most
+EMBED_REMOTE_CONCURRENCY of them in flight.  429 and 5xx responses are
+retried with exponential backoff (honouring ``Retry-After``, capped at the
+maximum backoff); interactive query embeddings get a shorter budget of
+EMBED_QUERY_RETRIES retries and waits of at most ``_QUERY_BACKOFF_MAX``.
+A 200 response that is not a list of embeddings matching the input raises
+``EmbeddingResponseError``.  Basic throughput counters are kept in ``stats()``.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import EMBED_REMOTE_BATCH, EMBED_REMOTE_CONCURRENCY, EMBED_REMOTE_RETRIES, EMBED_QUERY_RETRIES, \
+    REQUEST_TIMEOUT
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 30.0
+_QUERY_BACKOFF_MAX = 1.0
+
+
+class EmbeddingResponseError(ValueError):
+    pass
+
+
+def _retry_after(resp):
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After")))
+    except Exception:
+        return None
+
+
+def _parse_embeddings(r, n):
+    # vectors from a 200 response, in input order; raises EmbeddingResponseError on anything else
+    try:
+        j = r.json()
+    except ValueError:
+        raise EmbeddingResponseError(f"嵌入接口返回的不是JSON: {r.text[:200]!r}")
+    data = j.get('data') if isinstance(j, dict) else None
+    if not isinstance(data, list) or len(data) != n:
+        raise EmbeddingResponseError(f"嵌入接口返回 {len(data) if isinstance(data, list) else 'no'} 条 data，期望 {n} 条")
+    if not all(isinstance(d, dict) and isinstance(d.get('embedding'), list) and d['embedding'] for d in data):
+        raise EmbeddingResponseError("嵌入接口返回的 data 中缺少 embedding 向量")
+    dims = {len(d['embedding']) for d in data}
+    if len(dims) != 1:
+        raise EmbeddingResponseError(f"嵌入接口返回的向量维度不一致: {sorted(dims)}")
+    data = sorted(data, key=lambda d: d.get('index', 0))
+    return [d['embedding'] for d in data], int((j.get('usage') or {}).get('total_tokens') or 0)
+
+
+class RemoteEmbeddingClient:
+    def __init__(self, base_url, api_key, model, batch_size=None, concurrency=None, retries=None, timeout=None,
+                 query_retries=None):
+        self.url = base_url.rstrip('/') + '/v1/embeddings'
+        self.model = model
+        self.batch_size = max(1, batch_size or EMBED_REMOTE_BATCH)
+        self.concurrency = max(1, concurrency or EMBED_REMOTE_CONCURRENCY)
+        self.retries = EMBED_REMOTE_RETRIES if retries is None else retries
+        self.query_retries = EMBED_QUERY_RETRIES if query_retries is None else query_retries
+        self.timeout = timeout or REQUEST_TIMEOUT
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "texts": 0, "tokens": 0, "seconds": 0.0, "wall_seconds": 0.0}
+
+    def _count(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                self._stats[k] += v
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        # "seconds" sums request latency over all workers; throughput uses wall time in embed()
+        s["texts_per_s"] = round(s["texts"] / s["wall_seconds"], 2) if s["wall_seconds"] else 0.0
+        return s
+
+    def _post(self, texts, retries=None, max_wait=_BACKOFF_MAX):
+        # one request with retries; returns vectors in input order or None
+        payload = {"model": self.model, "input": texts}
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            t0 = time.perf_counter()
+            wait = None
+            try:
+                r = self.session.post(self.url, json=payload, timeout=self.timeout)
+                self._count(requests=1, seconds=time.perf_counter() - t0)
+                if r.status_code == 200:
+                    try:
+                        vecs, tokens = _parse_embeddings(r, len(texts))
+                    except EmbeddingResponseError:
+                        self._count(failures=1)
+                        raise
+                    self._count(texts=len(texts), tokens=tokens)
+                    return vecs
+                if r.status_code not in _RETRY_STATUS:
+                    break
+                wait = _retry_after(r)
+            except requests.RequestException:
+                self._count(requests=1, seconds=time.perf_counter() - t0)
+            if attempt == retries:
+                break
+            if wait is None:
+                wait = _BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random() / 2)
+            self._count(retries=1)
+            time.sleep(min(max_wait, wait))
+        self._count(failures=1)
+        return None
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        return self._pool
+
+    def embed(self, texts, interactive=False):
+        """Vectors for ``texts`` in order, or None if any request ultimately failed.
+
+        ``interactive`` (a user query waiting on the result) uses the short
+        EMBED_QUERY_RETRIES budget.  Raises EmbeddingResponseError when the
+        endpoint answers 200 with a malformed body.
+        """
+        if not texts:
+            return []
+        t0 = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if interactive:
+            results = [self._post(b, self.query_retries, _QUERY_BACKOFF_MAX) for b in batches]
+        elif len(batches) == 1:
+            results = [self._post(batches[0])]
+        else:
+            results = list(self._executor().map(self._post, batches))
+        self._count(wall_seconds=time.perf_counter() - t0)
+        out = []
+        for b, vecs in zip(batches, results):
+            if not vecs or len(vecs) != len(b):
+                return None
+            out.extend(vecs)
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url, api_key, model):
+    """Shared client (and connection pool) per endpoint/key/model."""
+    key = (base_url, api_key, model)
+    c = _clients.get(key)
+    if c is None:
+        with _clients_lock:
+            c = _clients.get(key)
+            if c is None:
+                c = _clients[key] = RemoteEmbeddingClient(base_url, api_key, model)
+    return c
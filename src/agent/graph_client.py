@@ -1,39 +1,232 @@
 import os
 import csv
+from array import array
+import numpy as np
+
+from .config import GRAPH_SNAPSHOT
+from .graph_traversal import CSRGraph
+from . import graph_snapshot
+
+# relations.csv columns
+COLUMNS = ("src_type", "src_id", "rel", "dst_type", "dst_id")
 
 
 class GraphClient:
-    def __init__(self, dir_path):
+    """Relations graph from ``relations.csv`` with forward/reverse adjacency.
+
+    Nodes are integer ids over ``(type, id)``: each id string is stored once
+    in the node table, node types and relation names once in a small string
+    table.  Edges are parallel int arrays, so a neighbour lookup is a dict hit
+    plus O(degree) work.  CSV columns beyond ``COLUMNS`` are kept as one
+    string column per name and returned with every edge dict.
+
+    When ``relations.graph`` (see graph_snapshot) was built from the current
+    CSV, the same fields are read-only views over the mapped snapshot instead.
+    """
+
+    def __init__(self, dir_path, use_snapshot=None):
         self.dir_path = dir_path
-        self.edges = []
+        self.use_snapshot = GRAPH_SNAPSHOT if use_snapshot is None else use_snapshot
+        self.snapshot = None        # path of the mapped snapshot, if any
+        self._strings = []          # node types and relation names
+        self._string_ids = {}
+        self._node_ids = {}         # (type, id) -> node id
+        self._node_type = array('i')  # node id -> type sid
+        self._node_key = []           # node id -> id string
+        self._src = array('i')      # per edge: node ids and relation sid
+        self._dst = array('i')
+        self._rel = array('i')
+        self._out = {}              # node id -> [edge ids] (CSV order)
+        self._in = {}
+        self._extra = {}            # extra CSV column name -> per-edge strings
+        self._traversal = None
         self._load()
 
     def _load(self):
+        if self.use_snapshot and self._load_snapshot():
+            return
+        self._load_csv()
+
+    def _load_snapshot(self):
+        path = os.path.join(self.dir_path, graph_snapshot.SNAPSHOT_NAME)
+        if not os.path.isfile(path):
+            return False
+        loaded = graph_snapshot.load_snapshot(path, csv_sig=graph_snapshot.csv_signature(self.dir_path))
+        if loaded is None:
+            return False
+        header, a = loaded
+        self._strings = list(header["strings"])
+        self._string_ids = {x: i for i, x in enumerate(self._strings)}
+        self._node_type = a["node_type"]
+        self._node_key = graph_snapshot.StringColumn(a["key_offsets"], a["key_bytes"])
+        self._node_ids = graph_snapshot.NodeIndex(self._strings, self._node_type, self._node_key, a["key_order"])
+        self._src, self._dst, self._rel = a["src"], a["dst"], a["rel"]
+        self._out = graph_snapshot.CSRAdjacency(a["out_ptr"], a["out_eids"])
+        self._in = graph_snapshot.CSRAdjacency(a["in_ptr"], a["in_eids"])
+        self._extra = {c: graph_snapshot.StringColumn(a[f"extra{i}_offsets"], a[f"extra{i}_bytes"])
+                       for i, c in enumerate(header.get("extra", []))}
+        self.snapshot = path
+        return True
+
+    def _thaw(self):
+        # snapshot views are read-only: copy into the mutable CSV-load layout before add_edge
+        n = self.num_nodes
+        keys = [self._node_key[i] for i in range(n)]
+        types = self._node_type
+        self._node_ids = {(self._strings[types[i]], keys[i]): i for i in range(n)}
+        self._node_key = keys
+        self._node_type = array('i', np.asarray(types).tobytes())
+        out, inn = {}, {}
+        for adj, d in ((self._out, out), (self._in, inn)):
+            ptr, eids = adj.ptr, adj.eids.tolist()
+            for v in np.flatnonzero(np.diff(ptr)).tolist():
+                d[v] = eids[ptr[v]:ptr[v + 1]]
+        self._out, self._in = out, inn
+        self._src, self._dst, self._rel = (array('i', np.asarray(x).tobytes()) for x in (self._src, self._dst, self._rel))
+        self._extra = {c: [col[e] for e in range(len(col))] for c, col in self._extra.items()}
+        self.snapshot = None
+
+    def _load_csv(self):
         fp = os.path.join(self.dir_path, "relations.csv")
         if not os.path.isfile(fp):
             return
         with open(fp, "r", encoding="utf-8") as f:
-            r = csv.DictReader(f)
+            r = csv.reader(f)
+            header = next(r, None)
+            if not header:
+                return
+            try:
+                cols = [header.index(c) for c in COLUMNS]
+            except ValueError:
+                return
+            width = max(cols) + 1
+            c_st, c_si, c_rel, c_dt, c_di = cols
+            extra = [(i, self._extra.setdefault(c, [])) for i, c in enumerate(header) if c and c not in COLUMNS]
+            # add_edge inlined with local bindings (interning still goes through _node/_sid): once per CSV row
+            sid, node = self._sid, self._node
+            src, dst, rels, out, inn = self._src, self._dst, self._rel, self._out, self._in
+
+            e = len(src)
             for row in r:
-                self.edges.append(row)
+                if len(row) < width:
+                    continue
+                s_ = node(row[c_st], row[c_si])
+                d_ = node(row[c_dt], row[c_di])
+                src.append(s_)
+                dst.append(d_)
+                rels.append(sid(row[c_rel]))
+                for i, col in extra:
+                    col.append(row[i] if i < len(row) else "")
+                lst = out.get(s_)
+                if lst is None:
+                    out[s_] = [e]
+                else:
+                    lst.append(e)
+                lst = inn.get(d_)
+                if lst is None:
+                    inn[d_] = [e]
+                else:
+                    lst.append(e)
+                e += 1
+
+    def _sid(self, s):
+        i = self._string_ids.get(s)
+        if i is None:
+            i = self._string_ids[s] = len(self._strings)
+            self._strings.append(s)
+        return i
+
+    def _node(self, node_type, node_key):
+        k = (node_type, node_key)
+        n = self._node_ids.get(k)
+        if n is None:
+            n = self._node_ids[k] = len(self._node_type)
+            self._node_type.append(self._sid(node_type))
+            self._node_key.append(node_key)
+        return n
+
+    def add_edge(self, src_type, src_id, rel, dst_type, dst_id, **attrs):
+        """Append an edge; ``attrs`` fill extra columns (a new name adds a column, "" for older edges)."""
+        if self.snapshot is not None:
+            self._thaw()
+        s = self._node(src_type, src_id)
+        d = self._node(dst_type, dst_id)
+        e = len(self._src)
+        self._src.append(s)
+        self._dst.append(d)
+        self._rel.append(self._sid(rel))
+        for c in attrs:
+            if c not in self._extra and c not in COLUMNS:
+                self._extra[c] = [""] * e
+        for c, col in self._extra.items():
+            col.append(str(attrs.get(c, "")))
+        self._out.setdefault(s, []).append(e)
+        self._in.setdefault(d, []).append(e)
+        self._traversal = None
+        return e
+
+    def __len__(self):
+        return len(self._src)
+
+    @property
+    def num_nodes(self):
+        return len(self._node_type)
+
+    def node_id(self, node_type, node_key):
+        """Integer id of a node, or None if it is not in the graph."""
+        n = self._node_ids.get((node_type, node_key))
+        return None if n is None else int(n)
+
+    def node(self, n):
+        return self._strings[self._node_type[n]], self._node_key[n]
+
+    def edge(self, e):
+        """Edge ``e`` as a CSV row dict: the five COLUMNS plus any extra columns."""
+        e = int(e)
+        st, sk = self.node(self._src[e])
+        dt, dk = self.node(self._dst[e])
+        d = {"src_type": st, "src_id": sk, "rel": self._strings[self._rel[e]], "dst_type": dt, "dst_id": dk}
+        for c, col in self._extra.items():
+            d[c] = col[e]
+        return d
+
+    @property
+    def edges(self):
+        # materialised row dicts, for callers of the old list-of-rows attribute
+        return [self.edge(e) for e in range(len(self))]
+
+    def _edge_ids(self, adj, node_type, node_key):
+        n = self.node_id(node_type, node_key)
+        return adj.get(n, ()) if n is not None else ()
 
     def neighbors(self, src_type, src_id):
-        res = []
-        for e in self.edges:
-            if e.get("src_type") == src_type and e.get("src_id") == src_id:
-                res.append(e)
-        return res
+        return [self.edge(e) for e in self._edge_ids(self._out, src_type, src_id)]
 
-    def describe_account(self, account_id, limit=5):
-        items = self.neighbors("Account", account_id)
+    def in_neighbors(self, dst_type, dst_id):
+        return [self.edge(e) for e in self._edge_ids(self._in, dst_type, dst_id)]
+
+    def traversal(self):
+        """CSR view of the edges for multi-hop queries (see graph_traversal)."""
+        t = self._traversal
+        if t is None or t.num_edges != len(self) or t.num_nodes != self.num_nodes:
+            t = self._traversal = CSRGraph.from_client(self)
+        return t
+
+    def k_hop(self, seeds, hops, direction="both", max_nodes=None):
+        return self.traversal().k_hop(seeds, hops, direction=direction, max_nodes=max_nodes)
+
+    def shortest_path(self, source, target, direction="both", max_hops=None):
+        return self.traversal().shortest_path(source, target, direction=direction, max_hops=max_hops)
+
+    def _describe(self, src_type, src_id, limit):
         out = []
-        for e in items[:limit]:
-            out.append(f"{e.get('src_type')}:{e.get('src_id')} -[{e.get('rel')}]→ {e.get('dst_type')}:{e.get('dst_id')}")
+        for e in self._edge_ids(self._out, src_type, src_id)[:limit]:
+            d = self.edge(e)
+            out.append(f"{d['src_type']}:{d['src_id']} -[{d['rel']}]→ {d['dst_type']}:{d['dst_id']}")
         return out
 
+    def describe_account(self, account_id, limit=5):
+        return self._describe("Account", account_id, limit)
+
     def describe_company(self, symbol, limit=5):
-        items = self.neighbors("Company", symbol)
-        out = []
-        for e in items[:limit]:
-            out.append(f"{e.get('src_type')}:{e.get('src_id')} -[{e.get('rel')}]→ {e.get('dst_type')}:{e.get('dst_id')}")
-        return out
+        return self._describe("Company", symbol, limit)
@@ -0,0 +1,220 @@
+"""
+Binary snapshot of ``relations.csv`` for fast GraphClient startup.
+
+``relations.graph`` holds a JSON header (string table of node types and
+relation names, the CSV signature it was built from, array offsets) and
+64-byte aligned arrays:
+
+    node_type  int32[n]     key_offsets int64[n+1]   key_bytes uint8[...]
+    key_order  int32[n]     nodes sorted by (type, key), for lookups
+    src/dst/rel int32[m]    edges in CSV order
+    out_ptr/in_ptr int64[n+1], out_eids/in_eids int32[m]   CSR adjacency
+    extra{i}_offsets int64[m+1], extra{i}_bytes uint8[...]  extra CSV column i
+
+Loading maps the file and wraps the arrays without reading them, so startup
+time and RSS no longer grow with the CSV.  A rebuild replaces the file
+atomically; on Windows a file mapped by a running process cannot be
+replaced, so write_snapshot raises PermissionError there and the service
+using the snapshot has to be stopped first.
+
+    python -m src.agent.graph_snapshot --graph-dir graph_data
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import numpy as np
+
+from .io_utils import write_atomic
+
+SNAPSHOT_NAME = "relations.graph"
+_MAGIC = b"RAGRAPH1"
+_VERSION = 2
+_ALIGN = 64
+
+
+def csv_signature(dir_path):
+    try:
+        st = os.stat(os.path.join(dir_path, "relations.csv"))
+        return [st.st_mtime_ns, st.st_size]
+    except Exception:
+        return None
+
+
+class StringColumn:
+    """Read-only sequence of UTF-8 strings stored as offsets + bytes."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class NodeIndex:
+    """``(type, key) -> node id`` by binary search over the sorted key order."""
+
+    def __init__(self, strings, node_type, keys, order):
+        self._type_ids = {s: i for i, s in enumerate(strings)}
+        self._node_type = node_type
+        self._keys = keys
+        self._order = order
+
+    def get(self, key, default=None):
+        t = self._type_ids.get(key[0])
+        if t is None:
+            return default
+        target = (t, key[1])
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            n = int(self._order[mid])
+            if (int(self._node_type[n]), self._keys[n]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._order):
+            n = int(self._order[lo])
+            if int(self._node_type[n]) == t and self._keys[n] == key[1]:
+                return n
+        return default
+
+
+class CSRAdjacency:
+    """``node id -> edge ids`` view over CSR arrays (dict-like ``get``)."""
+
+    def __init__(self, ptr, eids):
+        self.ptr = ptr
+        self.eids = eids
+
+    def get(self, n, default=()):
+        if n is None or not 0 <= n < len(self.ptr) - 1:
+            return default
+        return self.eids[self.ptr[n]:self.ptr[n + 1]]
+
+
+def _encode_strings(values):
+    # (offsets int64[len+1], utf-8 bytes) for a StringColumn
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _csr(a, num_nodes):
+    order = np.argsort(a, kind="stable").astype(np.int32)
+    ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(a, minlength=num_nodes), out=ptr[1:])
+    return ptr, order
+
+
+def write_snapshot(graph_client, path=None, csv_sig=None):
+    """Write ``graph_client``'s graph to ``path`` (default: next to relations.csv)."""
+    g = graph_client
+    path = path or os.path.join(g.dir_path, SNAPSHOT_NAME)
+    n = g.num_nodes
+    src = np.asarray(g._src, dtype=np.int32)
+    dst = np.asarray(g._dst, dtype=np.int32)
+    keys = [g._node_key[i] for i in range(n)]
+    key_offsets, key_bytes = _encode_strings(keys)
+    node_type = np.asarray(g._node_type, dtype=np.int32)
+    order = sorted(range(n), key=lambda i: (node_type[i], keys[i]))
+    out_ptr, out_eids = _csr(src, n)
+    in_ptr, in_eids = _csr(dst, n)
+    arrays = {
+        "node_type": node_type,
+        "key_offsets": key_offsets,
+        "key_bytes": key_bytes,
+        "key_order": np.asarray(order, dtype=np.int32),
+        "src": src,
+        "dst": dst,
+        "rel": np.asarray(g._rel, dtype=np.int32),
+        "out_ptr": out_ptr,
+        "out_eids": out_eids,
+        "in_ptr": in_ptr,
+        "in_eids": in_eids,
+    }
+    for i, col in enumerate(g._extra.values()):
+        arrays[f"extra{i}_offsets"], arrays[f"extra{i}_bytes"] = _encode_strings([col[e] for e in range(len(col))])
+    layout, pos = {}, 0
+    for name, arr in arrays.items():
+        pos = -(-pos // _ALIGN) * _ALIGN
+        layout[name] = [pos, arr.dtype.str, len(arr)]
+        pos += arr.nbytes
+    header = json.dumps({
+        "version": _VERSION,
+        "strings": list(g._strings),
+        "extra": list(g._extra),
+        "csv": csv_sig if csv_sig is not None else csv_signature(g.dir_path),
+        "arrays": layout,
+    }).encode("utf-8")
+    base = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    def write(p):
+        with open(p, "wb") as f:
+            f.write(_MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, arr in arrays.items():
+                f.seek(base + layout[name][0])
+                f.write(np.ascontiguousarray(arr).tobytes())
+            f.truncate(base + pos)
+    try:
+        write_atomic(path, write)
+    except PermissionError as e:
+        # Windows: the old snapshot is still mapped by a GraphClient in some process
+        raise PermissionError(f"无法替换 {path}：文件正被其他进程映射，请先停止使用该快照的服务") from e
+    return path
+
+
+def load_snapshot(path, csv_sig=None):
+    """Map a snapshot; returns ``(header, arrays)`` or None if missing, stale or unreadable.
+
+    When ``csv_sig`` is given the snapshot is only used if it was built from
+    a CSV with that signature.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                return None
+            (hlen,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(hlen).decode("utf-8"))
+        if header.get("version") != _VERSION:
+            return None
+        if csv_sig is not None and header.get("csv") != csv_sig:
+            return None
+        base = -(-(len(_MAGIC) + 8 + hlen) // _ALIGN) * _ALIGN
+        mm = np.memmap(path, dtype=np.uint8, mode="r")
+        arrays = {}
+        for name, (off, dtype, count) in header["arrays"].items():
+            arrays[name] = np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=base + off)
+        return header, arrays
+    except Exception as e:
+        print("[graph] 快照不可用，改为解析CSV", e)
+        return None
+
+
+def main():
+    from .graph_client import GraphClient
+    ap = argparse.ArgumentParser(description="将 relations.csv 编译为可内存映射的二进制快照")
+    ap.add_argument("--graph-dir", default="graph_data")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    sig = csv_signature(args.graph_dir)
+    if sig is None:
+        raise SystemExit(f"未找到 {os.path.join(args.graph_dir, 'relations.csv')}")
+    t0 = time.perf_counter()
+    gc = GraphClient(args.graph_dir, use_snapshot=False)
+    t1 = time.perf_counter()
+    try:
+        path = write_snapshot(gc, args.out, csv_sig=sig)
+    except PermissionError as e:
+        raise SystemExit(str(e))
+    print(f"[graph] {gc.num_nodes} 个节点, {len(gc)} 条边; 解析 {t1 - t0:.2f}s, 写入 {time.perf_counter() - t1:.2f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Multi-hop queries over the relations graph held by ``GraphClient``.
+
+The edge arrays are turned into CSR adjacency (``indptr``/``indices`` plus
+the edge id of every slot) once per direction.  BFS expands a whole frontier
+per step with array gathers, shortest paths keep a parent edge per node, and
+risk propagation is a personalized PageRank iterated with ``np.bincount``
+over the edge list, so graphs with millions of edges stay in memory on one
+box without a Neo4j server.
+
+    python -m src.agent.graph_traversal khop Company:600519 --hops 3
+    python -m src.agent.graph_traversal path Account:A1 Company:600519
+    python -m src.agent.graph_traversal propagate --db risk_agent.sqlite --top 20
+"""
+import argparse
+import threading
+import numpy as np
+
+DIRECTIONS = ("out", "in", "both")
+
+
+class CSRGraph:
+    def __init__(self, src, dst, num_nodes):
+        self.num_nodes = int(num_nodes)
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self._adj = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_client(cls, graph_client):
+        g = graph_client
+        if g.snapshot is not None:
+            # mapped snapshot: share its arrays and reuse its CSR for out/in
+            t = cls(g._src, g._dst, g.num_nodes)
+            t._adj["out"] = (g._out.ptr, t.dst[g._out.eids], g._out.eids)
+            t._adj["in"] = (g._in.ptr, t.src[g._in.eids], g._in.eids)
+            return t
+        # copies: a live buffer view would stop the client's arrays from growing
+        return cls(np.array(g._src, dtype=np.int32), np.array(g._dst, dtype=np.int32), g.num_nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def _edges(self, direction):
+        # (from, to, edge id) arrays for one traversal direction
+        eid = np.arange(self.num_edges, dtype=np.int32)
+        if direction == "out":
+            return self.src, self.dst, eid
+        if direction == "in":
+            return self.dst, self.src, eid
+        if direction == "both":
+            return (np.concatenate([self.src, self.dst]), np.concatenate([self.dst, self.src]),
+                    np.concatenate([eid, eid]))
+        raise ValueError(f"direction must be one of {DIRECTIONS}")
+
+    def adjacency(self, direction="both"):
+        """CSR ``(indptr, indices, edge_ids)`` for ``direction``, built on first use."""
+        adj = self._adj.get(direction)
+        if adj is None:
+            with self._lock:
+                adj = self._adj.get(direction)
+                if adj is None:
+                    a, b, eid = self._edges(direction)
+                    order = np.argsort(a, kind="stable")
+                    indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+                    np.cumsum(np.bincount(a, minlength=self.num_nodes), out=indptr[1:])
+                    adj = self._adj[direction] = (indptr, b[order], eid[order])
+        return adj
+
+    def _expand(self, frontier, direction):
+        # all (neighbour, parent, edge id) slots of the frontier nodes
+        indptr, indices, eids = self.adjacency(direction)
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, empty
+        # slot positions: each frontier node's [start, end) range laid end to end
+        shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        pos = shift + np.arange(total, dtype=np.int64)
+        return indices[pos], np.repeat(frontier, counts), eids[pos]
+
+    def k_hop(self, seeds, hops, direction="both", max_nodes=None):
+        """Nodes within ``hops`` of ``seeds`` as ``{node: depth}`` (seeds at depth 0).
+
+        ``max_nodes`` stops the search once that many nodes have been reached;
+        the last level is then cut short in node id order.
+        """
+        depth = np.full(self.num_nodes, -1, dtype=np.int32)
+        frontier = np.unique(np.asarray(list(seeds), dtype=np.int32))
+        depth[frontier] = 0
+        found = len(frontier)
+        for d in range(1, hops + 1):
+            if not len(frontier) or (max_nodes and found >= max_nodes):
+                break
+            nbrs, _, _ = self._expand(frontier, direction)
+            nbrs = np.unique(nbrs)
+            frontier = nbrs[depth[nbrs] < 0]
+            if max_nodes:
+                frontier = frontier[:max(0, max_nodes - found)]
+            depth[frontier] = d
+            found += len(frontier)
+        reached = np.flatnonzero(depth >= 0)
+        return dict(zip(reached.tolist(), depth[reached].tolist()))
+
+    def shortest_path(self, source, target, direction="both", max_hops=None):
+        """Unweighted shortest path as ``(nodes, edge_ids)``, or None if unreachable."""
+        if source == target:
+            return [source], []
+        parent = np.full(self.num_nodes, -1, dtype=np.int64)
+        via = np.full(self.num_nodes, -1, dtype=np.int64)
+        seen = np.zeros(self.num_nodes, dtype=bool)
+        seen[source] = True
+        frontier = np.asarray([source], dtype=np.int32)
+        hop = 0
+        while len(frontier) and not seen[target]:
+            if max_hops is not None and hop >= max_hops:
+                return None
+            nbrs, par, eid = self._expand(frontier, direction)
+            fresh = ~seen[nbrs]
+            nbrs, par, eid = nbrs[fresh], par[fresh], eid[fresh]
+            # first slot wins for nodes reached from several parents
+            nbrs, first = np.unique(nbrs, return_index=True)
+            parent[nbrs] = par[first]
+            via[nbrs] = eid[first]
+            seen[nbrs] = True
+            frontier = nbrs
+            hop += 1
+        if not seen[target]:
+            return None
+        nodes, edges = [target], []
+        n = target
+        while n != source:
+            edges.append(int(via[n]))
+            n = int(parent[n])
+            nodes.append(n)
+        return nodes[::-1], edges[::-1]
+
+    def personalized_pagerank(self, seeds, alpha=0.85, max_iter=50, tol=1e-6, direction="both"):
+        """Personalized PageRank restarting at ``seeds`` (``{node: weight}``).
+
+        Mass that reaches a node without out-edges is sent back to the seeds.
+        Returns a float64 array over all nodes summing to 1.
+        """
+        restart = np.zeros(self.num_nodes, dtype=np.float64)
+        for n, w in seeds.items():
+            if w and w > 0:
+                restart[n] += float(w)
+        total = restart.sum()
+        if total <= 0:
+            return restart
+        restart /= total
+        indptr, indices, _ = self.adjacency(direction)
+        outdeg = np.diff(indptr)
+        inv = np.zeros(self.num_nodes, dtype=np.float64)
+        np.divide(1.0, outdeg, out=inv, where=outdeg > 0)
+        dangling = outdeg == 0
+        x = restart.copy()
+        for _ in range(max_iter):
+            # CSR slots are grouped by source, so each node's share is a repeat, not a gather
+            y = np.bincount(indices, weights=np.repeat(x * inv, outdeg), minlength=self.num_nodes)
+            y += x[dangling].sum() * restart
+            y = alpha * y + (1.0 - alpha) * restart
+            err = np.abs(y - x).sum()
+            x = y
+            if err < tol:
+                break
+        return x
+
+
+def risk_seeds(graph_client, scores, node_types=("Account", "Company")):
+    """Map ``{entity_id: risk_score}`` to ``{node: score}`` for every matching node type."""
+    out = {}
+    for entity_id, score in scores.items():
+        if score is None:
+            continue
+        for t in node_types:
+            n = graph_client.node_id(t, str(entity_id))
+            if n is not None:
+                out[n] = max(out.get(n, 0.0), float(score))
+    return out
+
+
+def propagate_risk(graph_client, scores, alpha=0.85, top_k=20, direction="both", exclude_seeds=False):
+    """Rank nodes by risk propagated from assessed entities.
+
+    ``scores`` is ``{entity_id: risk_score}`` (e.g. ``Storage.latest_risk_scores()``).
+    The PageRank mass is rescaled by the total seed risk so the values stay on
+    the risk-score scale.  Returns ``[(node_type, node_id, score)]`` best first.
+    """
+    seeds = risk_seeds(graph_client, scores)
+    if not seeds:
+        return []
+    pr = graph_client.traversal().personalized_pagerank(seeds, alpha=alpha, direction=direction)
+    pr *= sum(seeds.values())
+    if exclude_seeds:
+        pr[list(seeds)] = 0.0
+    k = min(top_k, int(np.count_nonzero(pr)))
+    if k <= 0:
+        return []
+    top = np.argpartition(-pr, k - 1)[:k]
+    top = top[np.argsort(-pr[top], kind="stable")]
+    return [(*graph_client.node(int(n)), float(pr[n])) for n in top]
+
+
+def _parse_node(graph_client, s):
+    t, _, k = s.partition(":")
+    n = graph_client.node_id(t, k)
+    if n is None:
+        raise SystemExit(f"图中没有节点 {s}")
+    return n
+
+
+def main():
+    from .graph_client import GraphClient
+    ap = argparse.ArgumentParser(description="relations.csv 多跳查询与风险传播")
+    ap.add_argument("--graph-dir", default="graph_data")
+    ap.add_argument("--direction", choices=DIRECTIONS, default="both")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("khop", help="k 跳邻域")
+    p.add_argument("nodes", nargs="+", help="Type:id")
+    p.add_argument("--hops", type=int, default=2)
+    p.add_argument("--limit", type=int, default=50)
+    p = sub.add_parser("path", help="最短路径")
+    p.add_argument("source")
+    p.add_argument("target")
+    p.add_argument("--max-hops", type=int, default=None)
+    p = sub.add_parser("propagate", help="以评估风险分为种子的风险传播")
+    p.add_argument("--db", default=None)
+    p.add_argument("--alpha", type=float, default=0.85)
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--exclude-seeds", action="store_true")
+    args = ap.parse_args()
+
+    gc = GraphClient(args.graph_dir)
+    print(f"[graph] {gc.num_nodes} 个节点, {len(gc)} 条边")
+    if args.cmd == "khop":
+        reached = gc.k_hop([_parse_node(gc, s) for s in args.nodes], args.hops, direction=args.direction)
+        for n, d in sorted(reached.items(), key=lambda x: (x[1], x[0]))[:args.limit]:
+            t, k = gc.node(n)
+            print(f"{d}\t{t}:{k}")
+        print(f"共 {len(reached)} 个节点")
+    elif args.cmd == "path":
+        res = gc.shortest_path(_parse_node(gc, args.source), _parse_node(gc, args.target),
+                               direction=args.direction, max_hops=args.max_hops)
+        if res is None:
+            print("不可达")
+            return
+        for e in res[1]:
+            d = gc.edge(e)
+            print(f"{d['src_type']}:{d['src_id']} -[{d['rel']}]→ {d['dst_type']}:{d['dst_id']}")
+        print(f"{len(res[1])} 跳")
+    else:
+        from .storage import Storage
+        from .config import DEFAULT_DB_PATH
+        storage = Storage(args.db or DEFAULT_DB_PATH)
+        storage.init()
+        scores = storage.latest_risk_scores()
+        for t, k, s in propagate_risk(gc, scores, alpha=args.alpha, top_k=args.top,
+                                      direction=args.direction, exclude_seeds=args.exclude_seeds):
+            print(f"{s:.4f}\t{t}:{k}")
+
+
+if __name__ == "__main__":
+    main()
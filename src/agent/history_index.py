@@ -0,0 +1,92 @@
+"""
+In-memory index over the ``embeddings`` table used for history retrieval.
+
+Dense rows live in a normalised ``DenseMatrix`` (one matmul + argpartition per
+query); the sparse dict (or term counts) of every row goes into a
+``SparseIndex`` for the sparse path.  The index is built once per Storage and
+kept up to date as new embeddings are written.
+"""
+import json
+import threading
+import numpy as np
+
+from .dense_index import DenseMatrix
+from .rag import is_dense
+from .sparse_index import SparseIndex
+
+
+class HistoryIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.dense = DenseMatrix()
+            self._dense_ids = []
+            # every row with a sparse form, plus whether it is also in the dense matrix
+            self.sparse = SparseIndex(weighting="tf")
+            self._sparse_ids = []
+            self._sparse_has_dense = []
+
+    def __len__(self):
+        return len(self._dense_ids) + self._sparse_has_dense.count(False)
+
+    def load(self, storage):
+        self.reset()
+        self.add_rows(storage.get_all_embeddings())
+        return self
+
+    def add_rows(self, rows):
+        # rows: (assessment_id, terms_json, decoded vector) as returned by Storage.get_all_embeddings
+        dense_ids, dense_vecs = [], []
+        sparse = []
+        with self._lock:
+            dim = self.dense.dim
+            for aid, terms_json, v in rows:
+                has_dense = False
+                if is_dense(v) and len(v) > 0:
+                    if dim is None:
+                        dim = len(v)
+                    if len(v) == dim:
+                        dense_ids.append(aid)
+                        dense_vecs.append(v)
+                        has_dense = True
+                if isinstance(v, dict):
+                    sparse.append((aid, v, has_dense))
+                    continue
+                t = terms_json
+                if isinstance(t, str):
+                    try:
+                        t = json.loads(t)
+                    except Exception:
+                        t = None
+                if isinstance(t, dict) and t:
+                    sparse.append((aid, t, has_dense))
+            if dense_vecs:
+                self.dense.add(np.vstack([np.asarray(x, dtype=np.float32) for x in dense_vecs]))
+                self._dense_ids.extend(dense_ids)
+            for aid, v, has_dense in sparse:
+                self.sparse.add(v)
+                self._sparse_ids.append(aid)
+                self._sparse_has_dense.append(has_dense)
+
+    def search(self, q_dense, q_sparse, top_k):
+        """Return ``[(score, assessment_id)]`` best first.
+
+        With a dense query of matching dimension, dense rows are scored by
+        cosine and the remaining rows through their sparse form; otherwise every
+        row is scored sparsely.
+        """
+        with self._lock:
+            scored = []
+            dense_mode = q_dense is not None and self.dense.dim is not None and len(q_dense) == self.dense.dim
+            if dense_mode:
+                s, pos = self.dense.search(q_dense, top_k)
+                scored.extend((float(x), self._dense_ids[p]) for x, p in zip(s, pos))
+            if isinstance(q_sparse, dict) and q_sparse and self._sparse_ids:
+                exclude = np.asarray(self._sparse_has_dense, dtype=bool) if dense_mode else None
+                for x, p in self.sparse.search(q_sparse, top_k, exclude=exclude):
+                    scored.append((x, self._sparse_ids[p]))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:top_k]
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+
+def write_atomic(path, write):
+    # write(tmp_path) fills a temporary file that then replaces `path`; the temp
+    # name is unique per call, so processes sharing a cache directory never
+    # write into each other's temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def file_sig(fp):
+    # [mtime_ns, size]; [0, 0] when the file cannot be stat'ed
+    try:
+        st = os.stat(fp)
+        return [st.st_mtime_ns, st.st_size]
+    except Exception:
+        return [0, 0]
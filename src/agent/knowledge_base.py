@@ -1,7 +1,17 @@
 import os
-import json
+import sqlite3
+import threading
+import time
+import heapq
+from bisect import bisect_right
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from typing import List
-from src.agent.config import KNOWLEDGE_DIRS
+from src.agent.config import KNOWLEDGE_DIRS, KNOWLEDGE_WORKERS
+from src.agent.sparse_index import SparseIndex
+from src.agent.tokenizer import term_counts
+from src.agent.io_utils import file_sig
 
 def _list_files(dirs: List[str]):
     out = []
@@ -66,46 +76,258 @@ def _split_paragraphs(text: str, max_len: int = 800):
         items.append(" ".join(buf))
     return items
 
+def _parse_file(fp):
+    # runs in a worker process: (path, segments, seconds)
+    t0 = time.perf_counter()
+    text = _read_text(fp)
+    segments = _split_paragraphs(text)
+    if not segments and text:
+        segments = [text]
+    return fp, segments, time.perf_counter() - t0
+
+
+def _parse_files(paths):
+    """Parse files into segments.
+
+    PDF extraction is CPU-bound, so two or more PDFs go to a process pool;
+    text files (and a single PDF) are parsed inline, where starting worker
+    processes would cost more than the parse itself.
+    """
+    out = {}
+    if not paths:
+        return out
+    t0 = time.perf_counter()
+    pdfs = [fp for fp in paths if fp.lower().endswith('.pdf')]
+    inline = [fp for fp in paths if not fp.lower().endswith('.pdf')]
+    workers = min(KNOWLEDGE_WORKERS, len(pdfs))
+    results = []
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                for i, r in enumerate(ex.map(_parse_file, pdfs), 1):
+                    results.append(r)
+                    print(f"[knowledge] 解析 {i}/{len(pdfs)} {os.path.basename(r[0])} ({r[2]:.2f}s)")
+        except Exception as e:
+            print("[knowledge] 多进程解析失败，改为逐个解析", e)
+            results = []
+            inline = paths
+    else:
+        inline = paths
+    for i, fp in enumerate(inline, 1):
+        r = _parse_file(fp)
+        results.append(r)
+        print(f"[knowledge] 解析 {i}/{len(inline)} {os.path.basename(fp)} ({r[2]:.2f}s)")
+    for fp, segments, _ in results:
+        out[fp] = segments
+    print(f"[knowledge] 解析 {len(paths)} 个文件，用时 {time.perf_counter() - t0:.2f}s")
+    return out
+
+
+class KnowledgeStore:
+    """Per-document segment store (SQLite) behind load_knowledge.
+
+    ``docs`` keeps one row per file with its signature; ``segments`` is keyed
+    by (path, seq) so one document is a primary-key range read and a changed
+    file only rewrites its own rows.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.getcwd(), ".cache", "knowledge.sqlite")
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, segments INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS segments (path TEXT, seq INTEGER, text TEXT, PRIMARY KEY (path, seq)) WITHOUT ROWID")
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def sync(self, paths):
+        """Re-parse new/changed files and drop removed ones; returns the number of files parsed."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                old = {p: [m, s] for p, m, s in conn.execute("SELECT path, mtime_ns, size FROM docs")}
+                sigs = {fp: file_sig(fp) for fp in paths}
+                stale = [fp for fp in paths if old.get(fp) != sigs[fp]]
+                removed = [p for p in old if p not in sigs]
+                if not stale and not removed:
+                    return 0
+                parsed = _parse_files(stale)
+                with conn:
+                    for fp in removed + stale:
+                        conn.execute("DELETE FROM segments WHERE path = ?", (fp,))
+                        conn.execute("DELETE FROM docs WHERE path = ?", (fp,))
+                    for fp in stale:
+                        segs = parsed.get(fp, [])
+                        conn.executemany("INSERT INTO segments (path, seq, text) VALUES (?, ?, ?)",
+                                         [(fp, i, t) for i, t in enumerate(segs)])
+                        conn.execute("INSERT INTO docs (path, mtime_ns, size, segments) VALUES (?, ?, ?, ?)",
+                                     (fp, sigs[fp][0], sigs[fp][1], len(segs)))
+                return len(stale)
+            finally:
+                conn.close()
+
+    def documents(self):
+        conn = self._connect()
+        try:
+            return [r[0] for r in conn.execute("SELECT path FROM docs ORDER BY path")]
+        finally:
+            conn.close()
+
+    def segment_counts(self, paths):
+        """Number of segments of each of ``paths`` (0 for files not in the store)."""
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT path, segments FROM docs"))
+        finally:
+            conn.close()
+        return [counts.get(p, 0) for p in paths]
+
+    @staticmethod
+    def _read_document(conn, path, lo=0, hi=None):
+        q = "SELECT text FROM segments WHERE path = ? AND seq >= ? AND seq < ? ORDER BY seq"
+        return [r[0] for r in conn.execute(q, (path, lo, (1 << 62) if hi is None else hi))]
+
+    def iter_segments(self, paths=None):
+        """Stream (path, segment) in document order; only one document is in memory at a time."""
+        paths = self.documents() if paths is None else paths
+        conn = self._connect()
+        try:
+            for p in paths:
+                for t in self._read_document(conn, p):
+                    yield p, t
+        finally:
+            conn.close()
+
+
+class KnowledgeSegments(Sequence):
+    """Read-only sequence of the segments of ``paths``, in document order, read from the store on access.
+
+    Only the per-document segment counts are kept in memory: ``items[i]`` and
+    slices are primary-key range reads and iteration streams one document at
+    a time.  Reads see the store as it is at access time; load_knowledge
+    hands out a new sequence once the files change.
+    """
+
+    def __init__(self, store, paths):
+        self._store = store
+        self._paths = list(paths)
+        self._offsets = [0]
+        for n in store.segment_counts(self._paths):
+            self._offsets.append(self._offsets[-1] + n)
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def _range(self, start, stop):
+        out = []
+        if start >= stop:
+            return out
+        conn = self._store._connect()
+        try:
+            d = bisect_right(self._offsets, start) - 1
+            while start < stop and d < len(self._paths):
+                base = self._offsets[d]
+                hi = min(stop, self._offsets[d + 1])
+                if hi > start:
+                    out.extend(self._store._read_document(conn, self._paths[d], start - base, hi - base))
+                    start = hi
+                d += 1
+        finally:
+            conn.close()
+        return out
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return self._range(start, stop)
+            return [self[j] for j in range(start, stop, step)]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("knowledge segment index out of range")
+        got = self._range(i, i + 1)
+        return got[0] if got else ""
+
+    def __iter__(self):
+        for _, t in self._store.iter_segments(self._paths):
+            yield t
+
+
+_store = None
+
+
+def get_knowledge_store():
+    global _store
+    if _store is None:
+        _store = KnowledgeStore()
+    return _store
+
+
+# in-process memo: the same list object is returned while the files are unchanged,
+# so indexes built over it (knowledge_index) can be reused by identity
+_loaded = {"fingerprint": None, "items": None}
+
+
 def load_knowledge():
-    dirs = KNOWLEDGE_DIRS
-    cache_dir = os.path.join(os.getcwd(), ".cache")
-    cache_fp = os.path.join(cache_dir, "knowledge_cache.json")
-    paths = _list_files(dirs)
+    """Knowledge segments of KNOWLEDGE_DIRS as a KnowledgeSegments sequence over the store.
+
+    Falls back to a plain list of parsed segments when the store is unavailable.
+    """
+    paths = _list_files(KNOWLEDGE_DIRS)
     fp_sig = _files_fingerprint(paths)
+    if _loaded["items"] is not None and _loaded["fingerprint"] == fp_sig:
+        return _loaded["items"]
+    store = get_knowledge_store()
     try:
-        with open(cache_fp, 'r', encoding='utf-8') as f:
-            cached = json.load(f)
-    except Exception:
-        cached = None
-    if cached and cached.get('fingerprint') == fp_sig:
-        return cached.get('items', [])
-    items: List[str] = []
-    for fp in paths:
-        text = _read_text(fp)
-        segments = _split_paragraphs(text)
-        if segments:
-            items.extend(segments)
-        elif text:
-            items.append(text)
-    try:
-        os.makedirs(cache_dir, exist_ok=True)
-        with open(cache_fp, 'w', encoding='utf-8') as f:
-            json.dump({"fingerprint": fp_sig, "items": items}, f, ensure_ascii=False)
-    except Exception:
-        pass
+        store.sync(paths)
+        items = KnowledgeSegments(store, paths)
+    except Exception as e:
+        print("[knowledge] 知识库缓存不可用，直接解析", e)
+        parsed = _parse_files(paths)
+        items = [t for fp in paths for t in parsed.get(fp, [])]
+    _loaded.update(fingerprint=fp_sig, items=items)
     return items
 
 
-def retrieve_knowledge(items, text, top_k=3):
-    s = text.lower()
-    scored = []
-    for it in items:
-        c = 0
-        for token in ["风险", "评分", "账户", "市场", "欺诈", "PSI"]:
-            if token in it:
-                if token in s:
-                    c += 1
-        scored.append((c, it))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [it for _, it in scored[:top_k]]
+_bm25 = {"items": None, "index": None}
+_bm25_lock = threading.Lock()
 
+
+def _knowledge_bm25(items):
+    # inverted index over the segments, rebuilt only when a different list is passed
+    with _bm25_lock:
+        if _bm25["items"] is not items:
+            index = SparseIndex(weighting="bm25")
+            index.add_many([term_counts(it) for it in items])
+            _bm25["index"] = index
+            _bm25["items"] = items
+        return _bm25["index"]
+
+
+def retrieve_knowledge(items, text, top_k=3):
+    """BM25 over the knowledge segments; falls back to the first items when nothing matches."""
+    if not items or top_k <= 0:
+        return []
+    index = _knowledge_bm25(items)
+    scores = index.scores(term_counts(text))
+    cand = np.flatnonzero(scores > 0)
+    best = heapq.nlargest(top_k, cand.tolist(), key=lambda i: (scores[i], -i))
+    out = [items[i] for i in best]
+    seen = set(best)
+    i = 0
+    while len(out) < top_k and i < len(items):
+        if i not in seen:
+            out.append(items[i])
+        i += 1
+    return out
@@ -0,0 +1,182 @@
+"""
+Precomputed vectors for the knowledge items returned by ``load_knowledge()``.
+
+Every item's sparse term weights and, when an embedding provider is
+configured, its dense embedding are computed once and stored in a binary
+sidecar (``.cache/knowledge_vectors.npz``) next to the knowledge store.
+A query is then one SparseIndex lookup or one matrix product plus a top-k,
+instead of tokenising the whole corpus again.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+from .rag import build_terms, embed_text, EmbeddingProvider
+from .dense_index import DenseMatrix
+from .sparse_index import SparseIndex
+from .tokenizer import TOKENIZER_ID, stopwords_key
+from .vector_store import embed_in_batches
+from .io_utils import write_atomic
+
+# bump when the sidecar layout changes
+_SIDECAR_VERSION = 2
+_SIDECAR_NAME = "knowledge_vectors.npz"
+
+
+def _items_key(items):
+    h = hashlib.sha1()
+    for t in items:
+        h.update((t or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class KnowledgeIndex:
+    def __init__(self, items, provider=None, cache_dir=None):
+        self.items = items
+        self._provider = provider or EmbeddingProvider()
+        self.cache_dir = os.path.join(os.getcwd(), ".cache") if cache_dir is None else cache_dir
+        self.sparse = SparseIndex(weighting="tf")
+        self.dense = None
+        # dense row -> item position (items the provider could not embed have no row)
+        self.dense_pos = np.empty(0, dtype=np.int64)
+
+    def _meta(self):
+        return {
+            "version": _SIDECAR_VERSION,
+            "items": _items_key(self.items),
+            "provider": self._provider.provider,
+            "model": self._provider.model_name,
+            # the stored sparse vectors depend on how build_terms splits the text
+            "tokenizer": TOKENIZER_ID,
+            "stopwords": stopwords_key(),
+        }
+
+    def build(self):
+        meta = self._meta()
+        path = os.path.join(self.cache_dir, _SIDECAR_NAME) if self.cache_dir else None
+        if path and self._load(path, meta):
+            return self
+        docs = [embed_text(build_terms(t)) for t in self.items]
+        self.sparse.add_many(docs)
+        vecs = embed_in_batches(self._provider, self.items)
+        dim = next((len(v) for v in vecs if v is not None), None)
+        pos = [i for i, v in enumerate(vecs) if v is not None and len(v) == dim]
+        if pos:
+            self.dense = DenseMatrix(dim=dim, capacity=len(pos))
+            self.dense.add(np.vstack([np.asarray(vecs[i], dtype=np.float32) for i in pos]))
+            self.dense_pos = np.asarray(pos, dtype=np.int64)
+        if path:
+            self._save(path, meta, docs)
+        return self
+
+    def _load(self, path, meta):
+        try:
+            with np.load(path) as z:
+                if json.loads(str(z["meta"])) != meta:
+                    return False
+                vocab = z["vocab"].tolist()
+                term_ids, weights, offsets = z["term_ids"], z["weights"], z["offsets"]
+                dense, dense_pos = z["dense"], z["dense_pos"]
+            for i in range(len(offsets) - 1):
+                lo, hi = offsets[i], offsets[i + 1]
+                self.sparse.add({vocab[t]: float(w) for t, w in zip(term_ids[lo:hi], weights[lo:hi])})
+            if len(dense_pos):
+                self.dense = DenseMatrix.from_normalized(dense)
+                self.dense_pos = dense_pos
+            return True
+        except Exception:
+            self.sparse = SparseIndex(weighting="tf")
+            self.dense = None
+            self.dense_pos = np.empty(0, dtype=np.int64)
+            return False
+
+    def _save(self, path, meta, docs):
+        # sparse vectors as CSR (vocab + term ids + weights + row offsets)
+        vocab = {}
+        term_ids, weights, offsets = [], [], [0]
+        for d in docs:
+            for t, w in d.items():
+                term_ids.append(vocab.setdefault(t, len(vocab)))
+                weights.append(w)
+            offsets.append(len(term_ids))
+        dense = self.dense.matrix if self.dense is not None else np.empty((0, 0), dtype=np.float32)
+        arrays = {
+            "meta": np.array(json.dumps(meta, sort_keys=True)),
+            "vocab": np.array(list(vocab) or [""]),
+            "term_ids": np.asarray(term_ids, dtype=np.int32),
+            "weights": np.asarray(weights, dtype=np.float32),
+            "offsets": np.asarray(offsets, dtype=np.int64),
+            "dense": np.ascontiguousarray(dense, dtype=np.float32),
+            "dense_pos": self.dense_pos,
+        }
+
+        def write(p):
+            with open(p, "wb") as f:
+                np.savez(f, **arrays)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_atomic(path, write)
+        except Exception as e:
+            print("[knowledge] 写入向量缓存失败", e)
+
+    def search(self, q_dense, q_sparse, top_k):
+        """Return ``[(score, item position)]`` best first; dense when the query dimension matches."""
+        if q_dense is not None and self.dense is not None and len(q_dense) == self.dense.dim:
+            s, rows = self.dense.search(np.asarray(q_dense, dtype=np.float32), top_k)
+            return [(float(x), int(self.dense_pos[r])) for x, r in zip(s, rows)]
+        if isinstance(q_sparse, dict) and q_sparse:
+            return self.sparse.search(q_sparse, top_k)
+        return []
+
+
+# id(items) -> (items, KnowledgeIndex), most recently used last; two lists are
+# kept so requests still holding the previous list during a reload do not rebuild it
+_cache = OrderedDict()
+_CACHE_SIZE = 2
+_cache_lock = threading.Lock()
+# id(items) -> (items, Future) for builds in progress
+_building = {}
+
+
+def knowledge_index(items, timeout=None, provider=None):
+    """KnowledgeIndex for ``items``, built once per list.
+
+    The build runs on its own "knowledge-index" thread; concurrent callers
+    with the same list share it.  Callers wait at most ``timeout`` seconds
+    (None: until it is done) and get ``concurrent.futures.TimeoutError``
+    otherwise, while the build carries on for later calls.
+    """
+    with _cache_lock:
+        hit = _cache.get(id(items))
+        if hit is not None and hit[0] is items:
+            _cache.move_to_end(id(items))
+            return hit[1]
+        entry = _building.get(id(items))
+        if entry is None or entry[0] is not items:
+            entry = _building[id(items)] = (items, Future())
+            threading.Thread(target=_build, args=(items, entry[1], provider),
+                             name="knowledge-index", daemon=True).start()
+    return entry[1].result(timeout)
+
+
+def _build(items, fut, provider):
+    try:
+        index = KnowledgeIndex(items, provider=provider).build()
+    except BaseException as e:
+        with _cache_lock:
+            if _building.get(id(items), (None,))[0] is items:
+                del _building[id(items)]
+        fut.set_exception(e)
+        return
+    with _cache_lock:
+        if _building.get(id(items), (None,))[0] is items:
+            del _building[id(items)]
+        _cache[id(items)] = (items, index)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    fut.set_result(index)
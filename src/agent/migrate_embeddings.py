@@ -0,0 +1,34 @@
+import argparse
+import os
+from src.agent.storage import Storage
+
+
+def main(db_path, batch_size=1000, model=None, provider=None, vacuum=False):
+    if not os.path.exists(db_path):
+        print("数据库文件不存在：", db_path)
+        return
+    storage = Storage(db_path)
+    storage.init()
+    before = os.path.getsize(db_path)
+    print(f"正在把 {db_path} 中 JSON 格式的稠密向量转换为 float32 BLOB ...")
+    n = storage.convert_legacy_embeddings(batch_size=batch_size, model=model, provider=provider)
+    print(f"已转换 {n} 条embeddings")
+    if vacuum:
+        with storage._conn() as conn:
+            conn.isolation_level = None
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.isolation_level = ""
+        print(f"VACUUM 完成：{before} -> {os.path.getsize(db_path)} 字节")
+    storage.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', type=str, default='rag_storage.db', help="需要转换的SQLite文件")
+    parser.add_argument('--batch', type=int, default=1000, help="每个事务转换的行数")
+    parser.add_argument('--model', type=str, default=None, help="为旧数据补充的模型名")
+    parser.add_argument('--provider', type=str, default=None, help="为旧数据补充的 embedding 来源[openai/baai/local]")
+    parser.add_argument('--vacuum', action='store_true', help="转换后执行 VACUUM 回收空间")
+    args = parser.parse_args()
+    main(args.db, args.batch, args.model, args.provider, args.vacuum)
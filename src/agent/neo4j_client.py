@@ -1,13 +1,79 @@
-from .neo4j_config import get_neo4j_config
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .neo4j_config import get_neo4j_config, get_neo4j_pool_config, NEO4J_BATCH_SIZE, NEO4J_CACHE_TTL, NEO4J_CACHE_SIZE
+
+# labels cannot be query parameters; only plain identifiers are spliced into Cypher
+_LABEL_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_DESCRIBE_COMPANIES = (
+    "UNWIND $symbols AS symbol "
+    "MATCH (c:Company {symbol:symbol}) "
+    "RETURN symbol, "
+    "[(c)-[r:LINKED_TO_INDEX]->(m:MarketIndex) | {name:m.name, corr:r.correlation}][..$lim] AS idx, "
+    "[(c)-[r:HAS_RISK_EVENT]->(n:News) | {title:n.title, impact:r.impact}][..$lim] AS news"
+)
+
+_DESCRIBE_ACCOUNTS = (
+    "UNWIND $ids AS id "
+    "MATCH (a:Account {id:id}) "
+    "RETURN id, [(a)-[r:REL]->(b) | {labels:labels(b), bid:b.id, rel:r.type}][..$lim] AS rels"
+)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class _TTLCache:
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            if hit[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return hit[1]
+
+    def put(self, key, value):
+        if self.ttl <= 0 or self.max_items <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
 
 class Neo4jClient:
-    def __init__(self, uri=None, user=None, password=None):
+    def __init__(self, uri=None, user=None, password=None, batch_size=None, cache_ttl=None, **driver_config):
         if not uri or not user or not password:
             uri, user, password = get_neo4j_config()
+        self.batch_size = max(1, batch_size or NEO4J_BATCH_SIZE)
+        self.cache = _TTLCache(NEO4J_CACHE_SIZE, NEO4J_CACHE_TTL if cache_ttl is None else cache_ttl)
         self.driver = None
         try:
             from neo4j import GraphDatabase
-            self.driver = GraphDatabase.driver(uri, auth=(user, password)) if uri else None
+            config = get_neo4j_pool_config()
+            config.update(driver_config)
+            self.driver = GraphDatabase.driver(uri, auth=(user, password), **config) if uri else None
         except Exception:
             self.driver = None
 
@@ -19,53 +85,102 @@ class Neo4jClient:
             self.driver.close()
 
     def upsert_relation(self, src_type, src_id, rel, dst_type, dst_id):
+        self.upsert_relations([(src_type, src_id, rel, dst_type, dst_id)])
+
+    def upsert_relations(self, rows):
+        """MERGE many edges; rows are (src_type, src_id, rel, dst_type, dst_id) tuples or dicts.
+
+        Rows are grouped by label pair and written as ``UNWIND`` batches of
+        ``batch_size``, one transaction per batch.  Returns the number of rows written.
+        """
         if not self.driver:
-            return
-        q = (
-            "MERGE (a:" + src_type + " {id:$src_id}) "
-            "MERGE (b:" + dst_type + " {id:$dst_id}) "
-            "MERGE (a)-[r:REL {type:$rel}]->(b) "
-        )
+            return 0
+        groups = {}
+        skipped = 0
+        for row in rows:
+            if isinstance(row, dict):
+                row = (row.get("src_type"), row.get("src_id"), row.get("rel"), row.get("dst_type"), row.get("dst_id"))
+            st, si, rel, dt, di = row
+            if not (_LABEL_RE.match(st or "") and _LABEL_RE.match(dt or "")):
+                skipped += 1
+                continue
+            groups.setdefault((st, dt), []).append({"src_id": si, "dst_id": di, "rel": rel})
+        if skipped:
+            print(f"[neo4j] 跳过 {skipped} 条标签不合法的关系")
+        written = 0
         try:
             with self.driver.session() as s:
-                s.run(q, src_id=src_id, dst_id=dst_id, rel=rel)
-        except Exception:
-            pass
+                for (st, dt), params in groups.items():
+                    q = (
+                        "UNWIND $rows AS row "
+                        f"MERGE (a:{st} {{id:row.src_id}}) "
+                        f"MERGE (b:{dt} {{id:row.dst_id}}) "
+                        "MERGE (a)-[r:REL {type:row.rel}]->(b)"
+                    )
+                    for chunk in _chunks(params, self.batch_size):
+                        tx = s.begin_transaction()
+                        try:
+                            tx.run(q, rows=chunk).consume()
+                            tx.commit()
+                        finally:
+                            tx.close()
+                        written += len(chunk)
+        except Exception as e:
+            print("[neo4j] 批量写入关系失败", e)
+        if written:
+            self.cache.clear()
+        return written
 
-    def describe_account(self, account_id, limit=5):
-        if not self.driver:
-            return []
-        q = "MATCH (a:Account {id:$id})-[r:REL]->(b) RETURN labels(b) as labels, b.id as bid, r.type as rel LIMIT $lim"
-        out = []
+    def _describe_many(self, kind, keys, limit, query, param, fmt):
+        # cached per (kind, key, limit); misses go out as UNWIND batches
+        out, missing = {}, []
+        for k in dict.fromkeys(keys):
+            hit = self.cache.get((kind, k, limit))
+            if hit is not None:
+                out[k] = hit
+            else:
+                missing.append(k)
+        if not missing or not self.driver:
+            return out
+        fetched = {k: [] for k in missing}
         try:
             with self.driver.session() as s:
-                res = s.run(q, id=account_id, lim=limit)
-                for r in res:
-                    labels = r["labels"]
-                    lab = labels[0] if labels else "Node"
-                    out.append(f"Account:{account_id} -[{r['rel']}]→ {lab}:{r['bid']}")
+                for chunk in _chunks(missing, self.batch_size):
+                    for r in s.run(query, **{param: chunk}, lim=limit):
+                        fetched[r[0]].extend(fmt(r))
         except Exception:
+            out.update(fetched)
             return out
+        for k, lines in fetched.items():
+            self.cache.put((kind, k, limit), lines)
+        out.update(fetched)
         return out
 
-    def describe_company(self, symbol, limit=5):
-        if not self.driver:
-            return []
-        out = []
-        try:
-            with self.driver.session() as s:
-                q1 = "MATCH (c:Company {symbol:$symbol})-[r:LINKED_TO_INDEX]->(m:MarketIndex) RETURN m.name as name, r.correlation as corr LIMIT $lim"
-                res1 = s.run(q1, symbol=symbol, lim=limit)
-                for r in res1:
-                    name = r.get("name", "Index")
-                    corr = r.get("corr", "")
-                    out.append(f"Company:{symbol} -[LINKED_TO_INDEX corr={corr}]→ MarketIndex:{name}")
-                q2 = "MATCH (c:Company {symbol:$symbol})-[r:HAS_RISK_EVENT]->(n:News) RETURN n.title as title, r.impact as impact LIMIT $lim"
-                res2 = s.run(q2, symbol=symbol, lim=limit)
-                for r in res2:
-                    title = r.get("title", "News")
-                    impact = r.get("impact", "")
-                    out.append(f"Company:{symbol} -[HAS_RISK_EVENT impact={impact}]→ News:{title}")
-        except Exception:
+    def describe_accounts(self, account_ids, limit=5):
+        """``{account_id: [lines]}`` for many accounts in one round-trip per batch."""
+        def fmt(r):
+            out = []
+            for d in r["rels"] or []:
+                labels = d.get("labels")
+                lab = labels[0] if labels else "Node"
+                out.append(f"Account:{r['id']} -[{d.get('rel')}]→ {lab}:{d.get('bid')}")
             return out
-        return out
+        return self._describe_many("account", account_ids, limit, _DESCRIBE_ACCOUNTS, "ids", fmt)
+
+    def describe_account(self, account_id, limit=5):
+        return self.describe_accounts([account_id], limit).get(account_id, [])
+
+    def describe_companies(self, symbols, limit=5):
+        """``{symbol: [lines]}`` for many companies in one round-trip per batch."""
+        def fmt(r):
+            symbol = r["symbol"]
+            out = []
+            for d in r["idx"] or []:
+                out.append(f"Company:{symbol} -[LINKED_TO_INDEX corr={d.get('corr', '')}]→ MarketIndex:{d.get('name', 'Index')}")
+            for d in r["news"] or []:
+                out.append(f"Company:{symbol} -[HAS_RISK_EVENT impact={d.get('impact', '')}]→ News:{d.get('title', 'News')}")
+            return out
+        return self._describe_many("company", symbols, limit, _DESCRIBE_COMPANIES, "symbols", fmt)
+
+    def describe_company(self, symbol, limit=5):
+        return self.describe_companies([symbol], limit).get(symbol, [])
@@ -7,3 +7,16 @@ def get_neo4j_config():
     password = os.environ.get("NEO4J_PASSWORD", "")
     return uri, user, password
 
+
+def get_neo4j_pool_config():
+    # keyword arguments for GraphDatabase.driver
+    return {
+        "max_connection_pool_size": int(os.environ.get("NEO4J_POOL_SIZE", "50")),
+        "connection_acquisition_timeout": float(os.environ.get("NEO4J_ACQUIRE_TIMEOUT", "60")),
+        "max_connection_lifetime": float(os.environ.get("NEO4J_CONN_LIFETIME", "3600")),
+    }
+
+
+NEO4J_BATCH_SIZE = int(os.environ.get("NEO4J_BATCH_SIZE", "1000"))
+NEO4J_CACHE_TTL = float(os.environ.get("NEO4J_CACHE_TTL", "60"))
+NEO4J_CACHE_SIZE = int(os.environ.get("NEO4J_CACHE_SIZE", "1024"))
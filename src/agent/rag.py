@@ -2,26 +2,21 @@
 """
 RAG utilities
 """
-import json
 import math
-import requests
+import threading
 from typing import List, Dict, Optional
 from collections import Counter
-from src.agent.config import OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_EMBED_MODEL, EMBED_PROVIDER, BAAI_MODEL, EMBED_PREFIX_ENABLED
+from src.agent.config import OPENAI_API_KEY, OPENAI_EMBED_MODEL, EMBED_PROVIDER, BAAI_MODEL, EMBED_PREFIX_ENABLED
+from src.agent.config import EMBED_DEVICE, EMBED_WARMUP
+from src.agent.config import OPENAI_EMBED_BASE_URL, OPENAI_EMBED_API_KEY
+from src.agent.embed_cache import cache_key, get_embedding_cache
+from src.agent.embed_client import get_client, EmbeddingResponseError
+from src.agent.tokenizer import term_counts
 
 # sparse helpers
 def build_terms(text: str) -> Dict[str, int]:
-    if not text:
-        return {}
-    words = []
-    for w in text.lower().split():
-        w2 = ''.join([c for c in w if c.isalnum()])
-        if w2:
-            words.append(w2)
-    tf = {}
-    for w in words:
-        tf[w] = tf.get(w, 0) + 1
-    return tf
+    # words / CJK unigrams+bigrams, see tokenizer.py
+    return term_counts(text)
 
 
 def embed_text(terms: Dict[str, int]) -> Dict[str, float]:
@@ -45,9 +40,23 @@ def cosine_sparse(a: Dict[str, float], b: Dict[str, float]) -> float:
     return s / (na * nb)
 
 
+def is_dense(v) -> bool:
+    # dense vectors are plain lists or float32 arrays decoded from storage
+    return isinstance(v, list) or hasattr(v, "dtype")
+
+
 def cosine_dense(a: List[float], b: List[float]) -> float:
-    if not a or not b or len(a) != len(b):
+    if a is None or b is None or len(a) == 0 or len(a) != len(b):
         return 0.0
+    if hasattr(a, "dtype") or hasattr(b, "dtype"):
+        import numpy as np
+        va = np.asarray(a, dtype=np.float32)
+        vb = np.asarray(b, dtype=np.float32)
+        na = float(np.dot(va, va))
+        nb = float(np.dot(vb, vb))
+        if na == 0 or nb == 0:
+            return 0.0
+        return float(np.dot(va, vb)) / (math.sqrt(na) * math.sqrt(nb))
     s = 0.0
     na = 0.0
     nb = 0.0
@@ -60,12 +69,83 @@ def cosine_dense(a: List[float], b: List[float]) -> float:
     return s / (math.sqrt(na) * math.sqrt(nb))
 
 
+# process-wide sentence-transformers models, keyed by (name, device), loaded once
+class _ModelSlot:
+    def __init__(self):
+        self.model = None
+        self.error = None
+        self.ready = threading.Event()
+        self.started = False
+
+
+_MODELS: Dict[tuple, _ModelSlot] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def _model_slot(name, device):
+    with _MODELS_LOCK:
+        slot = _MODELS.get((name, device))
+        if slot is None:
+            slot = _MODELS[(name, device)] = _ModelSlot()
+        return slot
+
+
+def _load_model(slot, name, device, warmup):
+    try:
+        from sentence_transformers import SentenceTransformer
+        m = SentenceTransformer(name, device=device) if device else SentenceTransformer(name)
+        if warmup:
+            # first encode pays for allocation/kernel set-up; do it before a real query
+            m.encode(["warmup"])
+        slot.model = m
+    except Exception as e:
+        slot.error = e
+        print('[baai] 模型加载失败', name, e)
+    finally:
+        slot.ready.set()
+
+
+def get_model(name=None, device=None, wait=True, warmup=None):
+    """Shared SentenceTransformer for ``(name, device)``; None if it failed to load (or is still loading and wait=False)."""
+    name = name or BAAI_MODEL
+    device = device or EMBED_DEVICE
+    slot = _model_slot(name, device)
+    with _MODELS_LOCK:
+        load = not slot.started
+        slot.started = True
+    if load:
+        _load_model(slot, name, device, EMBED_WARMUP if warmup is None else warmup)
+    elif wait:
+        slot.ready.wait()
+    return slot.model
+
+
+def preload_model(name=None, device=None, warmup=None):
+    """Start loading the model in a background thread; returns immediately."""
+    name = name or BAAI_MODEL
+    device = device or EMBED_DEVICE
+    slot = _model_slot(name, device)
+    with _MODELS_LOCK:
+        if slot.started:
+            return slot
+        slot.started = True
+    t = threading.Thread(target=_load_model, args=(slot, name, device, EMBED_WARMUP if warmup is None else warmup),
+                         name="embed-preload", daemon=True)
+    t.start()
+    return slot
+
+
+def model_ready(name=None, device=None):
+    slot = _MODELS.get((name or BAAI_MODEL, device or EMBED_DEVICE))
+    return slot is not None and slot.ready.is_set() and slot.model is not None
+
+
 # Embedding provider
 class EmbeddingProvider:
     def __init__(self, provider: Optional[str] = None):
         self.provider = provider or (EMBED_PROVIDER if EMBED_PROVIDER else ("openai" if OPENAI_API_KEY else "local"))
-        self.openai_key = OPENAI_API_KEY
-        self.openai_base = OPENAI_BASE_URL if 'OPENAI_BASE_URL' in globals() else None
+        self.openai_key = OPENAI_EMBED_API_KEY
+        self.openai_base = OPENAI_EMBED_BASE_URL
         self.openai_model = OPENAI_EMBED_MODEL
         self.baai_model_name = BAAI_MODEL
         self._baai_model = None
@@ -77,6 +157,14 @@ class EmbeddingProvider:
                 print("[warning] sentence_transformers未安装，provider=baai无法使用，自动切换到openai")
                 self.provider = 'openai' if OPENAI_API_KEY else 'local'
 
+    @property
+    def model_name(self) -> Optional[str]:
+        if self.provider == 'baai':
+            return self.baai_model_name
+        if self.provider == 'openai':
+            return self.openai_model
+        return None
+
     def _prefix(self, text: str, is_query: bool):
         if not EMBED_PREFIX_ENABLED:
             return text
@@ -84,50 +172,51 @@ class EmbeddingProvider:
             return ('查询: ' if is_query else '文档: ') + text
         return text
 
-    # openai
-    def _embed_openai(self, text: str):
+    # openai-compatible endpoint, through a shared keep-alive client
+    def _openai_client(self):
         if not self.openai_key or not self.openai_base or not self.openai_model:
             return None
-        url = self.openai_base.rstrip('/') + '/v1/embeddings'
-        headers = {"Authorization": f"Bearer {self.openai_key}", "Content-Type": "application/json"}
-        payload = {"model": self.openai_model, "input": text}
+        return get_client(self.openai_base, self.openai_key, self.openai_model)
+
+    def remote_stats(self):
+        c = self._openai_client() if self.provider == 'openai' else None
+        return c.stats() if c is not None else None
+
+    def _embed_openai(self, text: str, is_query: bool = False):
+        c = self._openai_client()
+        if c is None:
+            return None
         try:
-            r = requests.post(url, headers=headers, json=payload, timeout=20)
-            if r.status_code != 200:
-                return None
-            j = r.json()
-            return j.get('data', [{}])[0].get('embedding')
-        except Exception:
+            vecs = c.embed([text], interactive=is_query)
+        except EmbeddingResponseError as e:
+            print('[openai] 嵌入接口响应异常', e)
             return None
+        return vecs[0] if vecs else None
 
     def _embed_batch_openai(self, texts: List[str]) -> Optional[List[List[float]]]:
-        if not self.openai_key or not self.openai_base or not self.openai_model:
+        c = self._openai_client()
+        if c is None:
             return None
-        url = ""                # 文本嵌入模型的URL
-        headers = {"Authorization": "Bearer sk-", "Content-Type": "application/json"}
-        payload = {"model": self.openai_model, "input": texts}
         try:
-            r = requests.post(url, headers=headers, json=payload, timeout=60)
-            if r.status_code != 200:
-                return None
-            j = r.json()
-            data = j.get('data', [])
-            return [item.get('embedding') for item in data]
-        except Exception:
+            return c.embed(texts)
+        except EmbeddingResponseError as e:
+            print('[openai] 嵌入接口响应异常', e)
             return None
 
-    # baai (local sentence-transformers)
+    # baai (local sentence-transformers, shared through get_model)
     def _load_baai(self):
         if self._baai_model is not None or self._baai_load_attempted:
             return self._baai_model
         self._baai_load_attempted = True
-        try:
-            from sentence_transformers import SentenceTransformer
-            self._baai_model = SentenceTransformer(self.baai_model_name)
-            return self._baai_model
-        except Exception:
-            self._baai_model = None
-            return None
+        self._baai_model = get_model(self.baai_model_name)
+        return self._baai_model
+
+    @property
+    def ready(self) -> bool:
+        # baai: the shared model has finished loading; other providers need no local model
+        if self.provider != 'baai':
+            return True
+        return model_ready(self.baai_model_name)
 
     def _embed_baai(self, text: str) -> Optional[List[float]]:
         m = self._load_baai()
@@ -154,98 +243,93 @@ class EmbeddingProvider:
             print('[baai] 文本嵌入操作失败', e)
             return None
 
+    def _cache_keys(self, texts: List[str]):
+        # texts are already prefixed; the prefix flag is part of the key as well
+        mode = "prefix" if EMBED_PREFIX_ENABLED else "raw"
+        return [cache_key(self.provider, self.model_name, mode, t) for t in texts]
+
     # public
     def embed_text(self, text: str, is_query: bool = False):
         if not text:
             return None
+        if self.provider not in ('openai', 'baai'):
+            return None
         t = self._prefix(text, is_query)
-        if self.provider == 'openai':
-            return self._embed_openai(t)
-        if self.provider == 'baai':
-            return self._embed_baai(t)
-        return None
+        cache = get_embedding_cache()
+        if cache is not None:
+            key = self._cache_keys([t])
+            hit = cache.get_many(key)[0]
+            if hit is not None:
+                return hit.tolist()
+        v = self._embed_openai(t, is_query) if self.provider == 'openai' else self._embed_baai(t)
+        if cache is not None and v:
+            cache.put_many(key, [v])
+        return v
 
     def embed_batch(self, texts: List[str], is_query: bool = False):
         if not texts:
             return None
+        if self.provider not in ('openai', 'baai'):
+            return None
         ts = [self._prefix(t, is_query) for t in texts]
+        cache = get_embedding_cache()
+        if cache is None:
+            return self._embed_batch_remote(ts)
+        keys = self._cache_keys(ts)
+        cached = cache.get_many(keys)
+        out = [c.tolist() if c is not None else None for c in cached]
+        miss = [i for i, c in enumerate(cached) if c is None]
+        if miss:
+            vecs = self._embed_batch_remote([ts[i] for i in miss])
+            if not vecs or len(vecs) != len(miss):
+                return None
+            cache.put_many([keys[i] for i in miss], vecs)
+            for i, v in zip(miss, vecs):
+                out[i] = v
+        return out
+
+    def _embed_batch_remote(self, ts: List[str]):
         if self.provider == 'openai':
             return self._embed_batch_openai(ts)
-        if self.provider == 'baai':
-            return self._embed_batch_baai(ts)
-        return None
+        return self._embed_batch_baai(ts)
 
 # retrieval helpers compatible with Storage
 def retrieve_similar(storage, text, top_k=3, provider: Optional[EmbeddingProvider] = None):
-    # try dense first
+    # dense first, sparse for rows without a dense vector (see HistoryIndex.search)
     ep = provider or EmbeddingProvider()
     q_vec = ep.embed_text(text, is_query=True)
-    rows = storage.get_all_embeddings()
-    scored = []
-    if q_vec is not None:
-        for aid, terms_json, vec_json in rows:
-            try:
-                v = json.loads(vec_json)
-            except Exception:
-                v = None
-            if isinstance(v, list):
-                s = cosine_dense(q_vec, v)
-            elif isinstance(v, dict):
-                q_tf = embed_text(build_terms(text))
-                s = cosine_sparse(q_tf, v)
-            else:
-                s = 0.0
-            scored.append((s, aid))
-    else:
-        # sparse fallback
-        q_tf = embed_text(build_terms(text))
-        for aid, terms_json, vec_json in rows:
-            try:
-                v = json.loads(vec_json)
-            except Exception:
-                v = None
-            if isinstance(v, dict):
-                s = cosine_sparse(q_tf, v)
-            else:
-                # try comparing with terms_json
-                try:
-                    t = json.loads(terms_json)
-                    if isinstance(t, dict):
-                        s = cosine_sparse(q_tf, t)
-                    else:
-                        s = 0.0
-                except Exception:
-                    s = 0.0
-            scored.append((s, aid))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [aid for _, aid in scored[:top_k]]
+    q_tf = embed_text(build_terms(text))
+    scored = storage.history_index().search(q_vec, q_tf, top_k)
+    return [aid for _, aid in scored]
+
+
+def _sparse_scores(texts, query_text):
+    # one inverted index over the candidate texts instead of pairwise cosine_sparse
+    from .sparse_index import SparseIndex
+    index = SparseIndex()
+    index.add_many([build_terms(t) for t in texts])
+    return index.scores(build_terms(query_text))
 
 
 def retrieve_documents(texts, query_text, top_k=3, provider: Optional[EmbeddingProvider] = None):
     ep = provider or EmbeddingProvider()
     q_dense = ep.embed_text(query_text, is_query=True)
     scored = []
-    if q_dense is not None:
-        # try batch dense for texts
-        dense_embs = ep.embed_batch(texts)
-        if dense_embs:
-            for t, v in zip(texts, dense_embs):
-                if v is None:
-                    # fallback to sparse
-                    s = cosine_sparse(embed_text(build_terms(query_text)), embed_text(build_terms(t)))
-                else:
-                    s = cosine_dense(q_dense, v)
-                scored.append((s, t))
-        else:
-            # dense batch failed, fallback to sparse
-            q_tf = embed_text(build_terms(query_text))
-            for t in texts:
-                s = cosine_sparse(q_tf, embed_text(build_terms(t)))
-                scored.append((s, t))
-    else:
-        q_tf = embed_text(build_terms(query_text))
-        for t in texts:
-            s = cosine_sparse(q_tf, embed_text(build_terms(t)))
+    dense_embs = ep.embed_batch(texts) if q_dense is not None else None
+    if dense_embs:
+        sparse = None
+        for i, (t, v) in enumerate(zip(texts, dense_embs)):
+            if v is None:
+                # fallback to sparse
+                if sparse is None:
+                    sparse = _sparse_scores(texts, query_text)
+                s = float(sparse[i])
+            else:
+                s = cosine_dense(q_dense, v)
             scored.append((s, t))
+    else:
+        # no dense query or dense batch failed: sparse for all
+        sparse = _sparse_scores(texts, query_text)
+        scored = [(float(s), t) for s, t in zip(sparse, texts)]
     scored.sort(key=lambda x: x[0], reverse=True)
     return [x[1] for x in scored[:top_k]]
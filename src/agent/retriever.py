@@ -1,96 +1,187 @@
-import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any
-from .config import TOP_K, RAG_MIN_SCORE, RAG_MIN_SOURCES
-from .rag import build_terms, embed_text, cosine_sparse, cosine_dense, EmbeddingProvider
+from .config import TOP_K, RAG_MIN_SCORE, RAG_MIN_SOURCES, RAG_CONCURRENT, RAG_WORKERS, RAG_SOURCE_TIMEOUT, RAG_DEADLINE
+from .rag import build_terms, embed_text, cosine_sparse, cosine_dense, is_dense, EmbeddingProvider
+from .knowledge_index import knowledge_index
 
 
 def _score_text(query_vec, item_vec):
-    if isinstance(query_vec, list) and isinstance(item_vec, list):
+    if is_dense(query_vec) and is_dense(item_vec):
         return cosine_dense(query_vec, item_vec)
     if isinstance(query_vec, dict) and isinstance(item_vec, dict):
         return cosine_sparse(query_vec, item_vec)
     return 0.0
 
 
-def _query_vectors(qtext):
-    ep = EmbeddingProvider()
-    q_dense = ep.embed_text(qtext, is_query=True)
-    q_sparse = embed_text(build_terms(qtext))
-    return q_dense, q_sparse
+def _dense_query(qtext, provider=None):
+    ep = provider or EmbeddingProvider()
+    return ep.embed_text(qtext, is_query=True)
 
 
-def retrieve_all(storage, knowledge, vector_store, graph_client, neo4j_client, query_text: str, top_k: int = TOP_K):
-    q_dense, q_sparse = _query_vectors(query_text)
-    hits: List[Dict[str, Any]] = []
+def _query_vectors(qtext, provider=None):
+    return _dense_query(qtext, provider), embed_text(build_terms(qtext))
 
-    try:
-        rows = storage.get_all_embeddings()
-        scored = []
-        for aid, terms_json, vec_json in rows:
-            try:
-                v = json.loads(vec_json)
-            except Exception:
-                v = None
-            try:
-                t = json.loads(terms_json)
-            except Exception:
-                t = None
-            if q_dense is not None and isinstance(v, list):
-                s = cosine_dense(q_dense, v)
-            elif isinstance(v, dict) and isinstance(q_sparse, dict):
-                s = cosine_sparse(q_sparse, v)
-            elif isinstance(t, dict) and isinstance(q_sparse, dict):
-                s = cosine_sparse(q_sparse, t)
-            else:
-                s = 0.0
-            scored.append((s, aid))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        for s, aid in scored[:top_k]:
-            hits.append({"source": "history", "id": aid, "score": s})
-    except Exception:
-        pass
 
-    try:
-        krefs = knowledge
-        for t in krefs:
-            tf = build_terms(t)
-            v = embed_text(tf)
-            if q_dense is not None:
-                s = 0.0
-            else:
-                s = _score_text(q_sparse, v)
-            hits.append({"source": "knowledge", "text": t, "score": s})
-    except Exception:
-        pass
+_executors = {}
+_slots = {}
+_executor_lock = threading.Lock()
 
-    try:
-        vs_items = vector_store.search(query_text, top_k=top_k)
-        for it in vs_items:
-            vec = it.get("vec", None)
-            if q_dense is not None and isinstance(vec, list):
-                s = cosine_dense(q_dense, vec)
-            elif isinstance(vec, dict) and isinstance(q_sparse, dict):
-                s = cosine_sparse(q_sparse, vec)
-            else:
-                s = 0.0
-            hits.append({"source": "vector", "text": it.get("text", ""), "score": s})
-    except Exception:
-        pass
 
+def _get_executor(name):
+    # one pool per source, so a source that keeps overrunning cannot starve the others
+    ex = _executors.get(name)
+    if ex is None:
+        with _executor_lock:
+            ex = _executors.get(name)
+            if ex is None:
+                _slots[name] = threading.BoundedSemaphore(RAG_WORKERS)
+                ex = _executors[name] = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix=f"rag-{name}")
+    return ex
+
+
+def _submit(name, fn, *args):
+    # a slot is held until the call returns, even after the query has given up on it,
+    # so abandoned work still counts against the source's capacity; None when all slots are taken
+    ex = _get_executor(name)
+    slot = _slots[name]
+    if not slot.acquire(blocking=False):
+        return None
     try:
-        for t in graph_client.describe_company(query_text, limit=top_k):
-            hits.append({"source": "graph_csv", "text": t, "score": 0.3})
+        fut = ex.submit(_timed, fn, *args)
     except Exception:
-        pass
+        slot.release()
+        raise
+    fut.add_done_callback(lambda _: slot.release())
+    return fut
+
+
+def _history_hits(storage, q_dense, q_sparse, top_k):
+    return [{"source": "history", "id": aid, "score": s}
+            for s, aid in storage.history_index().search(q_dense, q_sparse, top_k)]
+
+
+def _knowledge_hits(knowledge, q_dense, q_sparse, top_k):
+    # vectors of the knowledge items are precomputed once per knowledge list (and cached on disk)
+    kindex = knowledge_index(knowledge)
+    return [{"source": "knowledge", "text": kindex.items[i], "score": s}
+            for s, i in kindex.search(q_dense, q_sparse, top_k)]
+
+
+def _vector_hits(vector_store, query_text, q_dense, q_sparse, top_k):
+    out = []
+    for it in vector_store.search(query_text, top_k=top_k):
+        vec = it.get("vec", None)
+        if q_dense is not None and is_dense(vec):
+            s = cosine_dense(q_dense, vec)
+        elif isinstance(vec, dict) and isinstance(q_sparse, dict):
+            s = cosine_sparse(q_sparse, vec)
+        else:
+            s = 0.0
+        out.append({"source": "vector", "text": it.get("text", ""), "score": s})
+    return out
+
+
+def _graph_csv_hits(graph_client, query_text, top_k):
+    return [{"source": "graph_csv", "text": t, "score": 0.3}
+            for t in graph_client.describe_company(query_text, limit=top_k)]
+
+
+def _graph_neo4j_hits(neo4j_client, query_text, top_k):
+    if not (neo4j_client and neo4j_client.available()):
+        return []
+    return [{"source": "graph_neo4j", "text": t, "score": 0.4}
+            for t in neo4j_client.describe_company(query_text, limit=top_k)]
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
     try:
-        if neo4j_client and neo4j_client.available():
-            for t in neo4j_client.describe_company(query_text, limit=top_k):
-                hits.append({"source": "graph_neo4j", "text": t, "score": 0.4})
+        return fn(*args), "ok", time.perf_counter() - t0
     except Exception:
-        pass
+        return [], "error", time.perf_counter() - t0
+
+
+def _collect(fut, started, until):
+    # (result, status, seconds) of a submitted source, waiting no later than ``until``
+    if fut is None:
+        return [], "busy", 0.0
+    done, _ = wait([fut], timeout=max(0.0, until - time.perf_counter()))
+    if done:
+        return fut.result()
+    fut.cancel()
+    return [], "timeout", time.perf_counter() - started
+
+
+def retrieve_all(storage, knowledge, vector_store, graph_client, neo4j_client, query_text: str, top_k: int = TOP_K,
+                 concurrent: bool = None, source_timeout: float = None, deadline: float = None, provider=None):
+    """Query every source and merge the hits.
+
+    In concurrent mode (default, RAG_CONCURRENT) each source runs on its own
+    thread pool of RAG_WORKERS threads; each gets at most ``source_timeout``
+    seconds and all of them, including the query embedding, share the overall
+    ``deadline``.  A source that misses its budget contributes no hits, and a
+    source whose workers are all still busy with earlier calls is skipped
+    ("busy").  If the query embedding misses its budget the vector sources
+    fall back to the sparse query.  ``timings`` reports per-source
+    ms/status/hit count.
+    """
+    concurrent = RAG_CONCURRENT if concurrent is None else concurrent
+    source_timeout = RAG_SOURCE_TIMEOUT if source_timeout is None else source_timeout
+    deadline = RAG_DEADLINE if deadline is None else deadline
+    t0 = time.perf_counter()
+    results = {}
+
+    # graph sources do not need the query vectors, so they start before the query is embedded
+    early = [
+        ("graph_csv", _graph_csv_hits, (graph_client, query_text, top_k)),
+        ("graph_neo4j", _graph_neo4j_hits, (neo4j_client, query_text, top_k)),
+    ]
+    futures = {}
+    started = {}
+    end = t0 + deadline
+    if concurrent:
+        for name, fn, args in early + [("query", _dense_query, (query_text, provider))]:
+            started[name] = time.perf_counter()
+            futures[name] = _submit(name, fn, *args)
+        q_sparse = embed_text(build_terms(query_text))
+        results["query"] = _collect(futures["query"], started["query"], min(end, started["query"] + source_timeout))
+        q_dense = results["query"][0] if results["query"][1] == "ok" else None
+    else:
+        started["query"] = time.perf_counter()
+        q_dense, q_sparse = _query_vectors(query_text, provider)
+        results["query"] = (q_dense, "ok", time.perf_counter() - started["query"])
+    late = [
+        ("history", _history_hits, (storage, q_dense, q_sparse, top_k)),
+        ("knowledge", _knowledge_hits, (knowledge, q_dense, q_sparse, top_k)),
+        ("vector", _vector_hits, (vector_store, query_text, q_dense, q_sparse, top_k)),
+    ]
+    order = ["history", "knowledge", "vector", "graph_csv", "graph_neo4j"]
+
+    if concurrent:
+        for name, fn, args in late:
+            started[name] = time.perf_counter()
+            futures[name] = _submit(name, fn, *args)
+        # each source is bounded by its own timeout (from submission) and the shared deadline
+        for name in order:
+            results[name] = _collect(futures[name], started[name], min(end, started[name] + source_timeout))
+    else:
+        for name, fn, args in late + early:
+            results[name] = _timed(fn, *args)
+
+    hits: List[Dict[str, Any]] = []
+    timings = {}
+    for name in order:
+        h, status, elapsed = results[name]
+        hits.extend(h)
+        timings[name] = {"ms": round(elapsed * 1000, 2), "status": status, "hits": len(h)}
+    _, status, elapsed = results["query"]
+    timings["query"] = {"ms": round(elapsed * 1000, 2), "status": status}
+    timings["total"] = {"ms": round((time.perf_counter() - t0) * 1000, 2)}
 
     hits.sort(key=lambda x: x.get("score", 0.0), reverse=True)
     valid_hits = [h for h in hits if h.get("score", 0.0) >= RAG_MIN_SCORE]
     sources = set([h.get("source", "") for h in valid_hits])
     ok = len(sources) >= RAG_MIN_SOURCES
-    return {"hits": hits[:top_k], "valid": ok}
+    return {"hits": hits[:top_k], "valid": ok, "timings": timings}
@@ -0,0 +1,138 @@
+"""
+Inverted index for sparse (term-weight) retrieval.
+
+Postings map each term to parallel arrays of document positions and weights;
+document norms are precomputed, so a query only touches the postings of its
+own terms and accumulates scores into one NumPy array before a top-k
+selection.  Weighting schemes:
+
+- ``tf``    cosine over the stored weights (same scores as ``cosine_sparse``)
+- ``tfidf`` cosine over tf * idf
+- ``bm25``  Okapi BM25 (expects raw term counts, e.g. from ``build_terms``)
+"""
+import math
+import threading
+import numpy as np
+
+from .config import SPARSE_WEIGHTING, BM25_K1, BM25_B
+from .dense_index import topk
+
+WEIGHTINGS = ("tf", "tfidf", "bm25")
+
+
+class SparseIndex:
+    def __init__(self, weighting=None, k1=None, b=None):
+        self.weighting = (weighting or SPARSE_WEIGHTING).lower()
+        if self.weighting not in WEIGHTINGS:
+            raise ValueError(f"unknown weighting: {self.weighting}")
+        self.k1 = BM25_K1 if k1 is None else k1
+        self.b = BM25_B if b is None else b
+        self._lock = threading.RLock()
+        self._postings = {}   # term -> [doc positions list, weights list]
+        self._arrays = {}     # term -> (np docs, np weights) cache
+        self._doc_len = []    # sum of raw weights per doc (bm25)
+        self._sq_norm = []    # sum of squared raw weights per doc (tf)
+        self._norms = None    # finalised per-doc norms for the current weighting
+        self._idf = {}
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, terms):
+        """Add one document given as ``{term: weight}``; returns its position."""
+        with self._lock:
+            pos = len(self._doc_len)
+            total = 0.0
+            sq = 0.0
+            for t, w in (terms or {}).items():
+                w = float(w)
+                if w == 0:
+                    continue
+                p = self._postings.get(t)
+                if p is None:
+                    p = self._postings[t] = [[], []]
+                p[0].append(pos)
+                p[1].append(w)
+                self._arrays.pop(t, None)
+                total += w
+                sq += w * w
+            self._doc_len.append(total)
+            self._sq_norm.append(sq)
+            self._dirty = True
+            return pos
+
+    def add_many(self, docs):
+        with self._lock:
+            return [self.add(d) for d in docs]
+
+    def _term_arrays(self, t):
+        a = self._arrays.get(t)
+        if a is None:
+            p = self._postings[t]
+            a = (np.asarray(p[0], dtype=np.int64), np.asarray(p[1], dtype=np.float32))
+            self._arrays[t] = a
+        return a
+
+    def _finalize(self):
+        if not self._dirty:
+            return
+        n = len(self._doc_len)
+        if self.weighting == "tf":
+            self._norms = np.sqrt(np.asarray(self._sq_norm, dtype=np.float32))
+        elif self.weighting == "tfidf":
+            self._idf = {t: math.log((n + 1) / (len(p[0]) + 1)) + 1.0 for t, p in self._postings.items()}
+            sq = np.zeros(n, dtype=np.float64)
+            for t in self._postings:
+                docs, w = self._term_arrays(t)
+                sq[docs] += (w * self._idf[t]) ** 2
+            self._norms = np.sqrt(sq).astype(np.float32)
+        else:
+            self._idf = {t: math.log(1 + (n - len(p[0]) + 0.5) / (len(p[0]) + 0.5)) for t, p in self._postings.items()}
+            dl = np.asarray(self._doc_len, dtype=np.float32)
+            avg = float(dl.mean()) if n else 0.0
+            self._norms = self.k1 * (1 - self.b + self.b * dl / (avg or 1.0))
+        self._dirty = False
+
+    def scores(self, query):
+        """Score every document against ``{term: weight}``; returns a float32 array."""
+        with self._lock:
+            n = len(self._doc_len)
+            acc = np.zeros(n, dtype=np.float32)
+            if not n or not query:
+                return acc
+            self._finalize()
+            if self.weighting == "bm25":
+                for t in query:
+                    if t not in self._postings:
+                        continue
+                    docs, w = self._term_arrays(t)
+                    acc[docs] += self._idf[t] * w * (self.k1 + 1) / (w + self._norms[docs])
+                return acc
+            qn = 0.0
+            for t, qw in query.items():
+                qw = float(qw)
+                if self.weighting == "tfidf":
+                    qw *= self._idf.get(t, 0.0)
+                qn += qw * qw
+                if t not in self._postings or qw == 0:
+                    continue
+                docs, w = self._term_arrays(t)
+                if self.weighting == "tfidf":
+                    acc[docs] += qw * self._idf[t] * w
+                else:
+                    acc[docs] += qw * w
+            if qn == 0:
+                return np.zeros(n, dtype=np.float32)
+            nz = self._norms > 0
+            acc[nz] /= self._norms[nz] * math.sqrt(qn)
+            acc[~nz] = 0.0
+            return acc
+
+    def search(self, query, top_k, exclude=None):
+        """Return ``[(score, position)]`` best first; ``exclude`` is an optional boolean mask."""
+        s = self.scores(query)
+        if exclude is not None and len(s):
+            s[np.asarray(exclude, dtype=bool)] = -np.inf
+        idx = topk(s, top_k)
+        return [(float(s[i]), int(i)) for i in idx if s[i] != -np.inf]
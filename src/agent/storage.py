@@ -1,150 +1,567 @@
-# src/agent/storage.py
 """
 Optimized Storage (sqlite) compatible with existing schema and batch embedding.
+
+Connections are pooled per Storage instance and opened in WAL mode, so readers
+do not block the writer and each write no longer pays a full open/fsync/close.
+Use ``with storage.transaction():`` to group many writes into one commit.
 """
 import sqlite3
 import json
 import os
+import queue
+import sys
+import threading
+from array import array
+from contextlib import contextmanager
+
+from src.agent.config import SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_POOL_SIZE, SQLITE_BUSY_TIMEOUT
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+_SQL_VARIABLE_CHUNK = 900
+
+
+# schema migrations, applied in order and tracked through PRAGMA user_version
+def _migrate_secondary_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assessments_entity_ts ON assessments(entity_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_features_assessment ON features(assessment_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_assessment ON embeddings(assessment_id)")
+
+
+def _migrate_reports_primary_key(conn):
+    # sqlite cannot add a primary key in place: rebuild the table, keeping the
+    # most recently written report for each assessment
+    conn.execute("""
+        CREATE TABLE reports_new (
+            assessment_id INTEGER PRIMARY KEY,
+            report_text TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO reports_new(assessment_id, report_text)
+        SELECT assessment_id, report_text FROM reports
+        WHERE assessment_id IS NOT NULL ORDER BY rowid
+    """)
+    conn.execute("DROP TABLE reports")
+    conn.execute("ALTER TABLE reports_new RENAME TO reports")
+
+
+def _migrate_embedding_blob_columns(conn):
+    # dense vectors move to a little-endian float32 BLOB; `vector` keeps sparse
+    # dict JSON and any legacy rows not yet converted by migrate_embeddings
+    conn.execute("ALTER TABLE embeddings ADD COLUMN dense BLOB")
+    conn.execute("ALTER TABLE embeddings ADD COLUMN dim INTEGER")
+    conn.execute("ALTER TABLE embeddings ADD COLUMN model TEXT")
+    conn.execute("ALTER TABLE embeddings ADD COLUMN provider TEXT")
+
+
+def _migrate_embed_checkpoints(conn):
+    # files already embedded by batch_embed, so interrupted runs can resume;
+    # done=0 marks a file whose chunks [first_id, first_id + chunks) are only partly written
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embed_checkpoints (
+            file_hash TEXT,
+            provider TEXT,
+            model TEXT,
+            path TEXT,
+            first_id INTEGER,
+            chunks INTEGER,
+            done INTEGER,
+            PRIMARY KEY (file_hash, provider, model)
+        )
+    """)
+
+
+MIGRATIONS = [
+    (1, "secondary indexes", _migrate_secondary_indexes),
+    (2, "reports primary key", _migrate_reports_primary_key),
+    (3, "embedding blob columns", _migrate_embedding_blob_columns),
+    (4, "embed checkpoints", _migrate_embed_checkpoints),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# embedding codec
+def encode_embedding(vector):
+    """Return ``(vector_text, dense_blob, dim)`` for a dense/sparse/JSON vector."""
+    if vector is None:
+        return None, None, None
+    if isinstance(vector, (bytes, bytearray, memoryview)):
+        blob = bytes(vector)
+        return None, blob, len(blob) // 4
+    if isinstance(vector, str):
+        try:
+            parsed = json.loads(vector)
+        except Exception:
+            return vector, None, None
+        if not isinstance(parsed, list):
+            return vector, None, None
+        vector = parsed
+    if isinstance(vector, dict):
+        return json.dumps(vector, ensure_ascii=False), None, None
+    if np is not None:
+        arr = np.asarray(vector, dtype="<f4").reshape(-1)
+        return None, arr.tobytes(), int(arr.shape[0])
+    arr = array("f", [float(x) for x in vector])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return None, arr.tobytes(), len(arr)
+
+
+def decode_embedding(vector_text, blob):
+    """Dense rows come back as a read-only float32 view of the BLOB (a list without
+    numpy); sparse and legacy rows as the parsed JSON (dict or list)."""
+    if blob is not None:
+        if np is not None:
+            return np.frombuffer(blob, dtype="<f4")
+        arr = array("f")
+        arr.frombytes(blob)
+        if sys.byteorder == "big":
+            arr.byteswap()
+        return arr.tolist()
+    if vector_text is None:
+        return None
+    try:
+        return json.loads(vector_text)
+    except Exception:
+        return None
+
+
+def _terms_text(terms):
+    if terms is None or isinstance(terms, str):
+        return terms
+    return json.dumps(terms, ensure_ascii=False)
+
+
+def _embedding_row(assessment_id, terms, vector, model=None, provider=None):
+    vector_text, blob, dim = encode_embedding(vector)
+    return (assessment_id, _terms_text(terms), vector_text, blob, dim, model, provider)
+
+
+_INSERT_EMBEDDING = "INSERT INTO embeddings(assessment_id, terms, vector, dense, dim, model, provider) VALUES(?,?,?,?,?,?,?)"
+
 
 class Storage:
-    def __init__(self, path):
+    def __init__(self, path, pool_size=None, synchronous=None, journal_mode=None):
         self.path = path
         d = os.path.dirname(path)
         if d and not os.path.exists(d):
             os.makedirs(d, exist_ok=True)
+        self.pool_size = max(1, int(pool_size if pool_size is not None else SQLITE_POOL_SIZE))
+        self.synchronous = str(synchronous or SQLITE_SYNCHRONOUS).upper()
+        if self.synchronous not in _SYNCHRONOUS_LEVELS:
+            raise ValueError(f"invalid synchronous level: {self.synchronous}")
+        self.journal_mode = str(journal_mode or SQLITE_JOURNAL_MODE).upper()
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._local = threading.local()
+        self._history_index = None
+        self._indexed_rowid = 0     # embeddings rowid up to which the history index is built
+        self._index_lock = threading.Lock()
+        self._schema_ready = False  # init() has run on this instance
 
+    # connection management
     def connect(self):
-        return sqlite3.connect(self.path)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def _conn(self):
+        # reuse the connection of an enclosing transaction() on this thread
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run all Storage writes of this thread in a single commit.
+
+        The write lock is taken up front (BEGIN IMMEDIATE); nested calls join
+        the outer transaction.  Any exception rolls the whole batch back.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._release(conn)
+        # reached only after a successful commit
+        self._sync_history_index()
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
 
     def init(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                entity_id TEXT,
-                timestamp TEXT,
-                risk_score REAL,
-                decision TEXT
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS assessments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entity_id TEXT,
+                    timestamp TEXT,
+                    risk_score REAL,
+                    decision TEXT
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    assessment_id INTEGER,
+                    report_text TEXT
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS features (
+                    assessment_id INTEGER,
+                    feature_name TEXT,
+                    value REAL,
+                    contribution REAL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    assessment_id INTEGER,
+                    terms TEXT,
+                    vector TEXT
+                )
+            """)
+        self.migrate()
+        self._schema_ready = True
+
+    def _ensure_schema(self):
+        # readers of migrated columns on a Storage whose caller never ran init()
+        if not self._schema_ready:
+            self.init()
+
+    def schema_version(self):
+        with self._conn() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, target=None):
+        """Apply pending schema migrations; safe to call on any existing database."""
+        target = SCHEMA_VERSION if target is None else target
+        applied = []
+        if self.schema_version() >= target:
+            return applied
+        for version, name, fn in MIGRATIONS:
+            if version > target:
+                break
+            with self.transaction() as conn:
+                # re-check under the write lock so concurrent initialisers skip finished steps
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if current >= version:
+                    continue
+                fn(conn)
+                conn.execute(f"PRAGMA user_version={int(version)}")
+            applied.append(name)
+        return applied
+
+    # basic operations
+    def save_assessment(self, entity_id, timestamp, risk_score, decision):
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO assessments(entity_id, timestamp, risk_score, decision) VALUES(?,?,?,?)",
+                (entity_id, timestamp, risk_score, decision)
             )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS reports (
-                assessment_id INTEGER,
-                report_text TEXT
+            return cur.lastrowid
+
+    def save_assessments_bulk(self, records):
+        """Write many assessments with their report, features and embedding at once.
+
+        Each record is a dict with ``entity_id``, ``timestamp``, ``risk_score`` and
+        optionally ``decision``, ``report_text``, ``features`` (iterable of
+        ``(feature_name, value, contribution)``) and ``embedding``
+        (``(terms, vector[, model, provider])``).  Ids are allocated in one shot and all four tables
+        are written with executemany inside a single transaction.  Returns the
+        assigned assessment ids in record order.
+        """
+        records = list(records)
+        if not records:
+            return []
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='assessments'), 0),"
+                " COALESCE(MAX(id), 0)) FROM assessments"
+            ).fetchone()
+            base = int(row[0] or 0) + 1
+            ids = list(range(base, base + len(records)))
+            conn.executemany(
+                "INSERT INTO assessments(id, entity_id, timestamp, risk_score, decision) VALUES(?,?,?,?,?)",
+                ((aid, r.get("entity_id", ""), r.get("timestamp", ""), r.get("risk_score"), r.get("decision", ""))
+                 for aid, r in zip(ids, records))
             )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS features (
-                assessment_id INTEGER,
-                feature_name TEXT,
-                value REAL,
-                contribution REAL
+            conn.executemany(
+                "INSERT OR REPLACE INTO reports(assessment_id, report_text) VALUES(?,?)",
+                ((aid, r["report_text"]) for aid, r in zip(ids, records) if r.get("report_text") is not None)
             )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS embeddings (
-                assessment_id INTEGER,
-                terms TEXT,
-                vector TEXT
+            conn.executemany(
+                "INSERT INTO features(assessment_id, feature_name, value, contribution) VALUES(?,?,?,?)",
+                ((aid, name, value, contribution)
+                 for aid, r in zip(ids, records)
+                 for name, value, contribution in (r.get("features") or ()))
             )
-        """)
-        conn.commit()
-        conn.close()
-
-    # basic operations
-    def save_assessment(self, entity_id, timestamp, risk_score, decision):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO assessments(entity_id, timestamp, risk_score, decision) VALUES(?,?,?,?)",
-            (entity_id, timestamp, risk_score, decision)
-        )
-        conn.commit()
-        aid = cur.lastrowid
-        conn.close()
-        return aid
+            emb_rows = [_embedding_row(aid, *r["embedding"]) for aid, r in zip(ids, records) if r.get("embedding")]
+            conn.executemany(_INSERT_EMBEDDING, emb_rows)
+        return ids
 
     def update_decision(self, assessment_id, decision):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("UPDATE assessments SET decision=? WHERE id= ?", (decision, assessment_id))
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute("UPDATE assessments SET decision=? WHERE id= ?", (decision, assessment_id))
+
+    # features
+    def save_feature(self, assessment_id, feature_name, value, contribution):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO features(assessment_id, feature_name, value, contribution) VALUES(?,?,?,?)",
+                (assessment_id, feature_name, value, contribution)
+            )
 
     # reports
     def save_report(self, assessment_id, text):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO reports(assessment_id, report_text) VALUES(?,?)", (assessment_id, text))
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO reports(assessment_id, report_text) VALUES(?,?)", (assessment_id, text))
 
     def update_report(self, assessment_id, text):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("UPDATE reports SET report_text=? WHERE assessment_id=?", (text, assessment_id))
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute("UPDATE reports SET report_text=? WHERE assessment_id=?", (text, assessment_id))
 
     def get_report(self, assessment_id):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT report_text FROM reports WHERE assessment_id=?", (assessment_id,))
-        row = cur.fetchone()
-        conn.close()
+        with self._conn() as conn:
+            row = conn.execute("SELECT report_text FROM reports WHERE assessment_id=?", (assessment_id,)).fetchone()
         return row[0] if row else ""
 
     def get_reports(self, ids):
         if not ids:
             return []
-        conn = self.connect()
-        cur = conn.cursor()
-        q = f"SELECT report_text FROM reports WHERE assessment_id IN ({','.join([str(i) for i in ids])})"
-        cur.execute(q)
-        rows = cur.fetchall()
-        conn.close()
+        ids = list(ids)
+        rows = []
+        with self._conn() as conn:
+            for i in range(0, len(ids), _SQL_VARIABLE_CHUNK):
+                chunk = ids[i:i + _SQL_VARIABLE_CHUNK]
+                q = f"SELECT report_text FROM reports WHERE assessment_id IN ({','.join(['?'] * len(chunk))})"
+                rows.extend(conn.execute(q, chunk).fetchall())
         return [r[0] for r in rows]
 
+    def get_history(self, entity_id, limit=50):
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT id, timestamp, risk_score, decision FROM assessments"
+                " WHERE entity_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (entity_id, limit)
+            ).fetchall()
+        return [{"id": r[0], "timestamp": r[1], "risk_score": r[2], "decision": r[3]} for r in rows]
+
+    def latest_risk_scores(self):
+        """``{entity_id: risk_score}`` from each entity's most recent assessment."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT a.entity_id, a.risk_score FROM assessments a"
+                " JOIN (SELECT entity_id, MAX(timestamp) AS ts FROM assessments GROUP BY entity_id) m"
+                " ON a.entity_id = m.entity_id AND a.timestamp = m.ts"
+                " WHERE a.risk_score IS NOT NULL ORDER BY a.id"
+            ).fetchall()
+        # ties on timestamp: the last inserted row wins
+        return {r[0]: r[1] for r in rows}
+
     # embeddings
-    def save_embedding(self, assessment_id, terms, vector):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO embeddings(assessment_id, terms, vector) VALUES(?,?,?)", (assessment_id, terms, vector))
-        conn.commit()
-        conn.close()
+    def save_embedding(self, assessment_id, terms, vector, model=None, provider=None):
+        # vector: dense list/ndarray (stored as float32 BLOB), sparse dict, or legacy JSON text
+        row = _embedding_row(assessment_id, terms, vector, model, provider)
+        with self._conn() as conn:
+            conn.execute(_INSERT_EMBEDDING, row)
+        self._sync_history_index()
 
     def save_embeddings_batch(self, items):
-        # items: list of tuples (assessment_id, terms_json, vector_json)
+        # items: list of tuples (assessment_id, terms, vector[, model, provider])
         if not items:
             return
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.executemany("INSERT INTO embeddings(assessment_id, terms, vector) VALUES(?,?,?)", items)
-        conn.commit()
-        conn.close()
+        rows = [_embedding_row(*it) for it in items]
+        with self._conn() as conn:
+            conn.executemany(_INSERT_EMBEDDING, rows)
+        self._sync_history_index()
 
     def get_all_embeddings(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT assessment_id, terms, vector FROM embeddings")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        # rows of (assessment_id, terms_json, vector) with the vector already decoded
+        self._ensure_schema()
+        with self._conn() as conn:
+            rows = conn.execute("SELECT assessment_id, terms, vector, dense FROM embeddings").fetchall()
+        return [(aid, terms, decode_embedding(vec, blob)) for aid, terms, vec, blob in rows]
+
+    def _embeddings_since(self, rowid):
+        # (rows as in get_all_embeddings, highest rowid read) for rows with rowid > ``rowid``
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT rowid, assessment_id, terms, vector, dense FROM embeddings WHERE rowid > ? ORDER BY rowid",
+                (rowid,)).fetchall()
+        if not rows:
+            return [], rowid
+        return [(aid, terms, decode_embedding(vec, blob)) for _, aid, terms, vec, blob in rows], rows[-1][0]
+
+    def convert_legacy_embeddings(self, batch_size=1000, model=None, provider=None):
+        """Rewrite dense vectors still stored as JSON text into float32 BLOBs.
+
+        Works in rowid-ordered batches, one commit per batch, so it can be
+        interrupted and resumed.  Sparse dict rows are left untouched.
+        """
+        converted = 0
+        last = 0
+        while True:
+            with self.transaction() as conn:
+                rows = conn.execute(
+                    "SELECT rowid, vector FROM embeddings"
+                    " WHERE rowid > ? AND dense IS NULL AND ltrim(vector) LIKE '[%' ORDER BY rowid LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for rowid, text in rows:
+                    _, blob, dim = encode_embedding(text)
+                    if blob is not None:
+                        updates.append((blob, dim, model, provider, rowid))
+                conn.executemany(
+                    "UPDATE embeddings SET dense=?, dim=?, vector=NULL,"
+                    " model=COALESCE(model, ?), provider=COALESCE(provider, ?) WHERE rowid=?",
+                    updates
+                )
+                last = rows[-1][0]
+            converted += len(updates)
+        return converted
+
+    def max_embedding_id(self):
+        with self._conn() as conn:
+            row = conn.execute("SELECT MAX(assessment_id) FROM embeddings").fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    # batch_embed checkpoints; provider/model None are stored as '' to keep the key unique
+    def get_embed_checkpoints(self, provider=None, model=None):
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT file_hash, path, first_id, chunks, done FROM embed_checkpoints WHERE provider = ? AND model = ?",
+                (provider or "", model or "")).fetchall()
+        return {h: {"path": p, "first_id": f, "chunks": c, "done": bool(d)} for h, p, f, c, d in rows}
+
+    def save_embed_checkpoints(self, rows):
+        # rows: (file_hash, provider, model, path, first_id, chunks, done)
+        if not rows:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embed_checkpoints (file_hash, provider, model, path, first_id, chunks, done) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(h, pv or "", m or "", p, f, c, int(bool(d))) for h, pv, m, p, f, c, d in rows])
+
+    def rollback_partial_embeddings(self, provider=None, model=None):
+        """Delete the rows of files an interrupted batch_embed left half-written; returns rows removed."""
+        removed = 0
+        with self.transaction() as conn:
+            partial = conn.execute(
+                "SELECT file_hash, first_id, chunks FROM embed_checkpoints WHERE provider = ? AND model = ? AND done = 0",
+                (provider or "", model or "")).fetchall()
+            for h, first_id, chunks in partial:
+                if chunks:
+                    removed += conn.execute(
+                        "DELETE FROM embeddings WHERE assessment_id >= ? AND assessment_id < ?",
+                        (first_id, first_id + chunks)).rowcount
+                conn.execute("DELETE FROM embed_checkpoints WHERE file_hash = ? AND provider = ? AND model = ?",
+                             (h, provider or "", model or ""))
+        if removed:
+            self._drop_history_index()
+        return removed
 
     def clear_embeddings(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM embeddings")
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM embeddings")
+        self._drop_history_index()
 
-    def count_embeddings(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM embeddings")
-        n = cur.fetchone()[0]
-        conn.close()
-        return n
+    # in-memory history index
+    def history_index(self):
+        """Return the dense/sparse HistoryIndex over all embeddings, loading it on first use.
 
+        The index remembers the highest embeddings rowid it has read; every
+        call, and every embedding write through this Storage, appends the rows
+        above that mark.  Rows committed while the first load runs are therefore
+        picked up, and so are rows appended by other Storage instances or
+        processes (on the next call).  Deletes are only seen when they go
+        through this Storage (``clear_embeddings``,
+        ``rollback_partial_embeddings``), which drop the index for a rebuild.
+        """
+        self._ensure_schema()
+        if self._history_index is None:
+            with self._index_lock:
+                if self._history_index is None:
+                    from src.agent.history_index import HistoryIndex
+                    rows, last = self._embeddings_since(0)
+                    index = HistoryIndex()
+                    index.add_rows(rows)
+                    self._indexed_rowid = last
+                    self._history_index = index
+                    return index
+        self._sync_history_index()
+        return self._history_index
 
+    def _sync_history_index(self):
+        if self._history_index is None or getattr(self._local, "conn", None) is not None:
+            # not loaded yet, or inside transaction(): synced after the commit
+            return
+        with self._index_lock:
+            if self._history_index is None:
+                return
+            rows, last = self._embeddings_since(self._indexed_rowid)
+            if rows:
+                self._history_index.add_rows(rows)
+                self._indexed_rowid = last
+
+    def _drop_history_index(self):
+        with self._index_lock:
+            # rebuilt from the table on next use
+            self._history_index = None
+            self._indexed_rowid = 0
+
+    def count_embeddings(self):
+        with self._conn() as conn:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
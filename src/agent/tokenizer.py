@@ -0,0 +1,98 @@
+"""
+Chinese-aware tokenisation for lexical retrieval (``build_terms``, BM25).
+
+Runs of CJK ideographs become character unigrams plus overlapping bigrams,
+which keeps Chinese recall (single characters) while bigrams carry most of
+the precision a word segmenter would give.  Runs of other letters/digits in
+any script (latin including accented letters, Cyrillic, kana, Hangul, ...)
+become lower-cased words; kana and Hangul are not segmented further, so they
+only split at spaces and punctuation.  Everything else is a separator.  Each
+kind of run is one compiled regex pass, and counts for repeated texts come
+from an LRU cache.
+
+Stop-words are optional (TOKENIZER_STOPWORDS): empty disables them,
+``default`` uses the built-in list, anything else is a file with one word per
+line.
+"""
+import hashlib
+import re
+from collections import Counter
+from functools import lru_cache
+from operator import add
+
+from .config import TOKENIZER_STOPWORDS, TOKENIZER_CACHE_SIZE
+
+# bump when tokenize() would split any text differently; persisted term vectors are keyed by it
+TOKENIZER_ID = "cjk-bigram-2"
+
+# CJK unified ideographs (+ extension A and compatibility ideographs)
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_CJK_RE = re.compile(f"[{_CJK}]+")
+# letters/digits of any other script
+_WORD_RE = re.compile(f"[^\\W_{_CJK}]+")
+# longer texts are tokenised directly instead of being kept in the cache
+_CACHE_MAX_LEN = 20000
+
+DEFAULT_STOPWORDS = frozenset(
+    "的 了 和 与 及 或 是 在 为 对 将 把 被 从 等 中 其 之 也 而 并 于 以 由 该 这 那 此 各 个 有 无 "
+    "a an the of and or to in on for is are was be by with as at it this that".split()
+)
+
+
+def load_stopwords(spec=None):
+    spec = TOKENIZER_STOPWORDS if spec is None else spec
+    if not spec:
+        return frozenset()
+    if spec == "default":
+        return DEFAULT_STOPWORDS
+    try:
+        with open(spec, "r", encoding="utf-8") as f:
+            return frozenset(w.strip().lower() for w in f if w.strip())
+    except Exception as e:
+        print("[tokenizer] 停用词文件读取失败，使用默认列表", e)
+        return DEFAULT_STOPWORDS
+
+
+_stopwords = load_stopwords()
+
+
+def set_stopwords(words):
+    """Replace the active stop-word set (clears the term cache)."""
+    global _stopwords
+    _stopwords = frozenset(words or ())
+    _cached_counts.cache_clear()
+
+
+def stopwords_key():
+    """Short hash of the active stop-word set, for keying persisted term vectors."""
+    return hashlib.sha1("\n".join(sorted(_stopwords)).encode("utf-8")).hexdigest()[:16]
+
+
+def tokenize(text):
+    """Words, then CJK unigrams, then CJK bigrams (order within each group follows the text)."""
+    if not text:
+        return []
+    text = text.lower()
+    runs = _CJK_RE.findall(text)
+    out = _WORD_RE.findall(text)
+    out.extend("".join(runs))
+    for run in runs:
+        out.extend(map(add, run[:-1], run[1:]))
+    if _stopwords:
+        out = [t for t in out if t not in _stopwords]
+    return out
+
+
+@lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+def _cached_counts(text):
+    # shared between callers: only ever handed out as a copy
+    return Counter(tokenize(text))
+
+
+def term_counts(text):
+    """``{term: count}`` for ``text``; a fresh dict the caller may modify."""
+    if not text:
+        return {}
+    if len(text) > _CACHE_MAX_LEN:
+        return dict(Counter(tokenize(text)))
+    return dict(_cached_counts(text))
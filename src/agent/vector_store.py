@@ -1,46 +1,193 @@
 import os
 import json
-from .rag import build_terms, embed_text, cosine_sparse, cosine_dense, EmbeddingProvider
-from .config import TOP_K, KNOWLEDGE_DIRS
+import hashlib
+import numpy as np
+from .rag import build_terms, embed_text, is_dense, EmbeddingProvider
+from .config import TOP_K, KNOWLEDGE_DIRS, VECTOR_CACHE_DIR, EMBED_BATCH_SIZE, EMBED_BATCH_MAX_CHARS, VECTOR_BACKEND, \
+    IVF_NLIST, IVF_MIN_TRAIN
+from .dense_index import DenseMatrix, IVFIndex, normalize_rows, topk
+from .sparse_index import SparseIndex
+from .io_utils import write_atomic, file_sig
+
+CHUNK_MAX_LEN = 400
+CHUNK_OVERLAP = 50
+# bump when the on-disk layout changes
+_CACHE_VERSION = 1
+BACKENDS = ("auto", "faiss", "numpy", "ivf")
+
+
+def resolve_backend(name=None):
+    """Return ``(backend, faiss module or None)``; auto prefers faiss, else exact numpy."""
+    name = (name or VECTOR_BACKEND or "auto").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown vector backend: {name}")
+    if name in ("auto", "faiss"):
+        try:
+            import faiss  # type: ignore
+            return "faiss", faiss
+        except Exception:
+            if name == "faiss":
+                print("[vector_store] 未安装 faiss，改用 numpy 后端")
+            return "numpy", None
+    return name, None
+
+
+def _list_docs(path):
+    out = []
+    if not os.path.isdir(path):
+        return out
+    for root, _, files in os.walk(path):
+        for f in files:
+            if f.lower().endswith(('.txt', '.md')):
+                out.append(os.path.join(root, f))
+    return sorted(out)
+
+
+def _batches(texts, max_items, max_chars):
+    # consecutive (start, end) ranges bounded by item count and total characters
+    start = 0
+    size = 0
+    for i, t in enumerate(texts):
+        n = len(t or "")
+        if i > start and (i - start >= max_items or size + n > max_chars):
+            yield start, i
+            start = i
+            size = 0
+        size += n
+    if start < len(texts):
+        yield start, len(texts)
+
+
+def _save_npy(arr):
+    def write(p):
+        with open(p, "wb") as f:
+            np.save(f, arr)
+    return write
+
+
+def _save_npz(arrays):
+    def write(p):
+        with open(p, "wb") as f:
+            np.savez(f, **arrays)
+    return write
+
+
+def _save_json(obj):
+    def write(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+    return write
+
+
+def embed_in_batches(provider, texts):
+    """Dense vector per text (None where the provider gave nothing).
+
+    Texts are sent through embed_batch in batches of at most
+    EMBED_BATCH_SIZE items / EMBED_BATCH_MAX_CHARS characters; only a batch
+    that fails falls back to one embed_text call per text.
+    """
+    out = [None] * len(texts)
+    if provider.provider not in ('openai', 'baai'):
+        return out
+    for start, end in _batches(texts, EMBED_BATCH_SIZE, EMBED_BATCH_MAX_CHARS):
+        batch = texts[start:end]
+        vecs = None
+        try:
+            vecs = provider.embed_batch(batch, is_query=False)
+        except Exception:
+            vecs = None
+        if not vecs or len(vecs) != len(batch):
+            vecs = [provider.embed_text(t, is_query=False) for t in batch]
+        for i, v in enumerate(vecs):
+            out[start + i] = v if is_dense(v) and len(v) else None
+    return out
 
 
 class VectorStore:
-    def __init__(self):
+    def __init__(self, cache_dir=None, backend=None, provider=None):
         self.items = []
-        self._provider = EmbeddingProvider()
-        self._faiss = None
+        self._provider = provider or EmbeddingProvider()
+        # dense index: faiss IndexFlatIP, DenseMatrix (exact) or IVFIndex (approximate)
+        self.backend, self._faiss = resolve_backend(backend)
+        self._index = None
         self._dim = None
+        # dense index row -> position in self.items
+        self._dense_items = []
+        # sparse items (no dense provider) are searched through an inverted index
+        self._sparse = SparseIndex()
+        self._sparse_items = []
+        self.cache_dir = VECTOR_CACHE_DIR if cache_dir is None else cache_dir
+
+    def _new_index(self, dim, x=None):
+        # x: optional normalised rows the numpy backends wrap without copying
+        if self.backend == "faiss":
+            index = self._faiss.IndexFlatIP(dim)
+            if x is not None:
+                index.add(np.ascontiguousarray(x, dtype=np.float32))
+            return index
+        if self.backend == "ivf":
+            return IVFIndex(dim=dim) if x is None else IVFIndex.from_normalized(x)
+        return DenseMatrix(dim=dim) if x is None else DenseMatrix.from_normalized(x)
+
+    def _add_dense(self, x, item_idxs):
+        # x: (n, d) float32 rows, already L2-normalised
+        if not len(item_idxs):
+            return
         try:
-            import faiss  # type: ignore
-            self._faiss = {"mod": faiss, "index": None}
+            dv = int(x.shape[1])
+            if self._dim is None:
+                self._dim = dv
+                self._index = self._new_index(dv, x)
+            elif self._dim == dv:
+                self._index.add(np.ascontiguousarray(x, dtype=np.float32))
+            else:
+                return
+            self._dense_items.extend(item_idxs)
         except Exception:
-            self._faiss = None
+            pass
 
-    def add(self, text, metadata):
-        vec = self._provider.embed_text(text, is_query=False)
-        if vec is None:
-            tf = build_terms(text)
-            vec = embed_text(tf)
+    def _search_dense(self, q, top_k):
+        # (scores, index rows) best first
+        if self.backend == "faiss":
+            x = np.asarray([q], dtype=np.float32)
+            x = x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-12)
+            D, I = self._index.search(x, top_k)
+            return D[0], I[0]
+        return self._index.search(np.asarray(q, dtype=np.float32), top_k)
+
+    def _add_item(self, text, metadata, vec):
         idx = len(self.items)
         it = {"text": text, "metadata": metadata, "vec": vec}
         self.items.append(it)
-        if isinstance(vec, list) and self._faiss is not None:
-            try:
-                import numpy as np
-                dv = len(vec)
-                if self._dim is None:
-                    self._dim = dv
-                    index = self._faiss["mod"].IndexFlatIP(dv)
-                    self._faiss["index"] = index
-                if self._dim == dv and self._faiss["index"] is not None:
-                    x = np.array([vec]).astype('float32')
-                    n = np.linalg.norm(x, axis=1, keepdims=True)
-                    x = x / (n + 1e-12)
-                    self._faiss["index"].add(x)
-            except Exception:
-                pass
+        if isinstance(vec, dict):
+            # raw term counts, not the normalised ``vec``: bm25 needs real document lengths
+            self._sparse.add(build_terms(text))
+            self._sparse_items.append(idx)
+        return idx
+
+    def add(self, text, metadata):
+        self.add_many([text], [metadata])
 
-    def _chunk_text(self, text, max_len=400, overlap=50):
+    def add_many(self, texts, metadatas):
+        """Embed texts in batches and add them; dense rows go to the index in one call."""
+        vecs = self._embed_chunks(texts)
+        rows, dense_idx = [], []
+        for text, meta, vec in zip(texts, metadatas, vecs):
+            if vec is None:
+                tf = build_terms(text)
+                vec = embed_text(tf)
+            idx = self._add_item(text, meta, vec)
+            if is_dense(vec) and len(vec) and (self._dim is None or len(vec) == self._dim) \
+                    and (not rows or len(vec) == len(rows[0])):
+                rows.append(vec)
+                dense_idx.append(idx)
+        if rows:
+            x = np.asarray(rows, dtype=np.float32)
+            x = x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-12)
+            self._add_dense(x, dense_idx)
+        return len(texts)
+
+    def _chunk_text(self, text, max_len=CHUNK_MAX_LEN, overlap=CHUNK_OVERLAP):
         out = []
         if not text:
             return out
@@ -52,61 +199,252 @@ class VectorStore:
             i += max_len - overlap
         return out
 
+    def _read_chunks(self, fp):
+        with open(fp, "r", encoding="utf-8") as fh:
+            text = fh.read()
+        chunks = self._chunk_text(text)
+        if not chunks:
+            chunks = [text]
+        return [(ch, {"source": fp, "chunk": idx}) for idx, ch in enumerate(chunks)]
+
+    def _embed_chunks(self, texts):
+        return embed_in_batches(self._provider, texts)
+
+    def _collect_chunks(self, files):
+        texts, metas = [], []
+        for fp in files:
+            try:
+                chunks = self._read_chunks(fp)
+            except Exception:
+                continue
+            for ch, meta in chunks:
+                texts.append(ch)
+                metas.append(meta)
+        return texts, metas
+
     def add_dir(self, path):
         if not os.path.isdir(path):
             return 0
-        count = 0
-        for root, _, files in os.walk(path):
-            for f in files:
-                if f.lower().endswith(('.txt', '.md')):
-                    fp = os.path.join(root, f)
-                    try:
-                        with open(fp, "r", encoding="utf-8") as fh:
-                            text = fh.read()
-                        chunks = self._chunk_text(text)
-                        if not chunks:
-                            chunks = [text]
-                        for idx, ch in enumerate(chunks):
-                            self.add(ch, {"source": fp, "chunk": idx})
-                            count += 1
-                    except Exception:
-                        pass
-        return count
+        texts, metas = self._collect_chunks(_list_docs(path))
+        return self.add_many(texts, metas)
 
     def add_knowledge_dirs(self):
-        total = 0
+        files = []
         for d in KNOWLEDGE_DIRS:
             if d:
-                total += self.add_dir(d)
-        return total
+                files.extend(_list_docs(d))
+        if not self.cache_dir:
+            texts, metas = self._collect_chunks(files)
+            return self.add_many(texts, metas)
+        return self._sync_files(files)
+
+    # on-disk cache: <cache_dir>/<key>/{manifest.json, vectors.npy, index.faiss | ivf.npz}
+    def _cache_key(self):
+        # one directory per backend (and IVF build parameters), so backends never share index files
+        sig = json.dumps({
+            "version": _CACHE_VERSION,
+            "provider": self._provider.provider,
+            "model": self._provider.model_name,
+            "max_len": CHUNK_MAX_LEN,
+            "overlap": CHUNK_OVERLAP,
+            "backend": self.backend,
+            "ivf": [IVF_NLIST, IVF_MIN_TRAIN] if self.backend == "ivf" else None,
+        }, sort_keys=True)
+        return hashlib.sha1(sig.encode("utf-8")).hexdigest()[:16]
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, self._cache_key(), name)
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_path("manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception:
+            return None, None
+        vectors = None
+        vp = self._cache_path("vectors.npy")
+        if os.path.exists(vp):
+            try:
+                vectors = np.load(vp, mmap_mode="r")
+            except Exception:
+                return None, None
+        # a manifest row past the end of vectors.npy (e.g. a half-finished rewrite) invalidates the cache
+        top = max((it.get("row", -1) for it in manifest.get("items", [])), default=-1)
+        if top >= (0 if vectors is None else vectors.shape[0]):
+            return None, None
+        return manifest, vectors
+
+    def _sync_files(self, files):
+        """Load knowledge chunks from the cache, embedding only new or changed files."""
+        sigs = {fp: file_sig(fp) for fp in files}
+        fingerprint = hashlib.sha1(json.dumps(sorted(sigs.items())).encode("utf-8")).hexdigest()
+        manifest, vectors = self._load_cache()
+        unchanged = manifest is not None and manifest.get("fingerprint") == fingerprint
+        old_files = {f["path"]: f for f in manifest.get("files", [])} if manifest else {}
+
+        entries = []      # [text, metadata, dense row or None]
+        file_meta = []
+        pending = []      # entry positions still to be embedded, across all changed files
+        for fp in files:
+            of = old_files.get(fp)
+            start = len(entries)
+            if of is not None and of.get("sig") == sigs[fp]:
+                for it in manifest["items"][of["start"]:of["start"] + of["count"]]:
+                    row = it.get("row", -1)
+                    entries.append([it["text"], it["metadata"], vectors[row] if row >= 0 and vectors is not None else None])
+            else:
+                try:
+                    chunks = self._read_chunks(fp)
+                except Exception:
+                    chunks = []
+                for ch, meta in chunks:
+                    pending.append(len(entries))
+                    entries.append([ch, meta, None])
+            file_meta.append({"path": fp, "sig": sigs[fp], "start": start, "count": len(entries) - start})
+        if pending:
+            vecs = self._embed_chunks([entries[i][0] for i in pending])
+            for i, v in zip(pending, vecs):
+                entries[i][2] = v
+
+        dim = self._dim
+        if dim is None:
+            dim = next((len(v) for _, _, v in entries if v is not None), None)
+        base = len(self.items)
+        rows, dense_idx, items_meta = [], [], []
+        for text, meta, v in entries:
+            if v is not None and len(v) == dim:
+                idx = self._add_item(text, meta, v)
+                items_meta.append({"text": text, "metadata": meta, "row": len(rows)})
+                rows.append(v)
+                dense_idx.append(idx)
+            else:
+                self._add_item(text, meta, embed_text(build_terms(text)))
+                items_meta.append({"text": text, "metadata": meta, "row": -1})
+        x = np.empty((0, dim or 0), dtype=np.float32)
+        if rows:
+            if unchanged and vectors is not None and len(rows) == vectors.shape[0]:
+                x = vectors
+            else:
+                x = np.vstack([np.asarray(v, dtype=np.float32) for v in rows])
+                x = x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-12)
+        # items reference rows of the (memory-mapped) matrix instead of private copies
+        for i, idx in enumerate(dense_idx):
+            self.items[idx]["vec"] = x[i]
+
+        loaded_index = False
+        if unchanged and base == 0 and rows:
+            loaded_index = self._load_index(dim, x)
+        if loaded_index:
+            self._dim = dim
+            self._dense_items.extend(dense_idx)
+        else:
+            self._add_dense(x, dense_idx)
+
+        n = len(entries)
+        if not unchanged:
+            # drop every view into the old vectors.npy mapping before it is replaced:
+            # Windows refuses to replace a file that is still mapped
+            entries = rows = vectors = None
+            self._save_cache(fingerprint, file_meta, items_meta, x, base == 0)
+        return n
+
+    def _load_index(self, dim, x):
+        # reuse the persisted index for an unchanged cache; False means rebuild from x
+        try:
+            if self.backend == "faiss":
+                index_fp = self._cache_path("index.faiss")
+                if not os.path.exists(index_fp):
+                    return False
+                try:
+                    index = self._faiss.read_index(index_fp, self._faiss.IO_FLAG_MMAP)
+                except Exception:
+                    index = self._faiss.read_index(index_fp)
+                if index.ntotal != len(x) or index.d != dim:
+                    return False
+            elif self.backend == "ivf":
+                ivf_fp = self._cache_path("ivf.npz")
+                if not os.path.exists(ivf_fp):
+                    return False
+                with np.load(ivf_fp) as z:
+                    if len(z["assign"]) != len(x) or z["centroids"].shape[1] != dim:
+                        return False
+                    index = IVFIndex.from_normalized(x, train=False)
+                    index.load_state(z["centroids"], z["assign"])
+            else:
+                index = DenseMatrix.from_normalized(x)
+            self._index = index
+            return True
+        except Exception:
+            return False
+
+    def _save_cache(self, fingerprint, file_meta, items_meta, x, with_index):
+        try:
+            os.makedirs(os.path.join(self.cache_dir, self._cache_key()), exist_ok=True)
+            manifest = {
+                "version": _CACHE_VERSION,
+                "fingerprint": fingerprint,
+                "provider": self._provider.provider,
+                "model": self._provider.model_name,
+                "chunking": {"max_len": CHUNK_MAX_LEN, "overlap": CHUNK_OVERLAP},
+                "files": file_meta,
+                "items": items_meta,
+            }
+            vp = self._cache_path("vectors.npy")
+            if len(x):
+                write_atomic(vp, _save_npy(np.ascontiguousarray(x, dtype=np.float32)))
+            elif os.path.exists(vp):
+                os.remove(vp)
+            index_fp = self._cache_path("index.faiss")
+            if with_index and len(x) and self.backend == "faiss" and self._index is not None:
+                write_atomic(index_fp, lambda p: self._faiss.write_index(self._index, p))
+            elif os.path.exists(index_fp):
+                os.remove(index_fp)
+            ivf_fp = self._cache_path("ivf.npz")
+            state = self._index.state() if with_index and len(x) and self.backend == "ivf" and self._index is not None else None
+            if state is not None:
+                write_atomic(ivf_fp, _save_npz(state))
+            elif os.path.exists(ivf_fp):
+                os.remove(ivf_fp)
+            # manifest last: it is what marks the cache as complete
+            write_atomic(self._cache_path("manifest.json"), _save_json(manifest))
+        except Exception as e:
+            print("[vector_store] 写入缓存失败", e)
 
     def search(self, query_text, top_k=TOP_K):
         q = self._provider.embed_text(query_text, is_query=True)
         if q is None:
             tf = build_terms(query_text)
             q = embed_text(tf)
-        if isinstance(q, list) and self._faiss is not None and self._faiss["index"] is not None and self._dim == len(q):
+        if is_dense(q) and self._index is not None and self._dim == len(q):
             try:
-                import numpy as np
-                x = np.array([q]).astype('float32')
-                n = np.linalg.norm(x, axis=1, keepdims=True)
-                x = x / (n + 1e-12)
-                D, I = self._faiss["index"].search(x, min(top_k, len(self.items)))
+                D, I = self._search_dense(q, min(top_k, len(self._dense_items)))
                 res = []
-                for i, d in zip(I[0], D[0]):
-                    if i >= 0 and i < len(self.items):
-                        it = self.items[i]
+                for i, d in zip(I, D):
+                    if i >= 0 and i < len(self._dense_items):
+                        it = self.items[self._dense_items[i]]
                         res.append({"text": it["text"], "metadata": it["metadata"], "vec": it["vec"], "score": float(d)})
                 return res[:top_k]
             except Exception:
                 pass
-        scored = []
-        for it in self.items:
-            s = 0.0
-            if isinstance(q, list) and isinstance(it["vec"], list):
-                s = cosine_dense(q, it["vec"])
-            elif isinstance(q, dict) and isinstance(it["vec"], dict):
-                s = cosine_sparse(q, it["vec"])
-            scored.append((s, it))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [x[1] for x in scored[:top_k]]
+        if isinstance(q, dict):
+            res = []
+            for s, p in self._sparse.search(q, top_k):
+                it = self.items[self._sparse_items[p]]
+                res.append({"text": it["text"], "metadata": it["metadata"], "vec": it["vec"], "score": s})
+            return res
+        if is_dense(q) and len(q):
+            return self._search_exact(q, top_k)
+        return []
+
+    def _search_exact(self, q, top_k):
+        # brute-force cosine over the items whose dense vector matches the query dimension
+        pos = [i for i, it in enumerate(self.items) if is_dense(it["vec"]) and len(it["vec"]) == len(q)]
+        if not pos:
+            return []
+        x = normalize_rows(np.vstack([np.asarray(self.items[i]["vec"], dtype=np.float32) for i in pos]))
+        scores = x @ normalize_rows(q)[0]
+        res = []
+        for r in topk(scores, top_k):
+            it = self.items[pos[r]]
+            res.append({"text": it["text"], "metadata": it["metadata"], "vec": it["vec"], "score": float(scores[r])})
+        return res
@@ -4,17 +4,25 @@ from typing import Dict, Any
 import os
 from datetime import datetime
 
-from src.agent.config import DEFAULT_DB_PATH, TOP_K
-from src.agent.storage import Storage
-from src.agent.vector_store import VectorStore
-from src.agent.knowledge_base import load_knowledge
-from src.agent.graph_client import GraphClient
-from src.agent.neo4j_client import Neo4jClient
+from src.agent.config import TOP_K
+from src.agent.context import RiskAgentContext
 from src.agent.retriever import retrieve_all
 from src.agent.llm_client import LLMClient
 from src.agent.training import train_model
 
 app = FastAPI()
+# warm components shared by all requests; storages are kept per db path
+agent_ctx = RiskAgentContext()
+
+
+@app.on_event("startup")
+def _startup():
+    agent_ctx.start()
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    agent_ctx.close()
 
 
 @app.post("/query")
@@ -22,17 +30,13 @@ def api_query(payload: Dict[str, Any]):
     q = str(payload.get("query", "")).strip()
     if not q:
         return JSONResponse({"error": "empty query"}, status_code=400)
-    db = payload.get("db", DEFAULT_DB_PATH)
-    storage = Storage(db)
-    storage.init()
-    vs = VectorStore()
     try:
-        vs.add_knowledge_dirs()
-    except Exception:
-        pass
-    gc = GraphClient("graph_data")
-    n4 = Neo4jClient()
-    result = retrieve_all(storage, load_knowledge(), vs, gc, n4, q, top_k=TOP_K)
+        storage = agent_ctx.storage(payload.get("db"))
+    except ValueError:
+        return JSONResponse({"error": "db not allowed"}, status_code=400)
+    agent_ctx.refresh()
+    result = retrieve_all(storage, agent_ctx.knowledge, agent_ctx.vector_store, agent_ctx.graph_client,
+                          agent_ctx.neo4j_client, q, top_k=TOP_K, provider=agent_ctx.embedding_provider)
     hits = result.get("hits", [])
     is_valid = result.get("valid", False)
     content = "证据不足"
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    from src.agent.storage import Storage
+    s = Storage(str(tmp_path / "risk.sqlite"))
+    s.init()
+    yield s
+    s.close()
+
+
+class FakeProvider:
+    """Deterministic dense embeddings; records how many texts were embedded."""
+
+    def __init__(self, dim=8, provider="baai", model_name="fake"):
+        self.dim = dim
+        self.provider = provider
+        self.model_name = model_name
+        self.batches = []
+        self.singles = 0
+        self.fail_batches = False
+
+    def _vec(self, text):
+        import hashlib
+        import numpy as np
+        seed = int(hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).astype("float32").tolist()
+
+    def embed_text(self, text, is_query=False):
+        self.singles += 1
+        return self._vec(text)
+
+    def embed_batch(self, texts, is_query=False):
+        self.batches.append(len(texts))
+        if self.fail_batches:
+            raise RuntimeError("batch endpoint down")
+        return [self._vec(t) for t in texts]
+
+    def remote_stats(self):
+        return None
+
+    @property
+    def embedded(self):
+        return sum(self.batches) + self.singles
+
+
+@pytest.fixture
+def fake_provider():
+    return FakeProvider()
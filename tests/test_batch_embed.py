@@ -0,0 +1,50 @@
+import pytest
+
+from src.agent import batch_embed
+
+
+def _folder(tmp_path):
+    d = tmp_path / "texts"
+    d.mkdir()
+    (d / "a.txt").write_text("甲" * 50, encoding="utf-8")
+    (d / "b.md").write_text("乙" * 30, encoding="utf-8")
+    (d / "skip.pdf").write_text("x", encoding="utf-8")
+    return str(d)
+
+
+def _run(monkeypatch, prov, folder, db):
+    monkeypatch.setattr(batch_embed, "EmbeddingProvider", lambda provider=None: prov)
+    batch_embed.main(folder, db, 1000, None, batch_size=2, chunk_chars=10)
+
+
+def test_rerun_skips_checkpointed_files(tmp_path, monkeypatch, fake_provider, storage):
+    folder = _folder(tmp_path)
+    _run(monkeypatch, fake_provider, folder, storage.path)
+    assert storage.count_embeddings() == 8 and fake_provider.embedded == 8
+    cps = storage.get_embed_checkpoints("baai", "fake")
+    assert sorted(c["chunks"] for c in cps.values()) == [3, 5] and all(c["done"] for c in cps.values())
+    assert storage.max_embedding_id() == 1007
+    again = type(fake_provider)()
+    _run(monkeypatch, again, folder, storage.path)
+    assert again.embedded == 0 and storage.count_embeddings() == 8
+
+
+def test_interrupted_run_is_rolled_back_and_resumed(tmp_path, monkeypatch, fake_provider, storage):
+    folder = _folder(tmp_path)
+
+    class Interrupted(type(fake_provider)):
+        def embed_batch(self, texts, is_query=False):
+            if len(self.batches) == 2:
+                raise KeyboardInterrupt
+            return super().embed_batch(texts, is_query)
+
+    with pytest.raises(KeyboardInterrupt):
+        _run(monkeypatch, Interrupted(), folder, storage.path)
+    # two batches of a.txt's five chunks were committed with an unfinished checkpoint
+    assert storage.count_embeddings() == 4
+    assert [c["done"] for c in storage.get_embed_checkpoints("baai", "fake").values()] == [False]
+    _run(monkeypatch, fake_provider, folder, storage.path)
+    assert storage.count_embeddings() == 8
+    cps = storage.get_embed_checkpoints("baai", "fake").values()
+    spans = sorted((c["first_id"], c["chunks"]) for c in cps)
+    assert spans[0][0] + spans[0][1] == spans[1][0] and all(c["done"] for c in cps)
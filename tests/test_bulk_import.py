@@ -0,0 +1,123 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location("bulk_import", ROOT / "get_graph_data/neo4j_import/bulk_import.py")
+bulk_import = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bulk_import)
+
+
+def _write_data(d):
+    (d / "company_clean.csv").write_text(
+        "symbol,name,price\n000001,平安银行,10.5\n600519,贵州茅台,1700\n000002,万科A,\n", encoding="utf-8")
+    (d / "market_index_clean.csv").write_text("code,name\n000300,CSI300\n", encoding="utf-8")
+    (d / "news_clean.csv").write_text(
+        "title,sentiment,score\n利好,positive,0.9\n利空,negative,-0.8\n", encoding="utf-8")
+
+
+def _stat(driver, prefix):
+    return next(v for k, v in driver.statements.items() if k.startswith(prefix))
+
+
+def test_dry_run_import_counts_rows_and_batches(tmp_path):
+    _write_data(tmp_path)
+    driver = bulk_import.DryRunDriver()
+    with driver.session() as s:
+        nodes = bulk_import.import_nodes(s, tmp_path, batch_size=2, chunk_rows=10)
+        rels = bulk_import.import_relationships(s, tmp_path, batch_size=2, chunk_rows=10,
+                                                index_name="CSI300", correlation=0.8, events_per_sentiment=2)
+    assert nodes == {"Company": 3, "MarketIndex": 1, "News": 2}
+    assert _stat(driver, "UNWIND $rows AS row MERGE (c:Company") == {"calls": 2, "rows": 3}
+    assert rels["LINKED_TO_INDEX"] == 3
+    assert _stat(driver, "MATCH (m:MarketIndex") == {"calls": 2, "rows": 3}
+    # 每种情绪最多 2 个 (新闻, 公司) 组合；neutral 没有新闻
+    assert rels["HAS_RISK_EVENT"] == 4
+
+
+def test_symbols_stay_strings(tmp_path):
+    _write_data(tmp_path)
+    seen = []
+
+    class Tx:
+        def run(self, cypher, **params):
+            seen.extend(params.get("rows") or [])
+            return self
+
+        def consume(self):
+            return None
+
+    class Session:
+        def execute_write(self, fn, *args):
+            return fn(Tx(), *args)
+
+    bulk_import.import_nodes(Session(), tmp_path, batch_size=10, chunk_rows=10)
+    symbols = [r["symbol"] for r in seen if "symbol" in r]
+    assert symbols == ["000001", "600519", "000002"]
+    assert [r for r in seen if "symbol" in r][2]["price"] is None
+
+
+def test_missing_index_node_counts_zero_and_warns(tmp_path, capsys):
+    _write_data(tmp_path)
+
+    class Tx:
+        def run(self, cypher, **params):
+            return self
+
+        def single(self):
+            # MATCH (m:MarketIndex) 没有命中：RETURN count(*) 为 0
+            return {"n": 0}
+
+    class Session:
+        def execute_write(self, fn, *args):
+            return fn(Tx(), *args)
+
+    rels = bulk_import.import_relationships(Session(), tmp_path, batch_size=2, chunk_rows=10,
+                                            index_name="NOPE", correlation=0.8, events_per_sentiment=0)
+    assert rels == {"LINKED_TO_INDEX": 0}
+    assert "警告" in capsys.readouterr().out
+
+
+def test_import_relations_csv_skips_invalid_labels(tmp_path):
+    p = tmp_path / "relations.csv"
+    p.write_text("src_type,src_id,rel,dst_type,dst_id\n"
+                 "Account,A1,HOLDS,Company,600519\n"
+                 "Account,A2,HOLDS,Company,000001\n"
+                 "Bad Label,X,REL,Company,000001\n", encoding="utf-8")
+    driver = bulk_import.DryRunDriver()
+    with driver.session() as s:
+        assert bulk_import.import_relations_csv(s, p, batch_size=10, chunk_rows=10) == 2
+    assert bulk_import.relation_labels(p, chunk_rows=10) == ["Account", "Company"]
+
+
+class _SyntaxError(Exception):
+    code = "Neo.ClientError.Statement.SyntaxError"
+
+
+class _ConstraintSession:
+    def __init__(self, error):
+        self.error = error
+        self.ran = []
+
+    def run(self, cypher, **params):
+        self.ran.append(cypher)
+        if "REQUIRE" in cypher and self.error is not None:
+            raise self.error
+        return self
+
+    def consume(self):
+        return None
+
+
+def test_create_constraints_falls_back_on_syntax_error():
+    s = _ConstraintSession(_SyntaxError("Invalid input 'REQUIRE'"))
+    bulk_import.create_constraints(s)
+    assert sum("ASSERT" in c for c in s.ran) == 3
+
+
+def test_create_constraints_reraises_other_errors():
+    s = _ConstraintSession(PermissionError("not allowed"))
+    with pytest.raises(PermissionError):
+        bulk_import.create_constraints(s)
+    assert not any("ASSERT" in c for c in s.ran)
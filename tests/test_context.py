@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from src.agent import context
+from src.agent.context import RiskAgentContext
+
+
+def test_storage_only_opens_allowed_paths(tmp_path, monkeypatch):
+    extra = [str(tmp_path / f"x{i}.sqlite") for i in range(3)]
+    monkeypatch.setattr(context, "DB_ALLOWED_PATHS", extra)
+    monkeypatch.setattr(context, "CONTEXT_MAX_STORAGES", 2)
+    ctx = RiskAgentContext(db_path=str(tmp_path / "main.sqlite"))
+    try:
+        default = ctx.storage()
+        assert ctx.storage(str(tmp_path / "main.sqlite")) is default
+        with pytest.raises(ValueError):
+            ctx.storage(str(tmp_path / "other.sqlite"))
+        for p in extra:
+            ctx.storage(p)
+        # bounded: the default stays, the least recently used extra path is closed
+        assert len(ctx._storages) == 2 and ctx.storage() is default
+    finally:
+        ctx.close()
+
+
+def test_refresh_rebuilds_in_background(tmp_path, monkeypatch):
+    gate = threading.Event()
+    loads = []
+
+    def load_knowledge():
+        if loads:
+            gate.wait(5)
+        loads.append(1)
+        return [f"k{len(loads)}"]
+
+    class _VS:
+        def __init__(self, provider=None):
+            pass
+
+        def add_knowledge_dirs(self):
+            pass
+
+    sig = {"v": "a"}
+    monkeypatch.setattr(context, "load_knowledge", load_knowledge)
+    monkeypatch.setattr(context, "VectorStore", _VS)
+    indexed = []
+    monkeypatch.setattr(context, "knowledge_index", lambda items, provider=None: indexed.append(items))
+    monkeypatch.setattr(context, "GraphClient", lambda d: object())
+    monkeypatch.setattr(context, "_files_fingerprint", lambda paths: sig["v"])
+    ctx = RiskAgentContext(db_path=str(tmp_path / "main.sqlite"), graph_dir=str(tmp_path), reload_interval=0)
+    ctx.refresh(force=True)
+    assert ctx.knowledge == ["k1"] and indexed == [["k1"]]
+    graph = ctx.graph_client
+    sig["v"] = "b"
+    ctx.refresh()
+    # the caller does not wait; the old snapshot is served until the rebuild lands
+    assert ctx.knowledge == ["k1"] and ctx._reloading
+    ctx.refresh()
+    gate.set()
+    for t in threading.enumerate():
+        if t.name == "context-reload":
+            t.join(5)
+    assert ctx.knowledge == ["k2"] and len(loads) == 2
+    # the index for the new list is built before it is swapped in
+    assert indexed[-1] is ctx.knowledge
+    assert ctx.graph_client is graph and not ctx._reloading
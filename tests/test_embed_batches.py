@@ -0,0 +1,18 @@
+from src.agent import vector_store
+
+
+def test_batches_respect_item_and_char_limits():
+    texts = ["x" * 10] * 5 + ["y" * 100]
+    assert list(vector_store._batches(texts, 2, 1000)) == [(0, 2), (2, 4), (4, 6)]
+    assert list(vector_store._batches(texts, 10, 50)) == [(0, 5), (5, 6)]
+
+
+def test_embed_in_batches_falls_back_per_text(monkeypatch, fake_provider):
+    monkeypatch.setattr(vector_store, "EMBED_BATCH_SIZE", 3)
+    texts = [f"t{i}" for i in range(7)]
+    out = vector_store.embed_in_batches(fake_provider, texts)
+    assert fake_provider.batches == [3, 3, 1] and all(v is not None for v in out)
+    fake_provider.fail_batches = True
+    fake_provider.batches.clear()
+    assert vector_store.embed_in_batches(fake_provider, texts) == out
+    assert fake_provider.singles == 7
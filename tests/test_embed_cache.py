@@ -0,0 +1,50 @@
+import numpy as np
+
+from src.agent import rag
+from src.agent.embed_cache import EmbeddingCache, cache_key
+from src.agent.rag import EmbeddingProvider
+
+
+def test_memory_tier_is_a_bounded_lru():
+    c = EmbeddingCache(max_items=2, path="")
+    c.put_many(["a", "b"], [[1.0], [2.0]])
+    c.get_many(["a"])
+    c.put_many(["c"], [[3.0]])
+    got = c.get_many(["a", "b", "c"])
+    assert got[1] is None and got[0].tolist() == [1.0] and got[2].tolist() == [3.0]
+    assert got[0].dtype == np.float32
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    c = EmbeddingCache(max_items=0, path=path)
+    c.put_many(["k"], [[0.5, 0.25]])
+    c.close()
+    again = EmbeddingCache(max_items=1, path=path)
+    assert again.get_many(["k", "x"])[0].tolist() == [0.5, 0.25]
+    assert (again.hits, again.misses) == (1, 1)
+    again.close()
+
+
+def test_key_covers_provider_model_and_prefix_mode():
+    keys = {cache_key("baai", "m", "prefix", "t"), cache_key("openai", "m", "prefix", "t"),
+            cache_key("baai", "n", "prefix", "t"), cache_key("baai", "m", "raw", "t")}
+    assert len(keys) == 4
+
+
+def test_embed_batch_only_sends_misses(monkeypatch):
+    cache = EmbeddingCache(max_items=10, path="")
+    monkeypatch.setattr(rag, "get_embedding_cache", lambda: cache)
+    sent = []
+
+    def remote(self, ts):
+        sent.append(list(ts))
+        return [[float(len(t)), 1.0] for t in ts]
+
+    monkeypatch.setattr(EmbeddingProvider, "_embed_batch_remote", remote)
+    ep = EmbeddingProvider(provider="openai")
+    first = ep.embed_batch(["a", "bb"])
+    second = ep.embed_batch(["bb", "ccc"])
+    assert sent == [["a", "bb"], ["ccc"]]
+    assert second[0] == first[1]
+    assert ep.embed_text("a") == first[0] and len(sent) == 2
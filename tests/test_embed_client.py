@@ -0,0 +1,83 @@
+import pytest
+
+from src.agent import embed_client
+from src.agent.embed_client import RemoteEmbeddingClient, EmbeddingResponseError
+
+
+class _Resp:
+    def __init__(self, status, body=None, headers=None, text=""):
+        self.status_code = status
+        self._body = body
+        self.headers = headers or {}
+        self.text = text
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no json")
+        return self._body
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.posts += 1
+        return self.responses.pop(0)
+
+
+def _ok(n, dim=2):
+    return _Resp(200, {"data": [{"index": i, "embedding": [float(i)] * dim} for i in reversed(range(n))],
+                       "usage": {"total_tokens": 3}})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    out = []
+    monkeypatch.setattr(embed_client.time, "sleep", out.append)
+    return out
+
+
+def _client(responses, **kw):
+    c = RemoteEmbeddingClient("http://x", "k", "m", **kw)
+    c.session = _Session(responses)
+    return c
+
+
+def test_retries_then_returns_vectors_in_input_order(sleeps):
+    c = _client([_Resp(503), _Resp(429, headers={"Retry-After": "2"}), _ok(2)], retries=3)
+    assert c.embed(["a", "b"]) == [[0.0, 0.0], [1.0, 1.0]]
+    assert len(sleeps) == 2 and sleeps[1] == 2.0
+    assert c.stats()["retries"] == 2 and c.stats()["tokens"] == 3
+
+
+def test_retry_after_is_clamped(sleeps):
+    c = _client([_Resp(429, headers={"Retry-After": "3600"}), _ok(1)], retries=1)
+    c.embed(["a"])
+    assert sleeps == [embed_client._BACKOFF_MAX]
+
+
+def test_interactive_embed_uses_short_budget(sleeps):
+    c = _client([_Resp(503)] * 4 + [_ok(1)], retries=5, query_retries=1)
+    assert c.embed(["q"], interactive=True) is None
+    assert c.session.posts == 2 and all(s <= embed_client._QUERY_BACKOFF_MAX for s in sleeps)
+
+
+def test_non_retryable_status_fails_fast(sleeps):
+    c = _client([_Resp(400)], retries=3)
+    assert c.embed(["a"]) is None and c.session.posts == 1 and c.stats()["failures"] == 1
+
+
+@pytest.mark.parametrize("resp, n", [
+    (_Resp(200, None, text="<html>"), 1),
+    (_Resp(200, {"error": "x"}), 1),
+    (_Resp(200, {"data": [{"index": 0}]}), 1),
+    (_ok(1), 2),
+    (_Resp(200, {"data": [{"index": 0, "embedding": [1.0]}, {"index": 1, "embedding": [1.0, 2.0]}]}), 2),
+])
+def test_malformed_response_raises(resp, n, sleeps):
+    c = _client([resp], retries=3)
+    with pytest.raises(EmbeddingResponseError):
+        c.embed(["t"] * n)
+    assert c.session.posts == 1 and sleeps == []
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+
+from src.agent.storage import encode_embedding, decode_embedding
+
+
+def test_dense_round_trip_is_float32_blob():
+    text, blob, dim = encode_embedding([0.1, -2.0, 3.5])
+    assert text is None and dim == 3 and len(blob) == 12
+    out = decode_embedding(None, blob)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, [0.1, -2.0, 3.5], rtol=1e-6)
+
+
+def test_json_list_text_becomes_blob_and_sparse_stays_json():
+    assert encode_embedding(json.dumps([1.0, 2.0]))[2] == 2
+    text, blob, _ = encode_embedding({"风险": 2})
+    assert blob is None and decode_embedding(text, None) == {"风险": 2}
+    assert encode_embedding(None) == (None, None, None)
+    assert decode_embedding("not json", None) is None
+
+
+def test_convert_legacy_embeddings(storage):
+    with storage._conn() as conn:
+        conn.executemany("INSERT INTO embeddings(assessment_id, terms, vector) VALUES (?, ?, ?)",
+                         [(i, None, json.dumps([float(i), 1.0])) for i in range(5)] + [(9, None, json.dumps({"a": 1}))])
+    assert storage.convert_legacy_embeddings(batch_size=2, model="m", provider="p") == 5
+    assert storage.convert_legacy_embeddings() == 0
+    rows = {aid: v for aid, _, v in storage.get_all_embeddings()}
+    np.testing.assert_allclose(rows[3], [3.0, 1.0])
+    assert rows[9] == {"a": 1}
+    with storage._conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM embeddings WHERE dense IS NOT NULL AND model = 'm'").fetchone()[0] == 5
@@ -0,0 +1,48 @@
+import csv
+
+from src.agent.graph_client import GraphClient
+from src.agent.graph_snapshot import write_snapshot
+
+ROWS = [
+    ("Account", "A1", "HOLDS", "Company", "600519", "0.8"),
+    ("Account", "A1", "HOLDS", "Company", "000001", "0.2"),
+    ("Company", "600519", "LINKED_TO_INDEX", "MarketIndex", "CSI300", "0.9"),
+]
+
+
+def _graph_dir(tmp_path):
+    with open(tmp_path / "relations.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["src_type", "src_id", "rel", "dst_type", "dst_id", "weight"])
+        w.writerows(ROWS)
+    return str(tmp_path)
+
+
+def test_neighbors_keep_extra_columns(tmp_path):
+    g = GraphClient(_graph_dir(tmp_path), use_snapshot=False)
+    assert len(g) == 3 and g.num_nodes == 4
+    assert g.neighbors("Account", "A1") == [
+        {"src_type": "Account", "src_id": "A1", "rel": "HOLDS", "dst_type": "Company", "dst_id": "600519", "weight": "0.8"},
+        {"src_type": "Account", "src_id": "A1", "rel": "HOLDS", "dst_type": "Company", "dst_id": "000001", "weight": "0.2"},
+    ]
+    assert [e["src_id"] for e in g.in_neighbors("Company", "600519")] == ["A1"]
+    assert g.neighbors("Account", "missing") == []
+    assert g.describe_company("600519") == ["Company:600519 -[LINKED_TO_INDEX]→ MarketIndex:CSI300"]
+
+
+def test_add_edge_fills_and_adds_columns(tmp_path):
+    g = GraphClient(_graph_dir(tmp_path), use_snapshot=False)
+    e = g.add_edge("Account", "A2", "HOLDS", "Company", "600519", source="manual")
+    assert g.edge(e)["weight"] == "" and g.edge(e)["source"] == "manual"
+    assert g.edge(0)["source"] == "" and g.edge(0)["weight"] == "0.8"
+
+
+def test_snapshot_keeps_extra_columns_and_thaws(tmp_path):
+    d = _graph_dir(tmp_path)
+    write_snapshot(GraphClient(d, use_snapshot=False))
+    g = GraphClient(d, use_snapshot=True)
+    assert g.snapshot is not None
+    assert g.edges == GraphClient(d, use_snapshot=False).edges
+    g.add_edge("Account", "A3", "HOLDS", "Company", "000001", weight="0.5")
+    assert g.snapshot is None and g.neighbors("Account", "A3")[0]["weight"] == "0.5"
+    assert g.edge(2)["weight"] == "0.9" and g.node_id("Account", "A1") == 0
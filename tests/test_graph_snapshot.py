@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from src.agent import io_utils
+from src.agent.graph_client import GraphClient
+from src.agent.graph_snapshot import write_snapshot, load_snapshot, SNAPSHOT_NAME
+
+
+def _graph_dir(tmp_path, rows):
+    lines = ["src_type,src_id,rel,dst_type,dst_id"] + [",".join(r) for r in rows]
+    (tmp_path / "relations.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(tmp_path)
+
+
+ROWS = [("Account", f"A{i}", "HOLDS", "Company", f"{i % 7:06d}") for i in range(50)] + \
+       [("Company", "000001", "LINKED_TO_INDEX", "MarketIndex", "指数")]
+
+
+def test_round_trip_matches_csv_load(tmp_path):
+    d = _graph_dir(tmp_path, ROWS)
+    csv_g = GraphClient(d, use_snapshot=False)
+    write_snapshot(csv_g)
+    g = GraphClient(d, use_snapshot=True)
+    assert g.snapshot == os.path.join(d, SNAPSHOT_NAME)
+    assert (len(g), g.num_nodes) == (len(csv_g), csv_g.num_nodes)
+    assert g.edges == csv_g.edges
+    for t, k in [("Account", "A7"), ("Company", "000003"), ("MarketIndex", "指数"), ("Company", "missing"), ("X", "A1")]:
+        assert g.node_id(t, k) == csv_g.node_id(t, k)
+    assert g.neighbors("Company", "000001") == csv_g.neighbors("Company", "000001")
+    assert g.k_hop([g.node_id("Account", "A0")], 2) == csv_g.k_hop([csv_g.node_id("Account", "A0")], 2)
+
+
+def test_stale_snapshot_falls_back_to_csv(tmp_path):
+    d = _graph_dir(tmp_path, ROWS)
+    write_snapshot(GraphClient(d, use_snapshot=False))
+    _graph_dir(tmp_path, ROWS[:3])
+    assert load_snapshot(os.path.join(d, SNAPSHOT_NAME), csv_sig=[0, 0]) is None
+    g = GraphClient(d, use_snapshot=True)
+    assert g.snapshot is None and len(g) == 3
+
+
+def test_replace_refused_keeps_old_snapshot(tmp_path, monkeypatch):
+    d = _graph_dir(tmp_path, ROWS)
+    path = write_snapshot(GraphClient(d, use_snapshot=False))
+    before = open(path, "rb").read()
+
+    def locked(src, dst):
+        raise PermissionError(32, "being used by another process")
+
+    monkeypatch.setattr(io_utils.os, "replace", locked)
+    with pytest.raises(PermissionError, match="停止"):
+        write_snapshot(GraphClient(d, use_snapshot=False))
+    assert open(path, "rb").read() == before
+    assert not [f for f in os.listdir(d) if f.endswith(".tmp")]
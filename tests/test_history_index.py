@@ -0,0 +1,61 @@
+import numpy as np
+
+from src.agent.storage import Storage
+
+
+def _vec(*xs):
+    return np.asarray(xs, dtype=np.float32)
+
+
+def test_dense_search_ranks_by_cosine(storage):
+    storage.save_embeddings_batch([(1, None, _vec(1, 0)), (2, None, _vec(0, 1)), (3, None, _vec(1, 1))])
+    hits = storage.history_index().search(_vec(1, 0.1), None, 2)
+    assert [aid for _, aid in hits] == [1, 3]
+
+
+def test_writes_after_load_are_indexed(storage):
+    storage.save_embedding(1, None, _vec(1, 0))
+    index = storage.history_index()
+    storage.save_embedding(2, None, _vec(0, 1))
+    with storage.transaction():
+        storage.save_embedding(3, None, _vec(0, 1))
+        assert len(index) == 2          # held until commit
+    assert len(index) == 3
+
+
+def test_row_committed_during_first_load_is_not_lost(storage, monkeypatch):
+    storage.save_embedding(1, None, _vec(1, 0))
+    other = Storage(storage.path)
+    original = Storage._embeddings_since
+    calls = []
+
+    def racing(self, rowid):
+        out = original(self, rowid)
+        if not calls:
+            # another writer commits between the snapshot read and publishing the index
+            other.save_embedding(2, None, _vec(0, 1))
+        calls.append(rowid)
+        return out
+    monkeypatch.setattr(Storage, "_embeddings_since", racing)
+    storage.history_index()
+    index = storage.history_index()
+    assert len(index) == 2
+    assert [aid for _, aid in index.search(_vec(0, 1), None, 1)] == [2]
+    other.close()
+
+
+def test_no_duplicates_and_other_instances_seen(storage):
+    index = storage.history_index()
+    other = Storage(storage.path)
+    other.save_embedding(7, None, _vec(1, 0))
+    storage.history_index()
+    storage.history_index()
+    assert len(index) == 1
+    other.close()
+
+
+def test_clear_drops_index(storage):
+    storage.save_embedding(1, None, _vec(1, 0))
+    assert len(storage.history_index()) == 1
+    storage.clear_embeddings()
+    assert len(storage.history_index()) == 0
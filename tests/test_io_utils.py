@@ -0,0 +1,41 @@
+import os
+import threading
+
+import pytest
+
+from src.agent.io_utils import write_atomic
+
+
+def test_concurrent_writers_use_their_own_temp_files(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    temps, barrier = [], threading.Barrier(2)
+
+    def writer(data):
+        def write(p):
+            temps.append(p)
+            barrier.wait()      # both temp files exist at the same time
+            with open(p, "w") as f:
+                f.write(data)
+        write_atomic(path, write)
+
+    threads = [threading.Thread(target=writer, args=(d,)) for d in ("a" * 100, "b" * 100)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(temps)) == 2 and all(os.path.dirname(p) == str(tmp_path) for p in temps)
+    assert open(path).read() in ("a" * 100, "b" * 100)
+    assert os.listdir(tmp_path) == ["manifest.json"]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / "vectors.npy"
+    path.write_text("old")
+
+    def write(p):
+        open(p, "w").write("partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(str(path), write)
+    assert path.read_text() == "old" and os.listdir(tmp_path) == ["vectors.npy"]
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from src.agent import knowledge_base
+from src.agent.knowledge_base import KnowledgeStore
+
+
+@pytest.fixture
+def docs(tmp_path):
+    d = tmp_path / "docs"
+    d.mkdir()
+    (d / "a.txt").write_text("第一段\n第二段", encoding="utf-8")
+    (d / "b.md").write_text("市场 风险", encoding="utf-8")
+    return sorted(str(p) for p in d.iterdir())
+
+
+def test_text_files_are_parsed_without_a_process_pool(docs, monkeypatch):
+    def no_pool(*a, **kw):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr(knowledge_base, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(knowledge_base, "KNOWLEDGE_WORKERS", 4)
+    out = knowledge_base._parse_files(docs)
+    assert out[docs[0]] == ["第一段 第二段"] and out[docs[1]] == ["市场 风险"]
+
+
+def test_store_reparses_only_changed_files(docs, tmp_path):
+    store = KnowledgeStore(str(tmp_path / "k.sqlite"))
+    assert store.sync(docs) == 2
+    assert store.sync(docs) == 0
+    with open(docs[1], "w", encoding="utf-8") as f:
+        f.write("信用 风险 上升")
+    st = os.stat(docs[1])
+    os.utime(docs[1], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert store.sync(docs) == 1
+    assert store.sync(docs[:1]) == 0 and store.documents() == docs[:1]
+    assert [t for _, t in store.iter_segments()] == ["第一段 第二段"]
+
+
+def test_segments_are_read_lazily_in_document_order(tmp_path):
+    d = tmp_path / "docs"
+    d.mkdir()
+    (d / "a.txt").write_text("\n".join(["甲" * 500, "乙" * 500, "丙" * 500]), encoding="utf-8")
+    (d / "b.txt").write_text("丁", encoding="utf-8")
+    paths = sorted(str(p) for p in d.iterdir())
+    store = KnowledgeStore(str(tmp_path / "k.sqlite"))
+    store.sync(paths)
+    seg = knowledge_base.KnowledgeSegments(store, paths)
+    assert len(seg) == 4
+    assert list(seg) == seg[:] == ["甲" * 500, "乙" * 500, "丙" * 500, "丁"]
+    assert seg[-1] == "丁" and seg[2:4] == ["丙" * 500, "丁"] and seg[::2] == [seg[0], seg[2]]
+    with pytest.raises(IndexError):
+        seg[4]
+
+
+def test_load_knowledge_reuses_the_sequence_until_files_change(tmp_path, monkeypatch, docs):
+    monkeypatch.setattr(knowledge_base, "KNOWLEDGE_DIRS", [os.path.dirname(docs[0])])
+    monkeypatch.setattr(knowledge_base, "_store", KnowledgeStore(str(tmp_path / "k.sqlite")))
+    monkeypatch.setattr(knowledge_base, "_loaded", {"fingerprint": None, "items": None})
+    items = knowledge_base.load_knowledge()
+    assert isinstance(items, knowledge_base.KnowledgeSegments) and list(items) == ["第一段 第二段", "市场 风险"]
+    assert knowledge_base.load_knowledge() is items
+    assert knowledge_base.retrieve_knowledge(items, "市场", top_k=1) == ["市场 风险"]
+    with open(docs[1], "a", encoding="utf-8") as f:
+        f.write(" 上升")
+    again = knowledge_base.load_knowledge()
+    assert again is not items and again[1] == "市场 风险 上升"
+
+
+def test_retrieve_knowledge_ranks_by_bm25_and_pads_in_order():
+    items = ["市场 波动", "信用 风险 信用 风险", "信用 评级 下调 公司 公告 内容 较长 的 段落 文本", "流动性"]
+    assert knowledge_base.retrieve_knowledge(items, "信用风险", top_k=2) == [items[1], items[2]]
+    # nothing matches: the first items in order
+    assert knowledge_base.retrieve_knowledge(items, "zzz", top_k=2) == items[:2]
+    assert knowledge_base.retrieve_knowledge(items, "流动性", top_k=3) == [items[3], items[0], items[1]]
+    assert knowledge_base.retrieve_knowledge([], "信用", top_k=3) == []
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from src.agent import knowledge_index as ki
+from src.agent.knowledge_index import KnowledgeIndex
+
+ITEMS = ["信用 风险 上升", "市场 波动 加剧", "流动性 风险 可控"]
+
+
+def test_sidecar_reload_skips_embedding(tmp_path, fake_provider):
+    first = KnowledgeIndex(ITEMS, provider=fake_provider, cache_dir=str(tmp_path)).build()
+    assert fake_provider.embedded == len(ITEMS)
+    again = type(fake_provider)()
+    second = KnowledgeIndex(ITEMS, provider=again, cache_dir=str(tmp_path)).build()
+    assert again.embedded == 0
+    q = fake_provider.embed_text(ITEMS[1], is_query=True)
+    assert first.search(q, None, 1) == second.search(q, None, 1)
+    assert second.search(None, {"市场": 1.0}, 1)[0][1] == 1
+
+
+def test_sidecar_invalidated_by_items_and_model(tmp_path, fake_provider):
+    KnowledgeIndex(ITEMS, provider=fake_provider, cache_dir=str(tmp_path)).build()
+    changed = type(fake_provider)()
+    KnowledgeIndex(ITEMS + ["新 条目"], provider=changed, cache_dir=str(tmp_path)).build()
+    assert changed.embedded == len(ITEMS) + 1
+    other = type(fake_provider)(model_name="other")
+    KnowledgeIndex(ITEMS + ["新 条目"], provider=other, cache_dir=str(tmp_path)).build()
+    assert other.embedded == len(ITEMS) + 1
+
+
+def test_concurrent_callers_share_one_build_outside_the_lock(monkeypatch):
+    monkeypatch.setattr(ki, "_cache", OrderedDict())
+    gate = threading.Event()
+    builds = []
+
+    def build(self):
+        builds.append(self.items)
+        if self.items is slow:
+            gate.wait(5)
+        return self
+
+    monkeypatch.setattr(KnowledgeIndex, "build", build)
+    monkeypatch.setattr(KnowledgeIndex, "__init__", lambda self, items, provider=None: setattr(self, "items", items))
+    fast, slow = ["a"], ["b"]
+    ki.knowledge_index(fast)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(ki.knowledge_index(slow))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    # another list is served while the slow build is still running
+    assert ki.knowledge_index(fast).items is fast
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert [b for b in builds if b is slow] == [slow]
+    assert len(out) == 3 and all(o is out[0] for o in out)
+
+
+def test_sidecar_invalidated_by_stopwords(tmp_path, fake_provider):
+    from src.agent import tokenizer
+    KnowledgeIndex(ITEMS, provider=fake_provider, cache_dir=str(tmp_path)).build()
+    old = tokenizer._stopwords
+    tokenizer.set_stopwords(["风险"])
+    try:
+        again = type(fake_provider)()
+        idx = KnowledgeIndex(ITEMS, provider=again, cache_dir=str(tmp_path)).build()
+        assert again.embedded == len(ITEMS)
+        assert all(s == 0.0 for s, _ in idx.search(None, {"风险": 1.0}, 3))
+    finally:
+        tokenizer.set_stopwords(old)
+
+
+def test_waiters_are_bounded_and_the_build_carries_on(monkeypatch):
+    monkeypatch.setattr(ki, "_cache", OrderedDict())
+    gate = threading.Event()
+
+    def build(self):
+        gate.wait(5)
+        return self
+
+    monkeypatch.setattr(KnowledgeIndex, "build", build)
+    monkeypatch.setattr(KnowledgeIndex, "__init__", lambda self, items, provider=None: setattr(self, "items", items))
+    items = ["a"]
+    with pytest.raises(FutureTimeoutError):
+        ki.knowledge_index(items, timeout=0.05)
+    gate.set()
+    assert ki.knowledge_index(items, timeout=5).items is items
+    # the previous list stays cached next to the new one
+    newer = ["b"]
+    ki.knowledge_index(newer)
+    assert ki.knowledge_index(items) is ki._cache[id(items)][1]
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+
+from src.agent.storage import Storage, SCHEMA_VERSION, MIGRATIONS
+
+
+def _legacy_db(path):
+    # tables as created by the original Storage.init, before any migration
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE assessments (id INTEGER PRIMARY KEY AUTOINCREMENT, entity_id TEXT, timestamp TEXT, risk_score REAL, decision TEXT)")
+    conn.execute("CREATE TABLE reports (assessment_id INTEGER, report_text TEXT)")
+    conn.execute("CREATE TABLE features (assessment_id INTEGER, feature_name TEXT, value REAL, contribution REAL)")
+    conn.execute("CREATE TABLE embeddings (assessment_id INTEGER, terms TEXT, vector TEXT)")
+    conn.execute("INSERT INTO assessments(entity_id, timestamp, risk_score, decision) VALUES ('E1', '2024-01', 0.5, '')")
+    conn.execute("INSERT INTO reports VALUES (1, 'old')")
+    conn.execute("INSERT INTO reports VALUES (1, 'new')")
+    conn.execute("INSERT INTO embeddings VALUES (1, '{}', ?)", (json.dumps([0.5, 0.25]),))
+    conn.commit()
+    conn.close()
+
+
+def _indexes(storage):
+    with storage._conn() as conn:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_fresh_database_is_at_latest_version(storage):
+    assert storage.schema_version() == SCHEMA_VERSION
+    assert {"idx_assessments_entity_ts", "idx_features_assessment", "idx_embeddings_assessment"} <= _indexes(storage)
+
+
+def test_legacy_database_is_migrated_in_order(tmp_path):
+    path = str(tmp_path / "legacy.sqlite")
+    _legacy_db(path)
+    s = Storage(path)
+    assert s.schema_version() == 0
+    applied = s.migrate()
+    assert applied == [name for _, name, _ in MIGRATIONS]
+    assert s.schema_version() == SCHEMA_VERSION
+    # 2: one report per assessment, the last one written wins
+    assert s.get_report(1) == "new"
+    with s._conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 1
+        # 3: blob columns exist, legacy JSON vectors still readable
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(embeddings)")}
+        assert {"dense", "dim", "model", "provider"} <= cols
+        # 4: checkpoint table
+        conn.execute("SELECT * FROM embed_checkpoints").fetchall()
+    assert list(s.get_all_embeddings()[0][2]) == [0.5, 0.25]
+    s.close()
+
+
+def test_migrate_is_idempotent_and_partial(tmp_path):
+    path = str(tmp_path / "legacy.sqlite")
+    _legacy_db(path)
+    s = Storage(path)
+    assert s.migrate(target=1) == ["secondary indexes"]
+    assert s.schema_version() == 1
+    assert len(s.migrate()) == len(MIGRATIONS) - 1
+    assert s.migrate() == []
+    s.init()
+    assert s.schema_version() == SCHEMA_VERSION
+    s.close()
+
+
+def test_embedding_reads_migrate_an_uninitialised_database(tmp_path):
+    # Storage(path) without init(), as app.py --query used to do on an old database
+    path = str(tmp_path / "legacy.sqlite")
+    _legacy_db(path)
+    s = Storage(path)
+    assert list(s.get_all_embeddings()[0][2]) == [0.5, 0.25]
+    assert s.schema_version() == SCHEMA_VERSION
+    s.close()
+    path = str(tmp_path / "legacy2.sqlite")
+    _legacy_db(path)
+    s = Storage(path)
+    assert [aid for _, aid in s.history_index().search([0.5, 0.25], None, 1)] == [1]
+    s.close()
@@ -0,0 +1,50 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from src.agent import rag
+
+
+@pytest.fixture
+def fake_st(monkeypatch):
+    loads = []
+
+    class SentenceTransformer:
+        def __init__(self, name, device=None):
+            loads.append((name, device))
+            self.encoded = []
+
+        def encode(self, texts):
+            self.encoded.append(list(texts))
+            return [[1.0, 0.0] for _ in texts]
+
+    mod = types.ModuleType("sentence_transformers")
+    mod.SentenceTransformer = SentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", mod)
+    monkeypatch.setattr(rag, "_MODELS", {})
+    return loads
+
+
+def test_model_loads_once_per_name_and_device(fake_st):
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(rag.get_model("m", "cpu", warmup=False)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert fake_st == [("m", "cpu")]
+    assert len(out) == 4 and all(m is out[0] for m in out)
+    rag.get_model("m", "cuda", warmup=False)
+    assert fake_st == [("m", "cpu"), ("m", "cuda")]
+
+
+def test_preload_warms_up_and_reports_ready(fake_st):
+    slot = rag.preload_model("m", "cpu", warmup=True)
+    assert slot.ready.wait(5)
+    assert rag.model_ready("m", "cpu") and not rag.model_ready("other", "cpu")
+    m = rag.get_model("m", "cpu")
+    assert m.encoded == [["warmup"]] and fake_st == [("m", "cpu")]
+    assert rag.preload_model("m", "cpu") is slot
@@ -0,0 +1,107 @@
+from src.agent import neo4j_client
+from src.agent.neo4j_client import Neo4jClient, _TTLCache
+
+
+class _Result(list):
+    def consume(self):
+        return None
+
+
+class _Tx:
+    def __init__(self, log):
+        self.log = log
+
+    def run(self, q, **params):
+        self.log.append(("tx", q, params))
+        return _Result()
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def close(self):
+        pass
+
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def begin_transaction(self):
+        return _Tx(self.driver.log)
+
+    def run(self, q, **params):
+        self.driver.log.append(("run", q, params))
+        key = "symbols" if "symbols" in params else "ids"
+        return [self.driver.row(k) for k in params[key]]
+
+
+class _Driver:
+    def __init__(self):
+        self.log = []
+
+    def session(self):
+        return _Session(self)
+
+    def row(self, k):
+        if str(k).startswith("A"):
+            return {0: k, "id": k, "rels": [{"labels": ["Company"], "bid": "600519", "rel": "HOLDS"}]}
+        return {0: k, "symbol": k, "idx": [{"name": "CSI300", "corr": 0.9}], "news": []}
+
+    def close(self):
+        pass
+
+
+def _client(batch_size=2, cache_ttl=60):
+    c = Neo4jClient(uri="bolt://x", user="u", password="p", batch_size=batch_size, cache_ttl=cache_ttl)
+    c.driver = _Driver()
+    return c
+
+
+def test_upsert_groups_by_labels_and_batches():
+    c = _client()
+    rows = [("Account", f"A{i}", "HOLDS", "Company", "600519") for i in range(5)] + \
+           [{"src_type": "Company", "src_id": "600519", "rel": "IN", "dst_type": "MarketIndex", "dst_id": "CSI300"},
+            ("Bad Label", "x", "R", "Company", "y")]
+    assert c.upsert_relations(rows) == 6
+    txs = [e for e in c.driver.log if e[0] == "tx"]
+    assert [len(e[2]["rows"]) for e in txs] == [2, 2, 1, 1]
+    assert "MERGE (a:Account" in txs[0][1] and "MERGE (b:MarketIndex" in txs[3][1]
+    assert sum(1 for e in c.driver.log if e[0] == "commit") == 4
+
+
+def test_describe_many_batches_and_caches():
+    c = _client()
+    out = c.describe_companies(["600519", "000001", "600519", "000002"])
+    runs = [e for e in c.driver.log if e[0] == "run"]
+    assert [e[2]["symbols"] for e in runs] == [["600519", "000001"], ["000002"]]
+    assert out["000001"] == ["Company:000001 -[LINKED_TO_INDEX corr=0.9]→ MarketIndex:CSI300"]
+    assert c.describe_company("600519") == out["600519"] and len(c.driver.log) == 2
+    assert c.describe_account("A1") == ["Account:A1 -[HOLDS]→ Company:600519"]
+    # writes invalidate the cache
+    c.upsert_relation("Account", "A1", "HOLDS", "Company", "000001")
+    c.describe_company("600519")
+    assert c.driver.log[-1][0] == "run"
+
+
+def test_ttl_cache_bounds_and_expiry(monkeypatch):
+    cache = _TTLCache(max_items=2, ttl=60)
+    for k in "abc":
+        cache.put(k, k)
+    assert cache.get("a") is None and cache.get("c") == "c"
+    off = _TTLCache(max_items=2, ttl=0)
+    off.put("a", 1)
+    assert off.get("a") is None
+    now = [100.0]
+    monkeypatch.setattr(neo4j_client.time, "monotonic", lambda: now[0])
+    short = _TTLCache(max_items=2, ttl=5)
+    short.put("a", 1)
+    now[0] += 4
+    assert short.get("a") == 1
+    now[0] += 2
+    assert short.get("a") is None
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from src.agent import retriever
+
+
+class _Graph:
+    def __init__(self, gate=None):
+        self.gate = gate
+
+    def describe_company(self, symbol, limit=5):
+        if self.gate is not None:
+            self.gate.wait(5)
+        return [f"Company:{symbol}"]
+
+
+class _Vectors:
+    def search(self, query_text, top_k=5):
+        return []
+
+
+class _SlowProvider:
+    def __init__(self, gate):
+        self.gate = gate
+
+    def embed_text(self, text, is_query=False):
+        self.gate.wait(5)
+        return [1.0, 0.0]
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    monkeypatch.setattr(retriever, "RAG_WORKERS", 1)
+    monkeypatch.setattr(retriever, "_executors", {})
+    monkeypatch.setattr(retriever, "_slots", {})
+
+
+def _run(storage, graph, provider, deadline=0.3):
+    return retriever.retrieve_all(storage, [], _Vectors(), graph, None, "600519", top_k=5,
+                                  concurrent=True, source_timeout=0.2, deadline=deadline, provider=provider)
+
+
+def test_slow_query_embedding_is_bounded_by_deadline(pools, storage):
+    gate = threading.Event()
+    t0 = time.perf_counter()
+    out = _run(storage, _Graph(), _SlowProvider(gate))
+    gate.set()
+    assert time.perf_counter() - t0 < 1.0
+    assert out["timings"]["query"]["status"] == "timeout"
+    assert out["timings"]["graph_csv"]["status"] == "ok"
+    assert out["timings"]["history"]["status"] == "ok"
+
+
+def test_abandoned_source_keeps_its_slot(pools, storage, fake_provider):
+    gate = threading.Event()
+    graph = _Graph(gate)
+    first = _run(storage, graph, fake_provider)
+    assert first["timings"]["graph_csv"]["status"] == "timeout"
+    second = _run(storage, graph, fake_provider)
+    assert second["timings"]["graph_csv"]["status"] == "busy"
+    assert second["timings"]["history"]["status"] == "ok"
+    gate.set()
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        third = _run(storage, graph, fake_provider)
+        if third["timings"]["graph_csv"]["status"] == "ok":
+            break
+    assert third["timings"]["graph_csv"]["status"] == "ok"
+
+
+def test_knowledge_build_in_progress_is_bounded_by_deadline(pools, storage, fake_provider, monkeypatch):
+    from concurrent.futures import Future
+    from src.agent import knowledge_index as ki
+    items = ["信用 风险"]
+    pending = Future()
+    monkeypatch.setitem(ki._building, id(items), (items, pending))
+    t0 = time.perf_counter()
+    out = retriever.retrieve_all(storage, items, _Vectors(), _Graph(), None, "风险", top_k=5,
+                                 concurrent=True, source_timeout=0.2, deadline=0.3, provider=fake_provider)
+    assert time.perf_counter() - t0 < 1.0
+    assert out["timings"]["knowledge"]["status"] == "timeout"
+    # the worker gives up on its own at the deadline, so the source is not left busy
+    assert retriever._slots["knowledge"].acquire(timeout=0.5)
+    retriever._slots["knowledge"].release()
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from src.agent.rag import cosine_sparse
+from src.agent.sparse_index import SparseIndex
+
+DOCS = [{"风险": 2, "信用": 1}, {"市场": 3}, {"风险": 1, "市场": 1, "流动性": 4}, {}]
+
+
+def test_tf_matches_cosine_sparse():
+    index = SparseIndex(weighting="tf")
+    index.add_many(DOCS)
+    q = {"风险": 1, "市场": 2}
+    for score, pos in index.search(q, 4):
+        assert score == pytest.approx(cosine_sparse(q, DOCS[pos]), rel=1e-5)
+
+
+def test_bm25_matches_formula():
+    k1, b = 1.5, 0.75
+    index = SparseIndex(weighting="bm25", k1=k1, b=b)
+    index.add_many(DOCS)
+    n = len(DOCS)
+    avg = sum(sum(d.values()) for d in DOCS) / n
+    q = {"风险": 1, "流动性": 1}
+    scores = index.scores(q)
+    for i, d in enumerate(DOCS):
+        expect = 0.0
+        for t in q:
+            if t in d:
+                df = sum(1 for x in DOCS if t in x)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                tf = d[t]
+                expect += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * sum(d.values()) / avg))
+        assert scores[i] == pytest.approx(expect, rel=1e-5)
+
+
+def test_tfidf_prefers_rare_terms_and_updates_after_add():
+    index = SparseIndex(weighting="tfidf")
+    index.add_many(DOCS)
+    assert index.search({"流动性": 1}, 1)[0][1] == 2
+    pos = index.add({"流动性": 10})
+    assert {p for _, p in index.search({"流动性": 1}, 2)} == {2, pos}
+
+
+def test_exclude_empty_query_and_bad_weighting():
+    index = SparseIndex(weighting="tf")
+    index.add_many(DOCS)
+    hits = index.search({"市场": 1}, 2, exclude=[False, True, False, False])
+    assert 1 not in [p for _, p in hits]
+    assert not index.scores({}).any()
+    with pytest.raises(ValueError):
+        SparseIndex(weighting="nope")
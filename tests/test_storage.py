@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from src.agent.storage import Storage
+
+
+def test_connections_are_pooled_in_wal_mode(storage):
+    with storage._conn() as c1:
+        assert c1.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    with storage._conn() as c2:
+        assert c2 is c1
+
+
+def test_transaction_commits_once_and_rolls_back_on_error(storage):
+    with storage.transaction():
+        a = storage.save_assessment("E1", "2024-01", 0.1, "")
+        storage.save_report(a, "r")
+    assert storage.get_report(a) == "r"
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.save_assessment("E2", "2024-01", 0.2, "")
+            raise RuntimeError("boom")
+    assert storage.get_history("E2") == []
+
+
+def test_concurrent_writers(storage):
+    def work(n):
+        for i in range(20):
+            storage.save_assessment(f"T{n}", f"{i:03d}", i / 20, "")
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(len(storage.get_history(f"T{n}", 100)) for n in range(4)) == 80
+
+
+def test_invalid_synchronous_level(tmp_path):
+    with pytest.raises(ValueError):
+        Storage(str(tmp_path / "x.sqlite"), synchronous="sometimes")
+
+
+def _record(entity, ts, score, **extra):
+    return dict(entity_id=entity, timestamp=ts, risk_score=score, **extra)
+
+
+def test_bulk_ids_follow_existing_rows(storage):
+    first = storage.save_assessment("E1", "2024-01", 0.1, "")
+    ids = storage.save_assessments_bulk([
+        _record("E1", "2024-02", 0.2, report_text="r2", features=[("amount", 1.0, 0.5)]),
+        _record("E2", "2024-02", 0.3, embedding=({"a": 1}, [1.0, 0.0])),
+    ])
+    assert ids == [first + 1, first + 2]
+    assert storage.get_report(ids[0]) == "r2"
+    assert storage.save_assessment("E3", "2024-03", 0.4, "") == ids[-1] + 1
+    assert storage.count_embeddings() == 1
+
+
+def test_bulk_ids_do_not_reuse_deleted_autoincrement_ids(storage):
+    a = storage.save_assessment("E1", "2024-01", 0.1, "")
+    with storage._conn() as conn:
+        conn.execute("DELETE FROM assessments WHERE id = ?", (a,))
+    assert storage.save_assessments_bulk([_record("E1", "2024-02", 0.2)]) == [a + 1]
+
+
+def test_bulk_is_all_or_nothing(storage):
+    with pytest.raises(Exception):
+        storage.save_assessments_bulk([_record("E1", "2024-01", 0.1), _record("E2", "2024-01", 0.2, features=[("x",)])])
+    assert storage.get_history("E1") == []
+
+
+def test_bulk_empty(storage):
+    assert storage.save_assessments_bulk([]) == []
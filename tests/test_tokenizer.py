@@ -0,0 +1,40 @@
+import pytest
+
+from src.agent import tokenizer
+from src.agent.tokenizer import tokenize, term_counts, set_stopwords, stopwords_key
+
+
+@pytest.fixture
+def no_stopwords():
+    old = tokenizer._stopwords
+    set_stopwords(())
+    yield
+    set_stopwords(old)
+
+
+def test_cjk_runs_give_unigrams_and_bigrams(no_stopwords):
+    assert term_counts("信用风险，PSI 0.25") == {
+        "psi": 1, "0": 1, "25": 1, "信": 1, "用": 1, "风": 1, "险": 1, "信用": 1, "用风": 1, "风险": 1}
+
+
+def test_other_scripts_are_kept_as_words(no_stopwords):
+    assert tokenize("Café Ünternehmen ひらがな 한국어 snake_case") == [
+        "café", "ünternehmen", "ひらがな", "한국어", "snake", "case"]
+    assert tokenize("abc信用") == ["abc", "信", "用", "信用"]
+
+
+def test_stopwords_filter_and_key(no_stopwords):
+    empty = stopwords_key()
+    assert term_counts("the 的 风险") == {"the": 1, "的": 1, "风": 1, "险": 1, "风险": 1}
+    set_stopwords(["the", "的"])
+    # the term cache is cleared when the stop-words change
+    assert term_counts("the 的 风险") == {"风": 1, "险": 1, "风险": 1}
+    assert stopwords_key() != empty
+
+
+def test_term_counts_returns_a_fresh_dict(no_stopwords):
+    a = term_counts("风险")
+    a["风险"] = 99
+    assert term_counts("风险")["风险"] == 1
+    long = "风险 " * 12000
+    assert term_counts(long)["风险"] == 12000
@@ -0,0 +1,131 @@
+import os
+
+from src.agent import vector_store
+from src.agent.vector_store import VectorStore
+
+
+def _write(d, name, words):
+    p = os.path.join(d, name)
+    with open(p, "w", encoding="utf-8") as f:
+        f.write(" ".join(words))
+    return p
+
+
+def _store(tmp_path, provider, monkeypatch, backend="numpy"):
+    monkeypatch.setattr(vector_store, "KNOWLEDGE_DIRS", [str(tmp_path / "docs")])
+    vs = VectorStore(cache_dir=str(tmp_path / "cache"), backend=backend, provider=provider)
+    vs.add_knowledge_dirs()
+    return vs
+
+
+def _docs(tmp_path):
+    d = tmp_path / "docs"
+    d.mkdir(exist_ok=True)
+    _write(str(d), "a.txt", [f"a{i}" for i in range(900)])
+    _write(str(d), "b.txt", ["信用", "风险"] * 10)
+    return str(d)
+
+
+def test_reload_from_cache_does_not_re_embed(tmp_path, monkeypatch, fake_provider):
+    _docs(tmp_path)
+    first = _store(tmp_path, fake_provider, monkeypatch)
+    n = fake_provider.embedded
+    assert n == len(first.items) > 2
+    again = type(fake_provider)()
+    second = _store(tmp_path, again, monkeypatch)
+    assert again.batches == [] and [it["text"] for it in second.items] == [it["text"] for it in first.items]
+    q = first.items[1]["text"]
+    assert first.search(q, 1)[0]["text"] == second.search(q, 1)[0]["text"] == q
+
+
+def test_only_changed_files_are_re_embedded(tmp_path, monkeypatch, fake_provider):
+    d = _docs(tmp_path)
+    _store(tmp_path, fake_provider, monkeypatch)
+    _write(d, "b.txt", ["市场"] * 5)
+    again = type(fake_provider)()
+    vs = _store(tmp_path, again, monkeypatch)
+    assert again.embedded == 1
+    assert any(it["text"].startswith("市场") for it in vs.items)
+
+
+def test_search_fallback_is_scored_or_empty(tmp_path, monkeypatch, fake_provider):
+    _docs(tmp_path)
+    vs = _store(tmp_path, fake_provider, monkeypatch)
+    vs._index = None
+    q = vs.items[2]["text"]
+    res = vs.search(q, 2)
+    assert res[0]["text"] == q and res[0]["score"] >= res[1]["score"]
+    vs._provider = type(fake_provider)(dim=4)
+    assert vs.search(q, 2) == []
+
+
+def test_cache_key_depends_on_backend(fake_provider):
+    keys = {VectorStore(backend=b, provider=fake_provider)._cache_key() for b in ("numpy", "ivf")}
+    assert len(keys) == 2
+
+
+class _SparseOnlyProvider:
+    provider, model_name = "none", "none"
+
+    def embed_text(self, text, is_query=False):
+        return None
+
+    def embed_batch(self, texts, is_query=False):
+        return [None] * len(texts)
+
+    def remote_stats(self):
+        return None
+
+
+def test_sparse_items_are_indexed_by_raw_term_counts(tmp_path, monkeypatch):
+    from src.agent import sparse_index
+    from src.agent.rag import build_terms
+    monkeypatch.setattr(sparse_index, "SPARSE_WEIGHTING", "bm25")
+    d = tmp_path / "docs"
+    d.mkdir()
+    _write(str(d), "a.txt", ["违约"] * 6 + ["担保"])
+    _write(str(d), "b.txt", ["担保", "市场"])
+    vs = _store(tmp_path, _SparseOnlyProvider(), monkeypatch)
+    assert vs._sparse.weighting == "bm25"
+    assert vs._sparse._doc_len == [float(sum(build_terms(it["text"]).values())) for it in vs.items]
+    assert vs.search("违约", 1)[0]["text"].startswith("违约")
+
+
+def test_manifest_rows_past_vectors_force_a_rebuild(tmp_path, monkeypatch, fake_provider):
+    import numpy as np
+    _docs(tmp_path)
+    first = _store(tmp_path, fake_provider, monkeypatch)
+    vp = first._cache_path("vectors.npy")
+    np.save(vp, np.zeros((1, fake_provider.dim), dtype=np.float32))
+    again = type(fake_provider)()
+    vs = _store(tmp_path, again, monkeypatch)
+    assert again.embedded == len(vs.items) == len(first.items)
+    assert np.load(vp).shape[0] == len(vs.items)
+
+
+def test_old_vectors_mapping_is_released_before_replace(tmp_path, monkeypatch, fake_provider):
+    import weakref
+    import numpy as np
+    from src.agent import io_utils
+    d = _docs(tmp_path)
+    _store(tmp_path, fake_provider, monkeypatch)
+    maps, held = [], []
+    real_load, real_replace = np.load, io_utils.os.replace
+
+    def load(*args, **kwargs):
+        arr = real_load(*args, **kwargs)
+        if kwargs.get("mmap_mode"):
+            maps.append(weakref.ref(arr._mmap))
+        return arr
+
+    def replace(src, dst):
+        if dst.endswith("vectors.npy"):
+            # _save_cache swallows exceptions, so record instead of asserting here
+            held.append(any(r() is not None for r in maps))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(vector_store.np, "load", load)
+    monkeypatch.setattr(io_utils.os, "replace", replace)
+    _write(d, "b.txt", ["市场"] * 5)
+    vs = _store(tmp_path, type(fake_provider)(), monkeypatch)
+    assert maps and held == [False] and os.path.exists(vs._cache_path("vectors.npy"))